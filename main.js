@@ -382,6 +382,8 @@ function iniciarFlask(backendDir, dbPath) {
       ...process.env,
       PYTHONPATH: pythonPath,
       RESTAURANT_DB_PATH: dbPath || "",
+      // Cerrar stdin pide a Flask un apagado ordenado (ver detenerFlask)
+      RESTAURANT_STOP_ON_STDIN_EOF: "1",
     };
 
     // Buscar el servidor bundleado (PyInstaller) primero — no requiere Python instalado
@@ -927,9 +929,40 @@ app.on("activate", () => {
   }
 });
 
-// Marcar intento de cierre para que los handlers de 'close' no prevengan el cierre
-app.on("before-quit", () => {
+// Apagado ordenado de Flask: al cerrar su stdin (y con SIGTERM fuera de
+// Windows, donde kill() no manda señales sino que termina el proceso) escribe
+// la bitácora pendiente, los carritos y el checkpoint final. Si no termina en
+// FLASK_STOP_TIMEOUT_MS se fuerza con SIGKILL.
+const FLASK_STOP_TIMEOUT_MS = 5000;
+let flaskDetenido = false;
+
+function detenerFlask() {
+  return new Promise((resolve) => {
+    const proc = flaskProcess;
+    if (!proc || proc.exitCode !== null) return resolve();
+    const forzar = setTimeout(() => {
+      console.log("[Flask] No terminó a tiempo; forzando cierre.");
+      proc.kill("SIGKILL");
+      resolve();
+    }, FLASK_STOP_TIMEOUT_MS);
+    proc.once("close", () => {
+      clearTimeout(forzar);
+      resolve();
+    });
+    proc.stdin.end();
+    if (process.platform !== "win32") proc.kill("SIGTERM");
+  });
+}
+
+// Marcar intento de cierre para que los handlers de 'close' no prevengan el
+// cierre; la primera vez se espera a que Flask guarde antes de salir
+app.on("before-quit", (event) => {
   isQuitting = true;
+  if (!flaskDetenido && flaskProcess) {
+    flaskDetenido = true;
+    event.preventDefault();
+    detenerFlask().then(() => app.quit());
+  }
 });
 
 // Asegurar limpieza si el proceso recibe SIGTERM/SIGINT (kill externo, gestor
@@ -952,6 +985,7 @@ app.on("quit", () => {
     tray = null;
   }
   if (flaskProcess) {
+    // Solo si detenerFlask() no alcanzó a correr
     flaskProcess.kill("SIGKILL");
     console.log("[App] Flask terminado.");
   }
@@ -0,0 +1,150 @@
+"""Escritura diferida (write-behind) de la bitácora de actividad.
+
+log_activity() encola la fila en memoria y regresa de inmediato; un hilo de
+fondo la escribe en lotes (cada BATCH_SIZE filas o cada FLUSH_INTERVAL
+segundos) dentro de una sola transacción. Así /ticket no paga un fsync extra
+por el registro de auditoría después de haber guardado la orden.
+
+Si la cola se llena (la BD está bloqueada mucho tiempo) las filas nuevas se
+descartan y se cuentan en `dropped`: la bitácora nunca frena una venta.
+
+Modo síncrono (RESTAURANT_ACTIVITY_LOG_SYNC=1, usado por las pruebas): la
+fila se escribe en la conexión del request y se hace commit, igual que antes.
+"""
+import atexit
+import os
+import sqlite3
+import threading
+import time
+
+from db import get_pool
+from write_coordinator import write_transaction
+
+MAX_QUEUE = 1000
+BATCH_SIZE = 50
+FLUSH_INTERVAL = 0.05   # segundos
+
+_INSERT = 'INSERT INTO activity_log (action, description, actor, timestamp) VALUES (?, ?, ?, ?)'
+
+
+def sync_mode():
+    return os.environ.get('RESTAURANT_ACTIVITY_LOG_SYNC') == '1'
+
+
+class ActivityLogWriter:
+    def __init__(self, max_queue=MAX_QUEUE, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending = []          # (db_path, fila)
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stopping = False
+        self._stats = {'enqueued': 0, 'written': 0, 'dropped': 0, 'batches': 0, 'errors': 0}
+
+    def enqueue(self, db_path, row):
+        """Encola una fila; devuelve False si se descartó por contrapresión."""
+        with self._cond:
+            if len(self._pending) >= self.max_queue:
+                self._stats['dropped'] += 1
+                return False
+            self._pending.append((db_path, row))
+            self._stats['enqueued'] += 1
+            if len(self._pending) == 1 or len(self._pending) >= self.batch_size:
+                self._cond.notify()
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name='activity-log-writer',
+                                                daemon=True)
+                self._thread.start()
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._pending and not self._stopping:
+                    self._cond.wait()
+                if self._stopping and not self._pending:
+                    return
+                # Junta filas hasta llenar el lote o agotar el intervalo
+                limite = time.monotonic() + self.flush_interval
+                while len(self._pending) < self.batch_size and not self._stopping:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        break
+                    self._cond.wait(restante)
+            self.flush()
+
+    def flush(self):
+        """Escribe todo lo pendiente; una transacción por archivo de BD."""
+        with self._flush_lock:
+            with self._cond:
+                lote, self._pending = self._pending, []
+            if not lote:
+                return 0
+            por_bd = {}
+            for db_path, row in lote:
+                por_bd.setdefault(db_path, []).append(row)
+            escritas = 0
+            for db_path, rows in por_bd.items():
+                if not os.path.exists(db_path):
+                    continue  # BD borrada (pruebas) — no recrear un archivo vacío
+                pool = get_pool(db_path)
+                conn = pool.acquire()
+                try:
+                    with write_transaction(conn, db_path):
+                        conn.executemany(_INSERT, rows)
+                    escritas += len(rows)
+                except sqlite3.Error as e:
+                    print(f'[Bitácora] No se pudieron escribir {len(rows)} filas: {e}')
+                    with self._cond:
+                        self._stats['errors'] += 1
+                        self._stats['dropped'] += len(rows)
+                finally:
+                    pool.release(conn)
+            with self._cond:
+                self._stats['written'] += escritas
+                self._stats['batches'] += 1
+            return escritas
+
+    def stop(self, timeout=5.0):
+        """Vacía la cola y detiene el hilo (apagado del servidor)."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+        self.flush()
+
+    def stats(self):
+        with self._cond:
+            data = dict(self._stats)
+            data['pending'] = len(self._pending)
+        data['sync'] = sync_mode()
+        return data
+
+
+writer = ActivityLogWriter()
+atexit.register(writer.stop)
+
+
+def write(db_path, row):
+    if sync_mode():
+        # Conexión prestada del pool y devuelta: fuera de un request
+        # get_db_connection() abriría una directa que nadie cierra
+        pool = get_pool(db_path)
+        conn = pool.acquire()
+        try:
+            with write_transaction(conn, db_path):
+                conn.execute(_INSERT, row)
+        finally:
+            pool.release(conn)
+        return True
+    return writer.enqueue(db_path, row)
+
+
+def insert(conn, row):
+    """Inserta la fila en la transacción abierta de `conn` (sin commit)."""
+    conn.execute(_INSERT, row)
@@ -3,11 +3,16 @@ from flask_wtf.csrf import CSRFProtect
 from werkzeug.security import check_password_hash
 import requests
 import os
-import uuid
 from datetime import datetime, timedelta
 import json
-from db import (get_db_connection, _cerrar_db, log_activity,
+from db import (get_db_connection, _cerrar_db, log_activity, close_pools,
                 _get_db_path, backup_db_to_file, get_menu_options)
+import activity_writer
+import cart_store
+import checkpoint_manager
+import config_store
+import sales_rollup
+from integrity_check import IntegrityChecker
 from business import (format_num, money, get_week_bounds,
                       resolve_employee_schedule, compute_employee_pay,
                       parse_scheduled_days)
@@ -62,11 +67,8 @@ from auth import login_required, admin_required
 def initialize_session():
     # Make session permanent to use the lifetime setting
     session.permanent = True
-    
-    if 'cart' not in session:
-        session['cart'] = []
-    if 'order_id' not in session:
-        session['order_id'] = str(uuid.uuid4())[:8]
+    checkpoint_manager.note_request(request.endpoint)
+    cart_store.adopt_legacy_cookie()
 
 # Login page
 @app.route('/login', methods=['GET', 'POST'])
@@ -96,6 +98,7 @@ def login():
 # Logout
 @app.route('/logout', methods=['POST'])
 def logout():
+    cart_store.discard_current()
     session.clear()
     flash('Sesión cerrada exitosamente', 'success')
     return redirect(url_for('login'))
@@ -128,7 +131,7 @@ def save_customer_name():
 def home():
     if session.get('role') == 'admin':
         return redirect(url_for('admin_dashboard'))
-    return render_template('index.html')
+    return render_template('index.html', cart=cart_store.current())
 
 
 @app.route('/admin')
@@ -137,14 +140,7 @@ def home():
 def admin_dashboard():
     conn = get_db_connection()
     today = datetime.now().strftime('%Y-%m-%d')
-    today_total = conn.execute(
-        "SELECT COALESCE(SUM(total), 0) FROM orders WHERE date LIKE ? AND status != 'voided'",
-        (today + '%',)
-    ).fetchone()[0]
-    today_orders = conn.execute(
-        "SELECT COUNT(*) FROM orders WHERE date LIKE ? AND status != 'voided'",
-        (today + '%',)
-    ).fetchone()[0]
+    today_orders, today_total, _ = sales_rollup.summary(conn, today, today)
 
     # Low-stock count from Java service (best-effort)
     low_stock_count = 0
@@ -159,10 +155,7 @@ def admin_dashboard():
         "SELECT COUNT(*) FROM print_jobs WHERE status = 'pending'"
     ).fetchone()[0]
 
-    printer_name = conn.execute(
-        "SELECT value FROM config WHERE key = 'printer_name'"
-    ).fetchone()
-    printer_name = printer_name['value'] if printer_name else 'Printer_POS_80'
+    printer_name = config_store.printer_name()
 
     users_with_default = conn.execute(
         "SELECT COUNT(*) FROM users WHERE password_changed = 0"
@@ -176,6 +169,10 @@ def admin_dashboard():
     except Exception:
         app_version = '—'
 
+    # Resultado de la última verificación de integridad en segundo plano
+    integrity_result = config_store.get('integrity_result', 'ok')
+    integrity_checked_at = config_store.get('integrity_checked_at', '')
+
     return render_template('admin_dashboard.html',
                            today_total=today_total,
                            today_orders=today_orders,
@@ -183,7 +180,12 @@ def admin_dashboard():
                            pending_prints=pending_prints,
                            printer_name=printer_name,
                            usd_rate=_usd_rate(),
+                           durability_profile=config_store.durability_profile(),
+                           kitchen_tickets=config_store.kitchen_tickets(),
                            users_with_default=users_with_default,
+                           integrity_result=integrity_result,
+                           integrity_checked_at=integrity_checked_at,
+                           checkpoints=checkpoint_manager.get_manager(_get_db_path()).stats(),
                            app_version=app_version)
 
 @app.route('/admin/api/dashboard-summary')
@@ -192,14 +194,7 @@ def admin_dashboard():
 def dashboard_summary_api():
     conn = get_db_connection()
     today = datetime.now().strftime('%Y-%m-%d')
-    today_total = conn.execute(
-        "SELECT COALESCE(SUM(total), 0) FROM orders WHERE date LIKE ? AND status != 'voided'",
-        (today + '%',)
-    ).fetchone()[0]
-    today_orders = conn.execute(
-        "SELECT COUNT(*) FROM orders WHERE date LIKE ? AND status != 'voided'",
-        (today + '%',)
-    ).fetchone()[0]
+    today_orders, today_total, _ = sales_rollup.summary(conn, today, today)
     return jsonify({'today_total': float(today_total), 'today_orders': int(today_orders)})
 
 @app.route('/admin/api/low-stock-check')
@@ -269,6 +264,7 @@ def error_servidor(e):
 import routes_customize
 import routes_payment
 import routes_cart
+import routes_express
 import routes_admin_misc
 import routes_orders_admin
 import routes_users
@@ -285,6 +281,7 @@ from routes_payment import _usd_rate, _api_autorizada, print_receipt_physical
 routes_customize.register(app)
 routes_payment.register(app, csrf)
 routes_cart.register(app)
+routes_express.register(app)
 routes_admin_misc.register(app, csrf)
 routes_orders_admin.register(app, print_receipt_physical)
 routes_users.register(app)
@@ -297,6 +294,49 @@ routes_inventory.register(app)
 routes_prices.register(app)
 
 
+def _instalar_apagado():
+    """Apagado ordenado: SIGTERM, o fin de stdin cuando Electron lo pide
+    (RESTAURANT_STOP_ON_STDIN_EOF=1; en Windows no hay señales). Ambos
+    terminan app.run() con KeyboardInterrupt y corre el finally de abajo:
+    bitácora pendiente, carritos y checkpoint final."""
+    import signal
+    import sys
+    import threading
+    import _thread
+
+    def _por_senal(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, _por_senal)
+    if os.environ.get('RESTAURANT_STOP_ON_STDIN_EOF') == '1' and sys.stdin is not None:
+        def _esperar_eof():
+            # os.read y no sys.stdin.read: el lector con búfer bloqueado en un
+            # hilo daemon aborta el intérprete al salir
+            try:
+                fd = sys.stdin.fileno()
+                while os.read(fd, 4096):
+                    pass
+            except (OSError, ValueError):
+                return  # sin stdin utilizable: solo queda SIGTERM
+            _thread.interrupt_main()
+        threading.Thread(target=_esperar_eof, name='stdin-eof', daemon=True).start()
+
+
 if __name__ == '__main__':
+    _instalar_apagado()
     init_db()
-    app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 5001)), debug=False)
\ No newline at end of file
+    config_store.snapshot()  # aplica el perfil de durabilidad guardado al pool
+    integrity_checker = IntegrityChecker(_get_db_path())
+    integrity_checker.start()
+    checkpoints = checkpoint_manager.get_manager(_get_db_path())
+    checkpoints.start()
+    try:
+        app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 5001)), debug=False)
+    except KeyboardInterrupt:
+        print('[App] Apagando...')
+    finally:
+        integrity_checker.stop()
+        activity_writer.writer.stop()
+        cart_store.store.flush()
+        checkpoints.stop()  # TRUNCATE final: el -wal queda en cero al cerrar
+        close_pools()
\ No newline at end of file
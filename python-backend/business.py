@@ -1,11 +1,48 @@
+import math
 from datetime import datetime, timedelta
 from decimal import Decimal, ROUND_HALF_UP
 
+_CENT = Decimal('0.01')
+
+
+def to_cents(value):
+    """Monto → centavos enteros, redondeo half-up (alejándose de cero).
+    Mismo resultado que Decimal(str(value)).quantize(0.01, ROUND_HALF_UP),
+    pero sin crear Decimals en el caso común: solo cuando el monto cae a
+    una millonésima de un medio centavo se decide con Decimal."""
+    if type(value) is int:
+        return value * 100
+    if type(value) is float and math.isfinite(value):
+        scaled = abs(value) * 100
+        entero = math.floor(scaled)
+        if abs(scaled - entero - 0.5) > 1e-6:
+            cents = entero + 1 if scaled - entero > 0.5 else entero
+            return cents if value >= 0 else -cents
+    return int(Decimal(str(value)).quantize(_CENT, rounding=ROUND_HALF_UP) * 100)
+
+
+def from_cents(cents):
+    """Centavos enteros → float (vista usada por plantillas, JSON y la BD)."""
+    return cents / 100
+
 
 def money(value):
-    """Redondea un precio a centavos exactos vía Decimal. Evita que errores de
-    punto flotante (103.50000000000001) se guarden o rompan comparaciones."""
-    return float(Decimal(str(value)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
+    """Redondea un precio a centavos exactos. Evita que errores de punto
+    flotante (103.50000000000001) se guarden o rompan comparaciones."""
+    return to_cents(value) / 100
+
+
+def cart_total_cents(cart):
+    """Total del carrito sumando centavos enteros (sin acumular error de float)."""
+    return sum(to_cents(item['price']) for item in cart)
+
+
+def percent_off_cents(price_cents, pct):
+    """Precio en centavos con `pct`% de descuento, todo en enteros: el
+    porcentaje se lleva a centésimas (12.5 → 1250) y el resultado se redondea
+    half-up al centavo. Nunca baja de 0."""
+    pct_h = to_cents(pct)
+    return max(0, (price_cents * (10000 - pct_h) + 5000) // 10000)
 
 
 def format_num(value):
@@ -97,6 +134,24 @@ def parse_scheduled_days(form):
     return ','.join(str(d) for d in days)
 
 
+def order_item_rows(order_id, items, order_total=0):
+    """Rows for the order_items table from a cart/orders.items list:
+    (order_id, line_no, type, name, quantity, unit_price, price, discount).
+    Lines without a price get an even share of the order total, the same
+    estimate reports() used when parsing orders.items."""
+    lines = [it for it in items if isinstance(it, dict)]
+    per_item = (order_total or 0) / (len(lines) or 1)
+    rows = []
+    for line_no, it in enumerate(lines):
+        quantity = it.get('quantity', 1)
+        price = it.get('price', per_item)
+        unit_price = it.get('unit_price', price / max(quantity or 1, 1))
+        rows.append((order_id, line_no, it.get('type'),
+                     it.get('name') or it.get('type') or 'Desconocido',
+                     quantity, unit_price, price, it.get('discount')))
+    return rows
+
+
 def apply_bxgy_promotion(cart, applicable_items, buy_qty, get_free):
     """Generic NxM promotion: buy buy_qty, get get_free free (cheapest units discounted)."""
     # Count total matching units
@@ -125,7 +180,8 @@ def apply_bxgy_promotion(cart, applicable_items, buy_qty, get_free):
         units_to_free = min(units_remaining, qty)
         if 'original_price' not in item:
             item['original_price'] = item['price']
-        item['price'] = money(max(0, item['original_price'] - unit_price * units_to_free))
+        item['price'] = from_cents(max(0, to_cents(item['original_price'])
+                                       - to_cents(unit_price * units_to_free)))
         item['discount'] = f"{buy_qty + get_free}x{buy_qty} - ¡{units_to_free} GRATIS!"
         units_remaining -= units_to_free
 
@@ -0,0 +1,355 @@
+"""Carritos del lado del servidor (antes viajaban completos en la cookie).
+
+La sesión solo guarda un `cart_id` opaco; las líneas viven en memoria en
+este proceso y se escriben (write-through diferido) en la tabla `carts` de
+SQLite: cada cambio marca el carrito como pendiente y un hilo de fondo los
+guarda WRITE_DELAY segundos después, juntando las ediciones seguidas en una
+sola transacción. Si el proceso muere sin avisar (Electron lo termina, se
+cae, se actualiza) se pierde a lo más ese último intervalo, no los carritos.
+
+Cuando hay más de MAX_MEMORY_CARTS carritos en memoria, los menos usados
+con su fila ya al día salen de memoria y vuelven la próxima vez que se leen.
+
+Las rutas que modifican el carrito usan `with editing() as cart:`: el lock
+por carrito hace atómico el leer-modificar-guardar aunque la tablet mande
+dos peticiones a la vez. Una entrada solo se expulsa de memoria con su lock
+tomado y queda marcada `evicted`; quien la obtuvo justo antes la vuelve a
+buscar. Los carritos sin uso por más de CART_TTL segundos se descartan
+(memoria y tabla).
+
+Leer la tabla es un SELECT simple en una conexión del pool; el turno de
+escritura (write_transaction) lo piden el hilo de fondo y los borrados.
+"""
+import atexit
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import session
+
+from db import _get_db_path, get_pool
+from write_coordinator import write_transaction
+
+MAX_MEMORY_CARTS = 200
+CART_TTL = 12 * 3600         # segundos sin uso antes de descartar un carrito
+SWEEP_INTERVAL = 60.0        # segundos entre barridos de TTL
+WRITE_DELAY = 1.0            # segundos entre un cambio y su escritura en la tabla
+
+
+class _Entry:
+    __slots__ = ('items', 'touched', 'lock', 'dirty', 'evicted')
+
+    def __init__(self, items, touched=None):
+        self.items = items
+        self.touched = touched or time.time()
+        self.lock = threading.Lock()
+        self.dirty = False          # cambios aún no escritos en la tabla
+        self.evicted = False        # ya no está en memoria: buscarla de nuevo
+
+
+def _copy(items):
+    return [dict(i) for i in items]
+
+
+class CartStore:
+    def __init__(self, max_memory=MAX_MEMORY_CARTS, ttl=CART_TTL, sweep_interval=SWEEP_INTERVAL,
+                 write_delay=WRITE_DELAY):
+        self.max_memory = max_memory
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self.write_delay = write_delay
+        self._carts = {}            # (db_path, cart_id) → _Entry
+        self._lock = threading.Lock()
+        self._loading = {}          # (db_path, cart_id) → lock mientras se lee de SQLite
+        self._last_sweep = time.monotonic()
+        self._stats = {'loads_from_disk': 0, 'spilled': 0, 'evicted': 0, 'writes': 0}
+        # Write-through diferido: hilo de fondo + turno único de escritura
+        self._pending_lock = threading.Lock()
+        self._pending = False
+        self._thread = None
+        self._write_lock = threading.Lock()
+
+    # ── Tabla carts ─────────────────────────────────────────────────────────
+    def _with_conn(self, db_path, fn, write=True):
+        """fn(conn) en una conexión del pool; con write=True dentro de una
+        transacción de escritura."""
+        if not os.path.exists(db_path):
+            return None  # BD borrada (pruebas) — no recrear un archivo vacío
+        pool = get_pool(db_path)
+        conn = pool.acquire()
+        try:
+            if not write:
+                return fn(conn)
+            with write_transaction(conn, db_path):
+                return fn(conn)
+        except sqlite3.Error as e:
+            print(f'[Carritos] Error de BD: {e}')
+            return None
+        finally:
+            pool.release(conn)
+
+    def _exists(self, db_path, sql, params):
+        return self._with_conn(db_path, lambda conn: conn.execute(sql, params).fetchone(),
+                               write=False) is not None
+
+    def _spill(self, db_path, rows):
+        """rows: [(cart_id, items, touched)] → tabla carts (un carrito vacío
+        borra su fila). Devuelve False si no se pudo escribir."""
+        def escribir(conn):
+            conn.executemany(
+                'INSERT OR REPLACE INTO carts (cart_id, items, updated_at) VALUES (?, ?, ?)',
+                [(cid, json.dumps(items), touched) for cid, items, touched in rows if items])
+            conn.executemany('DELETE FROM carts WHERE cart_id = ?',
+                             [(cid,) for cid, items, _ in rows if not items])
+            return True
+        return bool(self._with_conn(db_path, escribir))
+
+    def _unspill(self, db_path, cart_id):
+        # La fila se queda: es la copia durable del carrito
+        row = self._with_conn(db_path, lambda conn: conn.execute(
+            'SELECT items, updated_at FROM carts WHERE cart_id = ?', (cart_id,)).fetchone(),
+            write=False)
+        if row is None or row['updated_at'] < time.time() - self.ttl:
+            return None
+        self._stats['loads_from_disk'] += 1
+        return _Entry(json.loads(row['items']), row['updated_at'])
+
+    def _schedule(self):
+        """Marca que hay carritos pendientes y arranca el hilo si no corre."""
+        with self._pending_lock:
+            self._pending = True
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='cart-writer',
+                                                daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._pending_lock:
+                if not self._pending:
+                    self._thread = None     # sin trabajo: _schedule lo vuelve a arrancar
+                    return
+                self._pending = False
+            time.sleep(self.write_delay)    # junta las ediciones seguidas
+            self.flush()
+
+    def _write(self, entradas):
+        """Escribe en la tabla las entradas con cambios pendientes."""
+        por_bd = {}
+        for (path, cid), e in entradas:
+            with e.lock:
+                if not e.dirty:
+                    continue
+                e.dirty = False
+                por_bd.setdefault(path, []).append((cid, _copy(e.items), e.touched, e))
+        for path, filas in por_bd.items():
+            if not os.path.exists(path):
+                continue    # BD borrada (pruebas): no hay dónde escribir
+            if self._spill(path, [f[:3] for f in filas]):
+                self._stats['writes'] += 1
+                continue
+            for *_, e in filas:     # se reintenta en la siguiente pasada
+                with e.lock:
+                    e.dirty = True
+            self._schedule()
+
+    # ── Memoria ─────────────────────────────────────────────────────────────
+    def _entry(self, db_path, cart_id):
+        key = (db_path, cart_id)
+        with self._lock:
+            entry = self._carts.get(key)
+            if entry is not None:
+                return entry
+            cargando = self._loading.setdefault(key, threading.Lock())
+        # Un solo request lee el carrito de SQLite; los demás esperan y lo
+        # encuentran ya en memoria.
+        with cargando:
+            with self._lock:
+                entry = self._carts.get(key)
+            if entry is None:
+                entry = self._unspill(db_path, cart_id) or _Entry([])
+                with self._lock:
+                    entry = self._carts.setdefault(key, entry)
+            with self._lock:
+                if self._loading.get(key) is cargando:
+                    del self._loading[key]
+        return entry
+
+    @contextmanager
+    def _locked(self, db_path, cart_id):
+        """Entrada del carrito con su lock tomado. Si se expulsó entre
+        buscarla y tomar el lock, se busca de nuevo (ya escrita en la tabla)."""
+        while True:
+            entry = self._entry(db_path, cart_id)
+            with entry.lock:
+                if not entry.evicted:
+                    yield entry
+                    return
+
+    def _evict(self, key, entry, expired=False):
+        """Saca la entrada de memoria solo si nadie la está usando y su fila
+        ya está al día (si no, la siguiente lectura vería la fila vieja); una
+        vencida se descarta aunque tenga cambios. Llamar con self._lock tomado."""
+        if not entry.lock.acquire(blocking=False):
+            return False
+        try:
+            if entry.dirty and not expired:
+                return False
+            entry.evicted = True
+            entry.dirty = False
+        finally:
+            entry.lock.release()
+        del self._carts[key]
+        return True
+
+    def _maintain(self, db_path):
+        """Salida de memoria por capacidad y barrido de TTL (fuera de
+        cualquier lock de carrito)."""
+        with self._lock:
+            ahora = time.time()
+            if time.monotonic() - self._last_sweep >= self.sweep_interval:
+                self._last_sweep = time.monotonic()
+                vencidos = [(k, e) for k, e in self._carts.items() if e.touched < ahora - self.ttl]
+                self._stats['evicted'] += sum(self._evict(k, e, expired=True) for k, e in vencidos)
+                barrer = True
+            else:
+                barrer = False
+            exceso = len(self._carts) - self.max_memory
+            if exceso > 0:
+                lru = sorted(self._carts.items(), key=lambda kv: kv[1].touched)[:exceso]
+                self._stats['spilled'] += sum(self._evict(k, e) for k, e in lru)
+        limite = time.time() - self.ttl
+        if barrer and self._exists(db_path, 'SELECT 1 FROM carts WHERE updated_at < ? LIMIT 1',
+                                   (limite,)):
+            self._with_conn(db_path, lambda conn: conn.execute(
+                'DELETE FROM carts WHERE updated_at < ?', (limite,)))
+
+    # ── API ─────────────────────────────────────────────────────────────────
+    def load(self, db_path, cart_id):
+        with self._locked(db_path, cart_id) as entry:
+            return _copy(entry.items)
+
+    def save(self, db_path, cart_id, items):
+        with self._locked(db_path, cart_id) as entry:
+            entry.items = _copy(items)
+            entry.touched = time.time()
+            entry.dirty = True
+        self._schedule()
+        self._maintain(db_path)
+
+    @contextmanager
+    def edit(self, db_path, cart_id):
+        """Leer-modificar-guardar atómico: guarda solo si el bloque no falla."""
+        with self._locked(db_path, cart_id) as entry:
+            items = _copy(entry.items)
+            yield items
+            entry.items = items
+            entry.touched = time.time()
+            entry.dirty = True
+        self._schedule()
+        self._maintain(db_path)
+
+    def discard(self, db_path, cart_id):
+        """Olvida el carrito y borra su fila si existe. El cobro ya la borró en
+        su propia transacción (delete_spilled): entonces solo es un SELECT,
+        salvo que el hilo de fondo la haya vuelto a escribir justo antes."""
+        with self._lock:
+            entry = self._carts.pop((db_path, cart_id), None)
+        if entry is not None:
+            with entry.lock:
+                entry.evicted = True
+                entry.dirty = False
+        # Con el turno de escritura: una pasada del hilo en curso termina antes
+        with self._write_lock:
+            if self._exists(db_path, 'SELECT 1 FROM carts WHERE cart_id = ?', (cart_id,)):
+                self._with_conn(db_path, lambda conn: conn.execute(
+                    'DELETE FROM carts WHERE cart_id = ?', (cart_id,)))
+
+    def flush(self):
+        """Escribe ya los carritos con cambios pendientes (hilo de fondo y
+        apagado). Los carritos siguen en memoria."""
+        with self._write_lock:
+            with self._lock:
+                entradas = list(self._carts.items())
+            self._write(entradas)
+
+    def stats(self):
+        with self._lock:
+            entradas = list(self._carts.values())
+            data = dict(self._stats)
+        tamanos = [len(json.dumps(e.items)) for e in entradas]
+        lineas = [len(e.items) for e in entradas]
+        data.update({
+            'in_memory': len(entradas),
+            'pending': sum(e.dirty for e in entradas),
+            'max_lines': max(lineas, default=0),
+            'max_bytes': max(tamanos, default=0),
+            'avg_bytes': round(sum(tamanos) / len(tamanos)) if tamanos else 0,
+        })
+        return data
+
+
+store = CartStore()
+atexit.register(store.flush)
+
+
+# ── Carrito del request actual (identificado por session['cart_id']) ─────────
+
+def _current_id(create=False):
+    cart_id = session.get('cart_id')
+    if cart_id is None and create:
+        cart_id = secrets.token_urlsafe(16)
+        session['cart_id'] = cart_id
+    return cart_id
+
+
+def for_session(sess):
+    """Copia de las líneas del carrito de `sess` ([] si no tiene)."""
+    cart_id = sess.get('cart_id')
+    return store.load(_get_db_path(), cart_id) if cart_id else []
+
+
+def current():
+    return for_session(session)
+
+
+def replace(items):
+    store.save(_get_db_path(), _current_id(create=True), items)
+
+
+def clear():
+    replace([])
+
+
+@contextmanager
+def editing():
+    with store.edit(_get_db_path(), _current_id(create=True)) as items:
+        yield items
+
+
+def delete_spilled(conn):
+    """Borra la copia en SQLite del carrito actual dentro de la transacción
+    de escritura abierta de `conn` (el cobro). Después del commit llamar
+    discard_current()."""
+    cart_id = session.get('cart_id')
+    if cart_id:
+        conn.execute('DELETE FROM carts WHERE cart_id = ?', (cart_id,))
+
+
+def discard_current():
+    cart_id = session.pop('cart_id', None)
+    if cart_id:
+        store.discard(_get_db_path(), cart_id)
+
+
+def adopt_legacy_cookie():
+    """Sesiones anteriores guardaban session['cart'] en la cookie: se mueve al
+    store la primera vez que llegan."""
+    if 'cart' in session:
+        items = session.pop('cart') or []
+        if items or session.get('cart_id'):
+            replace(items)
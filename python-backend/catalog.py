@@ -0,0 +1,74 @@
+"""Catálogo del menú en memoria (menu_prices + menu_options).
+
+Se carga una vez por proceso y queda asociado a un número de versión. Las
+rutas del admin que editan precios u opciones (routes_prices,
+routes_menu_options, importación de respaldo) llaman bump() después del
+commit; la siguiente consulta recarga el snapshot. Así cada precio o lista de
+opciones que usan el armado de órdenes y las plantillas es una lectura de dict.
+"""
+import threading
+
+from db import get_db_connection, _get_db_path
+
+_lock = threading.Lock()
+_version = 0
+_snapshot = None
+
+
+class Catalog:
+    def __init__(self, db_path, version, price_rows, option_rows):
+        self.db_path = db_path
+        self.version = version
+        self.prices = {r['key']: r['price'] for r in price_rows}
+        self.options = {}
+        for r in option_rows:
+            self.options.setdefault(r['category'], []).append(dict(r))
+        # Fallback de get_item_price: bebidas agregadas sin fila en menu_prices
+        self.beverage_prices = {o['name']: o['price'] for o in self.options.get('beverage', [])}
+        self.beverages = [
+            {'id': o['name'].lower().replace(' ', '_'), 'name': o['name'],
+             'icon': o['icon'], 'price': self.prices.get(o['name'], o['price'])}
+            for o in self.options.get('beverage', [])
+        ]
+
+
+def version():
+    return _version
+
+
+def bump():
+    """Invalida el snapshot actual. Llamar después del commit de una edición del menú."""
+    global _version
+    with _lock:
+        _version += 1
+
+
+def _load(db_path, ver):
+    conn = get_db_connection()
+    try:
+        price_rows = conn.execute('SELECT key, price FROM menu_prices').fetchall()
+        option_rows = conn.execute(
+            'SELECT * FROM menu_options WHERE active=1 ORDER BY category, sort_order, name'
+        ).fetchall()
+    finally:
+        conn.close()  # no-op dentro de un request; cierra la conexión directa fuera de él
+    return Catalog(db_path, ver, price_rows, option_rows)
+
+
+def get():
+    """Devuelve el snapshot vigente, recargándolo si la versión o la BD cambiaron."""
+    global _snapshot
+    db_path = _get_db_path()
+    snap = _snapshot
+    if snap is not None and snap.version == _version and snap.db_path == db_path:
+        return snap
+    with _lock:
+        snap = _snapshot
+        if snap is not None and snap.version == _version and snap.db_path == db_path:
+            return snap
+        ver = _version
+    snap = _load(db_path, ver)
+    with _lock:
+        if ver == _version:
+            _snapshot = snap
+    return snap
@@ -0,0 +1,195 @@
+"""Checkpoints del WAL en momentos tranquilos.
+
+Con WAL, SQLite pasa las páginas del -wal al archivo principal (checkpoint)
+cuando un commit cruza wal_autocheckpoint: ese commit (casi siempre un /ticket
+en hora pico) paga la copia y el fsync. Además, mientras un reporte largo tiene
+abierta su lectura, el checkpoint no puede avanzar y el -wal sigue creciendo.
+
+Las conexiones del pool suben wal_autocheckpoint a 10000 páginas (~40 MB, red
+de seguridad si este hilo no corre) y el hilo de fondo hace el trabajo:
+
+  * PASSIVE cuando la tasa de requests es baja y el pool no tiene conexiones
+    en uso. PASSIVE nunca bloquea lectores ni escritores; si un reporte tiene
+    un snapshot abierto copia lo que puede y el resto queda para la siguiente.
+  * PASSIVE aunque haya movimiento si el -wal pasa de FORCE_WAL_BYTES.
+  * TRUNCATE (deja el -wal en 0 bytes) después de CLOSED_IDLE segundos sin
+    requests —el local ya cerró— y al apagar el servidor.
+
+Solo cuenta como actividad el tráfico de ventas y pantallas que opera una
+persona: el print bridge sondea la cola cada ~25 s (cada 2 s en modo viejo) y
+el dashboard y la pantalla de órdenes en espera se refrescan solos, así que
+contarlos impediría llegar a CLOSED_IDLE mientras el bridge esté corriendo.
+
+Tamaño del -wal, duración de cada checkpoint y contadores salen en
+/admin/api/db-stats → 'checkpoints' y en el dashboard del admin.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+from db import get_pool
+from write_coordinator import LatencyHistogram
+
+CHECK_INTERVAL = 5.0             # segundos entre revisiones
+IDLE_MAX_RATE = 0.5              # requests/segundo por debajo de los cuales se considera calma
+MIN_WAL_BYTES = 1024 * 1024      # no vale la pena un checkpoint por menos de ~1 MB
+FORCE_WAL_BYTES = 16 * 1024 * 1024  # antes de llegar al umbral automático
+CLOSED_IDLE = 15 * 60.0          # sin requests por este tiempo → TRUNCATE
+
+# Endpoints que se consultan solos (print bridge, refrescos automáticos)
+POLLING_ENDPOINTS = frozenset({
+    'static',
+    'get_print_queue', 'claim_print_jobs', 'release_print_jobs',
+    'mark_printed', 'mark_printed_batch', 'get_config_api', 'update_printer_api',
+    'api_held_orders', 'dashboard_summary_api', 'low_stock_check_api', 'db_stats_api',
+})
+
+_requests = 0
+_last_request = time.monotonic()
+
+
+def note_request(endpoint=None):
+    """Cuenta un request (app.before_request) salvo los de POLLING_ENDPOINTS.
+    Sin candado: un conteo perdido entre hilos no cambia la decisión."""
+    global _requests, _last_request
+    if endpoint in POLLING_ENDPOINTS:
+        return
+    _requests += 1
+    _last_request = time.monotonic()
+
+
+def wal_bytes(db_path):
+    try:
+        return os.path.getsize(db_path + '-wal')
+    except OSError:
+        return 0
+
+
+def checkpoint(conn, mode='PASSIVE'):
+    """PRAGMA wal_checkpoint(mode). Devuelve (busy, páginas en el log,
+    páginas copiadas); busy=1 si un lector o escritor impidió terminar."""
+    busy, log, copied = conn.execute(f'PRAGMA wal_checkpoint({mode})').fetchone()
+    return busy, log, copied
+
+
+class CheckpointManager:
+    def __init__(self, db_path, interval=CHECK_INTERVAL, idle_max_rate=IDLE_MAX_RATE,
+                 min_wal_bytes=MIN_WAL_BYTES, force_wal_bytes=FORCE_WAL_BYTES,
+                 closed_idle=CLOSED_IDLE):
+        self.db_path = db_path
+        self.interval = interval
+        self.idle_max_rate = idle_max_rate
+        self.min_wal_bytes = min_wal_bytes
+        self.force_wal_bytes = force_wal_bytes
+        self.closed_idle = closed_idle
+        self.duration_ms = LatencyHistogram()
+        self._lock = threading.Lock()
+        self._stats = {'passive': 0, 'truncate': 0, 'forced': 0, 'incomplete': 0,
+                       'skipped_busy': 0, 'errors': 0}
+        self._last = None
+        self._truncated_since = None   # _last_request del último TRUNCATE por cierre
+        self._seen = (_requests, time.monotonic())
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def run_checkpoint(self, mode='PASSIVE'):
+        """Un checkpoint en una conexión del pool; registra duración y resultado."""
+        pool = get_pool(self.db_path)
+        antes = wal_bytes(self.db_path)
+        conn = pool.acquire()
+        try:
+            inicio = time.monotonic()
+            busy, log, copied = checkpoint(conn, mode)
+            ms = (time.monotonic() - inicio) * 1000
+        finally:
+            pool.release(conn)
+        self.duration_ms.observe(ms)
+        self._count(mode.lower())
+        if busy or (log > 0 and copied < log):
+            self._count('incomplete')
+        resultado = {'mode': mode, 'ms': round(ms, 3), 'busy': busy, 'log_pages': log,
+                     'checkpointed_pages': copied, 'wal_bytes_before': antes,
+                     'wal_bytes_after': wal_bytes(self.db_path),
+                     'at': time.strftime('%Y-%m-%d %H:%M:%S')}
+        with self._lock:
+            self._last = resultado
+        return resultado
+
+    def _rate(self):
+        """Requests por segundo desde la revisión anterior."""
+        ahora = time.monotonic()
+        antes, t = self._seen
+        self._seen = (_requests, ahora)
+        return (_requests - antes) / max(ahora - t, 1e-6)
+
+    def tick(self):
+        """Una revisión: decide si toca checkpoint y de qué tipo. Devuelve el
+        resultado del checkpoint o None si no hizo nada."""
+        rate = self._rate()
+        size = wal_bytes(self.db_path)
+        ocioso = time.monotonic() - _last_request
+
+        if ocioso >= self.closed_idle and self._truncated_since != _last_request:
+            if get_pool(self.db_path).stats()['in_use'] == 0:
+                self._truncated_since = _last_request
+                return self.run_checkpoint('TRUNCATE')
+
+        if size < self.min_wal_bytes:
+            return None
+        if size >= self.force_wal_bytes:
+            self._count('forced')
+            return self.run_checkpoint('PASSIVE')
+        if rate > self.idle_max_rate or get_pool(self.db_path).stats()['in_use']:
+            self._count('skipped_busy')
+            return None
+        return self.run_checkpoint('PASSIVE')
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.tick()
+            except sqlite3.Error as e:
+                self._count('errors')
+                print(f'[DB] Checkpoint falló: {e}')
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='wal-checkpoint', daemon=True)
+            self._thread.start()
+
+    def stop(self, truncate=True):
+        """Detiene el hilo y, al apagar el servidor, deja el -wal en cero."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+        if truncate:
+            try:
+                self.run_checkpoint('TRUNCATE')
+            except sqlite3.Error as e:
+                print(f'[DB] Checkpoint final falló: {e}')
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data['last'] = dict(self._last) if self._last else None
+        data['wal_bytes'] = wal_bytes(self.db_path)
+        data['duration'] = self.duration_ms.snapshot()
+        return data
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def get_manager(db_path):
+    with _managers_lock:
+        manager = _managers.get(db_path)
+        if manager is None:
+            manager = _managers[db_path] = CheckpointManager(db_path)
+        return manager
@@ -0,0 +1,133 @@
+"""Tabla config en memoria, con valores validados y tipados.
+
+La tabla se lee una vez por versión: update_config, /api/config/printer y la
+importación de respaldo llaman invalidate() después del commit. Los valores
+conocidos se parsean al cargar (usd_rate → float > 0) en vez de hacer
+float(get_config(...)) en cada página de cobro.
+
+Al cargar un snapshot nuevo el perfil de durabilidad (durability_profile) se
+aplica al pool de conexiones, así también lo toma una importación de respaldo.
+"""
+import threading
+
+from db import (get_db_connection, _get_db_path, set_durability_profile,
+                DURABILITY_PROFILES, DEFAULT_DURABILITY)
+
+DEFAULT_USD_RATE = 18.0
+DEFAULT_PRINTER_NAME = 'Printer_POS_80'
+
+
+def _parse_usd_rate(raw):
+    try:
+        rate = float(raw)
+    except (ValueError, TypeError):
+        return DEFAULT_USD_RATE
+    return rate if rate > 0 else DEFAULT_USD_RATE
+
+
+def _parse_printer_name(raw):
+    return (raw or '').strip() or DEFAULT_PRINTER_NAME
+
+
+def _parse_flag(raw):
+    return (raw or '').strip().lower() in ('1', 'true', 'on', 'si', 'sí')
+
+
+def _parse_durability(raw):
+    raw = (raw or '').strip().lower()
+    return raw if raw in DURABILITY_PROFILES else DEFAULT_DURABILITY
+
+
+# clave → (parser, valor por defecto si la fila no existe)
+PARSERS = {
+    'usd_rate':     (_parse_usd_rate, DEFAULT_USD_RATE),
+    'printer_name': (_parse_printer_name, DEFAULT_PRINTER_NAME),
+    'durability_profile': (_parse_durability, DEFAULT_DURABILITY),
+    # Comanda aparte para la impresora de cocina (ver print_queue)
+    'kitchen_tickets': (_parse_flag, False),
+}
+
+_lock = threading.Lock()
+_version = 0
+_snapshot = None
+
+
+class ConfigSnapshot:
+    def __init__(self, db_path, version, rows):
+        self.db_path = db_path
+        self.version = version
+        self.raw = {r['key']: r['value'] for r in rows}
+        self.values = {}
+        for key, (parser, default) in PARSERS.items():
+            self.values[key] = parser(self.raw[key]) if key in self.raw else default
+
+
+def version():
+    return _version
+
+
+def invalidate():
+    """Descarta el snapshot. Llamar después del commit de cualquier escritura a config."""
+    global _version
+    with _lock:
+        _version += 1
+
+
+def _load(db_path, ver):
+    conn = get_db_connection()
+    try:
+        rows = conn.execute('SELECT key, value FROM config').fetchall()
+    finally:
+        conn.close()  # no-op dentro de un request
+    return ConfigSnapshot(db_path, ver, rows)
+
+
+def snapshot():
+    global _snapshot
+    db_path = _get_db_path()
+    snap = _snapshot
+    if snap is not None and snap.version == _version and snap.db_path == db_path:
+        return snap
+    with _lock:
+        ver = _version
+    snap = _load(db_path, ver)
+    with _lock:
+        if ver == _version:
+            _snapshot = snap
+    set_durability_profile(snap.values['durability_profile'])
+    return snap
+
+
+def get(key, default=''):
+    """Valor crudo (texto) de la tabla config."""
+    return snapshot().raw.get(key, default)
+
+
+def value(key):
+    """Valor ya parseado de una clave conocida (ver PARSERS)."""
+    return snapshot().values[key]
+
+
+def all_raw():
+    return dict(snapshot().raw)
+
+
+def set_value(conn, key, raw):
+    """Escribe una clave en la conexión dada (sin commit)."""
+    conn.execute('INSERT OR REPLACE INTO config (key, value) VALUES (?, ?)', (key, raw))
+
+
+def usd_rate():
+    return value('usd_rate')
+
+
+def printer_name():
+    return value('printer_name')
+
+
+def durability_profile():
+    return value('durability_profile')
+
+
+def kitchen_tickets():
+    return value('kitchen_tickets')
@@ -1,5 +1,7 @@
 import os
 import sqlite3
+import threading
+import time
 from flask import g, session
 
 
@@ -7,11 +9,251 @@ def _get_db_path():
     return os.environ.get('RESTAURANT_DB_PATH') or 'restaurant.db'
 
 
+# ── Pool de conexiones ─────────────────────────────────────────────────────────
+# Cada request reutiliza una conexión ya abierta y configurada en vez de pagar
+# sqlite3.connect() + PRAGMAs + caché de páginas fría en cada toque de la tablet.
+
+POOL_SIZE = int(os.environ.get('RESTAURANT_DB_POOL_SIZE') or 8)
+POOL_TIMEOUT = 5.0   # segundos esperando una conexión libre antes de abrir una extra
+
+# Se aplican UNA vez por conexión, al abrirla.
+_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA busy_timeout=5000',
+    'PRAGMA cache_size=-8000',       # ~8 MB de caché de páginas por conexión
+    'PRAGMA mmap_size=67108864',     # 64 MB mapeados en memoria
+    'PRAGMA foreign_keys=ON',
+    'PRAGMA wal_autocheckpoint=10000',  # ~40 MB: el checkpoint normal lo hace checkpoint_manager
+)
+
+
+# Perfiles de durabilidad (config 'durability_profile'): cuánto fsync paga cada
+# commit. Se aplican a cada conexión del pool al entregarla, así un cambio desde
+# el panel de admin entra en vigor sin reiniciar el servidor.
+#   strict   → synchronous=FULL: fsync del WAL en cada commit (default de SQLite).
+#   balanced → synchronous=NORMAL: fsync solo al hacer checkpoint. Un apagón
+#              puede perder los últimos commits, pero la BD nunca se corrompe.
+#   rush     → synchronous=OFF: sin fsync; el sistema operativo decide cuándo
+#              escribir. Para hora pico en equipos con disco lento y UPS.
+DURABILITY_PROFILES = {
+    'strict':   ('PRAGMA synchronous=FULL',),
+    'balanced': ('PRAGMA synchronous=NORMAL',),
+    'rush':     ('PRAGMA synchronous=OFF',),
+}
+DEFAULT_DURABILITY = 'strict'
+_durability = DEFAULT_DURABILITY
+
+
+def durability_profile():
+    return _durability
+
+
+def set_durability_profile(name):
+    """Cambia el perfil activo; las conexiones lo toman en su próximo acquire()."""
+    global _durability
+    if name not in DURABILITY_PROFILES:
+        raise ValueError(f'Perfil de durabilidad desconocido: {name}')
+    _durability = name
+
+
+# Carril de solo lectura para reportes, historial, export CSV y Kuike: escaneos
+# grandes con su propia caché y un mmap amplio, sin competir con las escrituras
+# de /ticket. En WAL los lectores nunca bloquean el INSERT de la orden.
+REPORT_POOL_SIZE = 2
+_REPORT_PRAGMAS = (
+    'PRAGMA query_only=ON',
+    'PRAGMA busy_timeout=5000',
+    'PRAGMA cache_size=-32000',      # ~32 MB, separada de la caché de checkout
+    'PRAGMA mmap_size=268435456',    # 256 MB
+)
+
+
+def _configurar(conn, pragmas=_PRAGMAS):
+    conn.row_factory = sqlite3.Row
+    for pragma in pragmas:
+        conn.execute(pragma)
+    return conn
+
+
+class ConnectionPool:
+    """
+    Pool thread-safe de conexiones SQLite para un archivo de BD.
+    acquire() entrega la conexión ociosa más reciente (LIFO: su caché está
+    más caliente); si todas están ocupadas y el pool está lleno, espera hasta
+    `timeout` y después abre una conexión extra que se cierra al devolverla,
+    para que una venta nunca falle por falta de conexiones.
+    """
+    def __init__(self, db_path, size=POOL_SIZE, timeout=POOL_TIMEOUT, pragmas=_PRAGMAS,
+                 durability=False):
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self._pragmas = pragmas
+        self._durability = durability
+        self._perfil = {}        # id(conn) → perfil de durabilidad ya aplicado
+        self._idle = []
+        self._open = 0
+        self._in_use = 0
+        self._closed = False
+        self._overflow = set()   # id() de conexiones extra, fuera del tamaño del pool
+        self._cond = threading.Condition()
+        self._stats = {'hits': 0, 'opened': 0, 'waits': 0, 'wait_seconds': 0.0,
+                       'overflow': 0, 'discarded': 0, 'peak_in_use': 0}
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        try:
+            return _configurar(conn, self._pragmas)
+        except Exception:
+            conn.close()
+            raise
+
+    def acquire(self):
+        conn = self._acquire()
+        if self._durability:
+            perfil = _durability
+            if self._perfil.get(id(conn)) != perfil:
+                try:
+                    for pragma in DURABILITY_PROFILES[perfil]:
+                        conn.execute(pragma)
+                except Exception:
+                    self.release(conn)
+                    raise
+                self._perfil[id(conn)] = perfil
+        return conn
+
+    def _acquire(self):
+        with self._cond:
+            if not self._idle and self._open >= self.size:
+                self._stats['waits'] += 1
+                inicio = time.monotonic()
+                self._cond.wait_for(lambda: self._idle or self._open < self.size,
+                                    timeout=self.timeout)
+                self._stats['wait_seconds'] += time.monotonic() - inicio
+            if self._idle:
+                conn = self._idle.pop()
+                self._stats['hits'] += 1
+                self._marcar_en_uso()
+                return conn
+            overflow = self._open >= self.size
+            if overflow:
+                self._stats['overflow'] += 1
+            else:
+                self._open += 1
+            self._stats['opened'] += 1
+            self._marcar_en_uso()
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                if not overflow:
+                    self._open -= 1
+                self._cond.notify()
+            raise
+        if overflow:
+            with self._cond:
+                self._overflow.add(id(conn))
+        return conn
+
+    def _marcar_en_uso(self):
+        self._in_use += 1
+        if self._in_use > self._stats['peak_in_use']:
+            self._stats['peak_in_use'] = self._in_use
+
+    def release(self, conn):
+        """Devuelve la conexión al pool. Cualquier transacción que la ruta dejó
+        abierta se descarta (mismo efecto que el close() por request de antes)."""
+        sana = True
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            sana = False
+        with self._cond:
+            overflow = id(conn) in self._overflow
+            self._overflow.discard(id(conn))
+            self._in_use -= 1
+            if sana and not overflow and not self._closed:
+                self._idle.append(conn)
+                self._cond.notify()
+                return
+            self._perfil.pop(id(conn), None)
+            if not overflow:
+                self._open -= 1
+                if not sana:
+                    self._stats['discarded'] += 1
+            self._cond.notify()
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+            self._perfil.clear()
+        for conn in idle:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def stats(self):
+        with self._cond:
+            data = dict(self._stats)
+            data.update(size=self.size, open=self._open, idle=len(self._idle),
+                        in_use=self._in_use)
+        data['wait_seconds'] = round(data['wait_seconds'], 4)
+        return data
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _pool_for(kind, db_path, size, pragmas, durability=False):
+    with _pools_lock:
+        pool = _pools.get((kind, db_path))
+        if pool is None:
+            pool = _pools[(kind, db_path)] = ConnectionPool(
+                db_path, size=size, pragmas=pragmas, durability=durability)
+        return pool
+
+
+def get_pool(db_path=None):
+    return _pool_for('rw', db_path or _get_db_path(), POOL_SIZE, _PRAGMAS, durability=True)
+
+
+def get_report_pool(db_path=None):
+    return _pool_for('report', db_path or _get_db_path(), REPORT_POOL_SIZE, _REPORT_PRAGMAS)
+
+
+def close_pools():
+    """Cierra todas las conexiones ociosas (apagado del servidor y pruebas)."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+def pool_stats():
+    """Métricas de uso del pool de la BD actual: hits, esperas, conexiones abiertas."""
+    return get_pool().stats()
+
+
+def report_pool_stats():
+    return get_report_pool().stats()
+
+
 class _GConnection:
     """
-    Envuelve una conexión SQLite almacenada en Flask g.
-    conn.close() es no-op: teardown_appcontext cierra la conexión real al
-    final de cada request, garantizando que nunca quede abierta aunque
+    Envuelve una conexión SQLite del pool almacenada en Flask g.
+    conn.close() es no-op: teardown_appcontext devuelve la conexión al pool
+    al final de cada request, garantizando que nunca quede prestada aunque
     una ruta lance una excepción.
     """
     def __init__(self, conn):
@@ -21,40 +263,83 @@ class _GConnection:
         return getattr(self.__dict__['_conn'], name)
 
     def close(self):
-        pass  # teardown_appcontext maneja el cierre
+        pass  # teardown_appcontext la devuelve al pool
 
 
 def get_db_connection():
     """
-    Dentro de un request: devuelve la conexión cacheada en g (o la crea).
-    Fuera de request (ej: init_db al arrancar): devuelve una conexión directa.
+    Dentro de un request: devuelve la conexión del pool cacheada en g (o toma una).
+    Fuera de request (ej: init_db al arrancar): devuelve una conexión directa,
+    configurada con los mismos PRAGMAs, que el llamador cierra.
     """
     db_path = _get_db_path()
     try:
         if 'db' not in g:
-            conn = sqlite3.connect(db_path)
-            conn.row_factory = sqlite3.Row
+            pool = get_pool(db_path)
+            conn = pool.acquire()
             g.db = _GConnection(conn)
             g._raw_db = conn
+            g._db_pool = pool
         return g.db
     except RuntimeError:
         # Fuera de contexto de aplicación (inicio de servidor, tests sin contexto)
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+        return _configurar(sqlite3.connect(db_path),
+                           _PRAGMAS + DURABILITY_PROFILES[_durability])
 
 
-def _cerrar_db(error):
-    """Cierra la conexión real al final de cada request, sin importar si hubo error."""
-    raw = g.pop('_raw_db', None)
-    g.pop('db', None)
-    if raw is not None:
+def get_report_connection():
+    """
+    Conexión de solo lectura (query_only) para reportes y consultas pesadas.
+    Dentro de un request abre UNA transacción de lectura que dura hasta el
+    teardown: todas las consultas del reporte ven el mismo snapshot y el
+    release al pool la cierra. Fuera de request devuelve una conexión directa.
+    """
+    db_path = _get_db_path()
+    try:
+        if 'report_db' not in g:
+            pool = get_report_pool(db_path)
+            conn = pool.acquire()
+            try:
+                conn.execute('BEGIN')
+            except Exception:
+                pool.release(conn)
+                raise
+            g.report_db = _GConnection(conn)
+            g._raw_report_db = conn
+            g._report_pool = pool
+        return g.report_db
+    except RuntimeError:
+        return _configurar(sqlite3.connect(db_path), _REPORT_PRAGMAS)
+
+
+def _devolver(raw, pool):
+    if raw is None:
+        return
+    if pool is not None:
+        pool.release(raw)
+    else:
         try:
             raw.close()
         except Exception:
             pass
 
 
+def release_db_connection():
+    """Devuelve al pool, antes del teardown, la conexión del request actual
+    (p. ej. antes de una espera long-poll). Un get_db_connection() posterior
+    toma otra."""
+    g.pop('db', None)
+    _devolver(g.pop('_raw_db', None), g.pop('_db_pool', None))
+
+
+def _cerrar_db(error):
+    """Devuelve las conexiones al pool al final de cada request, sin importar si hubo error."""
+    g.pop('db', None)
+    g.pop('report_db', None)
+    _devolver(g.pop('_raw_db', None), g.pop('_db_pool', None))
+    _devolver(g.pop('_raw_report_db', None), g.pop('_report_pool', None))
+
+
 def backup_db_to_file(src_path, dst_path):
     """Snapshot consistente src → dst vía la API de backup de SQLite (no una
     copia de archivo plana, que podría capturar una escritura a medias)."""
@@ -70,7 +355,7 @@ def backup_db_to_file(src_path, dst_path):
 
 
 def get_item_price(item_type, style=None):
-    """Get item price from the database (editable by admin)."""
+    """Get item price from the menu catalog (editable by admin; see catalog.py)."""
     if item_type == 'Sushi' and style:
         if 'Seco' in style or 'Salsas Aparte' in style:
             key = 'Sushi Seco'
@@ -81,44 +366,37 @@ def get_item_price(item_type, style=None):
     else:
         key = item_type
 
-    conn = get_db_connection()
-    row = conn.execute('SELECT price FROM menu_prices WHERE key = ?', (key,)).fetchone()
-    if row:
-        return row['price']
+    import catalog
+    cat = catalog.get()
+    price = cat.prices.get(key)
+    if price is not None:
+        return price
     # Fallback: check menu_options (for newly-added beverages)
-    row = conn.execute(
-        "SELECT price FROM menu_options WHERE category='beverage' AND name=? AND active=1",
-        (key,)
-    ).fetchone()
-    return row['price'] if row else 0.0
+    return cat.beverage_prices.get(key, 0.0)
 
 
 def get_sushi_prep_prices():
     """Return live prices for the three sushi preparation options."""
-    conn = get_db_connection()
-    def p(key):
-        row = conn.execute('SELECT price FROM menu_prices WHERE key=?', (key,)).fetchone()
-        return int(row['price']) if row else 0
-    prices = {
-        'Sushi Preparado':      p('Sushi Preparado'),
-        'Seco':                 p('Sushi Seco'),
-        'Sushi Flamin':         p('Sushi Flamin'),
+    import catalog
+    prices = catalog.get().prices
+    return {
+        'Sushi Preparado':      int(prices.get('Sushi Preparado', 0)),
+        'Seco':                 int(prices.get('Sushi Seco', 0)),
+        'Sushi Flamin':         int(prices.get('Sushi Flamin', 0)),
     }
-    return prices
 
 
 def get_menu_options(category):
     """Return active menu options for a given category as a list of dicts."""
-    conn = get_db_connection()
-    rows = conn.execute(
-        'SELECT * FROM menu_options WHERE category=? AND active=1 ORDER BY sort_order, name',
-        (category,)
-    ).fetchall()
-    return [dict(r) for r in rows]
+    import catalog
+    return [dict(o) for o in catalog.get().options.get(category, [])]
 
 
-def log_activity(action, description):
-    """Append a row to activity_log. actor comes from Flask session if available."""
+def log_activity(action, description, conn=None):
+    """Append a row to activity_log. actor comes from Flask session if available.
+    La escritura es diferida: ver activity_writer (lotes en segundo plano).
+    Con `conn`, la fila se inserta en esa conexión y se confirma con la
+    transacción del llamador (ej: ticket())."""
     try:
         actor = 'sistema'
         try:
@@ -126,18 +404,18 @@ def log_activity(action, description):
             actor = _s.get('username', 'sistema')
         except Exception:
             pass
-        conn = get_db_connection()
         from datetime import datetime
-        conn.execute(
-            'INSERT INTO activity_log (action, description, actor, timestamp) VALUES (?, ?, ?, ?)',
-            (action, description, actor, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-        )
-        conn.commit()
+        import activity_writer
+        row = (action, description, actor, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        if conn is not None:
+            activity_writer.insert(conn, row)
+        else:
+            activity_writer.write(_get_db_path(), row)
     except Exception:
         pass
 
 
 def get_config(key, default=''):
-    conn = get_db_connection()
-    row = conn.execute('SELECT value FROM config WHERE key = ?', (key,)).fetchone()
-    return row['value'] if row else default
+    """Valor crudo de la tabla config, servido desde memoria (ver config_store)."""
+    import config_store
+    return config_store.get(key, default)
@@ -0,0 +1,62 @@
+"""Llaves de idempotencia para cobrar (/ticket, /api/orders/express y su lote).
+
+La tablet genera una llave por intento de cobro y la repite en cada
+reintento. La llave se inserta en la MISMA transacción que la orden: si la
+venta se guardó, la llave también, y un reintento (p. ej. se cayó el Wi-Fi
+antes de recibir la respuesta) regresa la respuesta original con una lectura
+por llave primaria, sin tocar `orders` ni volver a cobrar.
+
+Dos reintentos simultáneos chocan en el INSERT de la llave (PRIMARY KEY): el
+segundo hace rollback y repite la respuesta del primero. Las llaves vencen a
+los IDEMPOTENCY_TTL segundos.
+"""
+import json
+import sqlite3
+import time
+
+from flask import request
+
+IDEMPOTENCY_TTL = 24 * 3600
+MAX_KEY_LENGTH = 100
+
+
+class KeyInUse(Exception):
+    """La llave ya existe: otro request con la misma llave se adelantó."""
+
+
+def request_key():
+    """Llave del request actual: header Idempotency-Key o campo idempotency_key."""
+    key = (request.headers.get('Idempotency-Key')
+           or request.form.get('idempotency_key') or '').strip()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        return None
+    return key
+
+
+def lookup(conn, scope, key):
+    """Respuesta guardada para (scope, key), o None si no existe o ya venció."""
+    row = conn.execute(
+        'SELECT response FROM idempotency_keys '
+        'WHERE scope = ? AND key = ? AND expires_at > ? AND response IS NOT NULL',
+        (scope, key, time.time())).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def claim(conn, scope, key):
+    """Reserva la llave dentro de la transacción abierta de `conn`. Lanza
+    KeyInUse si ya existe. Una llave vencida se reutiliza."""
+    now = time.time()
+    conn.execute('DELETE FROM idempotency_keys WHERE expires_at <= ?', (now,))
+    try:
+        conn.execute(
+            'INSERT INTO idempotency_keys (scope, key, created_at, expires_at) '
+            'VALUES (?, ?, ?, ?)', (scope, key, now, now + IDEMPOTENCY_TTL))
+    except sqlite3.IntegrityError:
+        raise KeyInUse(key)
+
+
+def record(conn, scope, key, order_id, response):
+    """Guarda la respuesta a repetir; se confirma con el commit de la orden."""
+    conn.execute(
+        'UPDATE idempotency_keys SET order_id = ?, response = ? WHERE scope = ? AND key = ?',
+        (order_id, json.dumps(response), scope, key))
@@ -0,0 +1,182 @@
+"""Verificación de integridad de la BD en segundo plano.
+
+Antes init_db corría PRAGMA quick_check al arrancar: O(tamaño de la BD), así
+el arranque se hacía más lento con cada orden acumulada. Ahora un hilo de
+fondo revisa una tabla a la vez (quick_check(tabla), con sus índices) solo
+cuando el pool no tiene conexiones en uso, con una pausa entre tablas para no
+competir con las ventas.
+
+quick_check de una tabla no se puede partir por rangos de rowid (revisa la
+tabla y sus índices juntos), así que cada porción se acota con un progress
+handler: se interrumpe en cuanto otra conexión del pool entra en uso (una
+venta) o al pasar su presupuesto de tiempo. Una tabla interrumpida por una
+venta se repite igual cuando el pool vuelve a estar libre; una que agotó el
+presupuesto se pasa al final de la pasada con el doble de presupuesto, así
+`orders` termina en algún momento tranquilo sin retener una conexión más
+de SLICE_BUDGET segundos mientras hay movimiento. Al terminar cada pasada
+guarda en config:
+
+    integrity_checked_at  fecha y hora de la última pasada completa
+    integrity_result      'ok' o los errores encontrados
+
+El dashboard del admin muestra una alerta cuando el resultado no es 'ok'.
+"""
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import config_store
+from db import get_pool
+from write_coordinator import write_transaction
+
+STARTUP_DELAY = 60.0        # segundos antes de la primera pasada
+PASS_INTERVAL = 6 * 3600.0  # entre pasadas completas
+SLICE_PAUSE = 0.5           # entre tablas
+SLICE_BUDGET = 1.0          # segundos del primer intento por tabla (se duplica si no alcanza)
+PROGRESS_STEPS = 20000      # instrucciones de SQLite entre revisiones del presupuesto
+IDLE_WAIT = 2.0             # reintento cuando el pool está ocupado
+MAX_ERRORS = 10             # líneas de error que se guardan por pasada
+
+# quick_check(tabla) existe desde SQLite 3.33; antes solo la BD completa
+_POR_TABLA = sqlite3.sqlite_version_info >= (3, 33, 0)
+
+
+def _tablas(conn):
+    return [r[0] for r in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' "
+        "AND name NOT LIKE 'sqlite_%' ORDER BY name")]
+
+
+def check_table(conn, table):
+    """Errores de quick_check para una tabla (lista vacía si está bien)."""
+    rows = [r[0] for r in conn.execute(f'PRAGMA quick_check("{table}")')]
+    return [] if rows == ['ok'] else rows
+
+
+def record_result(conn, errores, db_path=None):
+    resultado = 'ok' if not errores else '\n'.join(errores[:MAX_ERRORS])
+    with write_transaction(conn, db_path):
+        config_store.set_value(conn, 'integrity_checked_at',
+                               datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        config_store.set_value(conn, 'integrity_result', resultado)
+    config_store.invalidate()
+    return resultado
+
+
+class IntegrityChecker:
+    def __init__(self, db_path, startup_delay=STARTUP_DELAY, pass_interval=PASS_INTERVAL,
+                 slice_pause=SLICE_PAUSE, idle_wait=IDLE_WAIT, slice_budget=SLICE_BUDGET,
+                 progress_steps=PROGRESS_STEPS):
+        self.db_path = db_path
+        self.startup_delay = startup_delay
+        self.pass_interval = pass_interval
+        self.slice_pause = slice_pause
+        self.idle_wait = idle_wait
+        self.slice_budget = slice_budget
+        self.progress_steps = progress_steps
+        self.interrupted = {'budget': 0, 'busy': 0}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _idle(self):
+        return get_pool(self.db_path).stats()['in_use'] == 0
+
+    def _wait_idle(self):
+        while not self._idle():
+            if self._stop.wait(self.idle_wait):
+                return False
+        return True
+
+    def _check_slice(self, conn, table, budget):
+        """quick_check de `table` (None = BD completa) acotado. Devuelve
+        (errores, None) o (None, motivo) si se interrumpió: 'busy' si otra
+        conexión del pool entró en uso, 'budget' si pasó de `budget` segundos."""
+        pool = get_pool(self.db_path)
+        limite = time.monotonic() + budget
+        motivo = []
+
+        def vigilar():
+            if pool.stats()['in_use'] > 1:
+                motivo.append('busy')
+            elif time.monotonic() > limite:
+                motivo.append('budget')
+            return 1 if motivo else 0
+
+        conn.set_progress_handler(vigilar, self.progress_steps)
+        try:
+            if table is None:
+                rows = [r[0] for r in conn.execute('PRAGMA quick_check')]
+                return ([] if rows == ['ok'] else rows), None
+            return [f'{table}: {e}' for e in check_table(conn, table)], None
+        except sqlite3.OperationalError:
+            if motivo:
+                return None, motivo[0]
+            raise
+        finally:
+            conn.set_progress_handler(None, self.progress_steps)
+
+    def run_pass(self):
+        """Una pasada completa, tabla por tabla. Devuelve el resultado guardado
+        o None si se detuvo a la mitad."""
+        pool = get_pool(self.db_path)
+        errores = []
+        conn = pool.acquire()
+        try:
+            pendientes = deque((t, self.slice_budget)
+                               for t in (_tablas(conn) if _POR_TABLA else [None]))
+        finally:
+            pool.release(conn)
+        while pendientes:
+            table, budget = pendientes.popleft()
+            if not self._wait_idle():
+                return None
+            conn = pool.acquire()
+            try:
+                encontrados, motivo = self._check_slice(conn, table, budget)
+            except sqlite3.DatabaseError as e:
+                encontrados, motivo = [f'{table}: {e}'], None
+            finally:
+                pool.release(conn)
+            if motivo == 'busy':
+                self.interrupted['busy'] += 1
+                pendientes.appendleft((table, budget))
+            elif motivo == 'budget':
+                self.interrupted['budget'] += 1
+                pendientes.append((table, budget * 2))
+            else:
+                errores += encontrados
+            if self._stop.wait(self.slice_pause):
+                return None
+        conn = pool.acquire()
+        try:
+            resultado = record_result(conn, errores, self.db_path)
+        finally:
+            pool.release(conn)
+        if resultado != 'ok':
+            print(f'[DB] Verificación de integridad falló: {resultado} '
+                  f'— restaurar desde un respaldo en userData/backups/')
+        return resultado
+
+    def _run(self):
+        if self._stop.wait(self.startup_delay):
+            return
+        while not self._stop.is_set():
+            try:
+                self.run_pass()
+            except sqlite3.Error as e:
+                print(f'[DB] Verificación de integridad interrumpida: {e}')
+            if self._stop.wait(self.pass_interval):
+                return
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='integrity-check', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
@@ -0,0 +1,42 @@
+"""IDs de orden: prefijo del día (YYMMDD) + secuencia del día en base 36.
+
+Ejemplo: la orden 11 del 15 de marzo de 2026 es '2603150B'. Ocho caracteres
+como los IDs heredados (uuid4()[:8]), así búsqueda y reimpresión no cambian;
+pasadas 1295 órdenes en un día la secuencia usa un carácter más.
+
+La secuencia vive en la tabla order_sequence y se reserva dentro de la misma
+transacción que inserta la orden: si la venta se revierte, el número no se
+consume. Los IDs crecen con el tiempo, así cada INSERT cae al final del
+índice de orders en vez de en una hoja aleatoria del B-tree.
+"""
+from datetime import datetime
+
+_ALFABETO = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+SEQ_WIDTH = 2
+
+
+def _base36(n, width=SEQ_WIDTH):
+    digitos = ''
+    while n:
+        n, r = divmod(n, 36)
+        digitos = _ALFABETO[r] + digitos
+    return digitos.rjust(width, '0')
+
+
+def format_order_id(day_prefix, seq):
+    return day_prefix + _base36(seq)
+
+
+def next_order_id(conn, now=None):
+    """Reserva el siguiente ID del día en la transacción abierta de `conn`."""
+    day_prefix = (now or datetime.now()).strftime('%y%m%d')
+    while True:
+        conn.execute(
+            'INSERT INTO order_sequence (day, last) VALUES (?, 1) '
+            'ON CONFLICT (day) DO UPDATE SET last = last + 1', (day_prefix,))
+        seq = conn.execute('SELECT last FROM order_sequence WHERE day = ?',
+                           (day_prefix,)).fetchone()[0]
+        order_id = format_order_id(day_prefix, seq)
+        # Un ID heredado (hex de uuid4) puede coincidir con uno numérico: se salta
+        if conn.execute('SELECT 1 FROM orders WHERE id = ?', (order_id,)).fetchone() is None:
+            return order_id
@@ -3,27 +3,51 @@
 Thermal Printer Bridge — Ebi Ball POS
 Detecta la impresora automáticamente, la habilita si está desactivada,
 y reintenta cuando se reconecta. No requiere configuración manual.
+
+El nombre de impresora también elige el transporte (ver print_transports):
+"tcp://192.168.1.50:9100" escribe directo al socket de la impresora y
+"/dev/usb/lp0" al dispositivo, sin lpr ni la cola de CUPS; cualquier otro
+nombre sigue usando lpr / print.
+
+Con varias impresoras (POS_PRINTERS="counter=Printer_POS_80,kitchen=EPSON_Cocina")
+cada una tiene su propio hilo y su propia cola, y los jobs se reparten por
+estación (ver print_queue en el servidor): un lpr lento o una impresora
+atascada solo detiene sus propios tickets.
 """
 
 import os
+import queue
 import re
+import threading
 import time
 import signal
 import subprocess
 import platform
-import tempfile
 import requests
 
+import print_transports
+
 # ── Configuración ─────────────────────────────────────────────────────────────
 SERVER_URL    = os.environ.get('POS_SERVER_URL', 'http://localhost:5001')
 PRINTER_NAME  = os.environ.get('POS_PRINTER_NAME', 'Printer_POS_80')
-POLL_INTERVAL = 2    # segundos entre revisiones de la cola
+# Impresoras por estación: "counter=Printer_POS_80,kitchen=EPSON_Cocina". Sin
+# definir, una sola impresora (la configurada en el servidor) imprime todo; las
+# estaciones sin impresora propia van a la primera de la lista.
+PRINTERS      = os.environ.get('POS_PRINTERS', '')
+# Identidad de este bridge en la cola (claimed_by); cada equipo con impresora
+# corre su propio bridge y reclama jobs sin duplicar tickets.
+BRIDGE_ID     = os.environ.get('POS_BRIDGE_ID') or f'{platform.node()}-{os.getpid()}'
+POLL_INTERVAL = 2    # segundos entre revisiones si el servidor no soporta long-poll, o tras un fallo
+LONG_POLL_WAIT = 25  # segundos que el servidor retiene /api/print_queue si no hay jobs nuevos
 MAX_WIDTH     = 42   # chars por línea para papel 80mm (deja margen derecho para evitar borrosidad)
 LEFT_MARGIN   = 6    # margen izquierdo (evita corte y zona gris del cabezal)
 FEED_LINES    = 4    # líneas en blanco al final del ticket (espacio para el corte manual)
 MAX_RETRIES   = 5    # abandonar job después de N fallos consecutivos
+ACK_BATCH     = 500  # ids por POST /api/mark_printed (límite del servidor)
+CLAIM_BATCH   = 10   # jobs por reclamo como máximo (ver PrinterWorker.claim_limit)
+LEASE_SECONDS = 120  # préstamo de un job reclamado; el servidor acepta hasta 600
 FALLOS_ANTES_REDETECTAR = 3   # re-detectar impresora tras N fallos seguidos
-VERIFICAR_IMPRESORA_CADA = 30 # revisar estado de impresora cada N ciclos (60s)
+VERIFICAR_IMPRESORA_CADA = 60 # revisar estado de impresora cada N segundos
 
 # Palabras clave para identificar impresoras POS/térmicas automáticamente
 KEYWORDS_POS = [
@@ -34,11 +58,135 @@ KEYWORDS_POS = [
 # ─────────────────────────────────────────────────────────────────────────────
 
 
+def parse_printers(spec):
+    """'counter=A,kitchen=B' → {'counter': 'A', 'kitchen': 'B'} (orden conservado)."""
+    impresoras = {}
+    for parte in (spec or '').split(','):
+        estacion, _, nombre = parte.partition('=')
+        if estacion.strip() and nombre.strip():
+            impresoras[estacion.strip()] = nombre.strip()
+    return impresoras
+
+
+class PrinterWorker:
+    """Una impresora con su propio hilo y su propia cola de jobs."""
+
+    def __init__(self, bridge, printer_name, stations=None, guardar=False):
+        self.bridge = bridge
+        self.printer_name = printer_name
+        self.stations = stations        # None = todas las estaciones
+        self.guardar = guardar          # la impresora configurada en el servidor
+        self.queue = queue.Queue()
+        self._ocupado = False
+        self._fallos_seguidos = 0       # para disparar re-detección
+        self._thread = None
+
+    def libre(self):
+        return not self._ocupado and self.queue.empty()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name=f'printer-{self.printer_name}')
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self.queue.put(None)
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            self._ocupado = True
+            try:
+                self.procesar(job)
+            except Exception as e:
+                print(f"[{self.printer_name}] Error inesperado (continuando): {e}")
+            finally:
+                self.bridge._terminado(job.get('id', '?'))
+                self._ocupado = False
+            # Con préstamos cada job se confirma en cuanto sale: si esperara al
+            # resto de la tanda el préstamo podría vencer y otro bridge (o el
+            # siguiente reclamo) lo imprimiría de nuevo. Sin préstamos basta
+            # un POST por tanda.
+            if self.bridge._claims or self.queue.empty():
+                self.bridge.confirmar_impresos()
+
+    def claim_limit(self):
+        """Jobs que esta impresora alcanza a terminar dentro del préstamo en el
+        peor caso (cada uno agota el timeout del transporte y la pausa tras un
+        fallo). Se reclaman solo cuando el worker está libre, así que ningún
+        job espera en la cola más de lo que dura su préstamo."""
+        peor_caso = self.bridge._transport(self.printer_name).max_seconds + POLL_INTERVAL
+        return max(1, min(CLAIM_BATCH, int(LEASE_SECONDS // peor_caso)))
+
+    def procesar(self, job):
+        bridge = self.bridge
+        job_id = job.get('id', '?')
+        # Con reclamos el servidor cuenta los intentos de todos los bridges
+        if 'attempts' in job:
+            fallos = job['attempts'] - 1
+        else:
+            fallos = bridge._fallos.get(job_id, 0)
+
+        # Abandonar job si superó el límite de reintentos
+        if fallos >= MAX_RETRIES:
+            print(f"Job {job_id}: {MAX_RETRIES} fallos — abandonando.")
+            bridge._marcar_impreso(job_id)
+            return False
+
+        intento = f" (reintento {fallos + 1})" if fallos else ""
+        print(f"[{self.printer_name}] Imprimiendo job {job_id}{intento}...")
+        if bridge.print_job(job, self.printer_name):
+            print(f"  OK — impreso correctamente.")
+            bridge._marcar_impreso(job_id)
+            self._fallos_seguidos = 0
+            return True
+
+        bridge._registrar_fallo(job_id, fallos)
+        self._fallos_seguidos += 1
+        restantes = MAX_RETRIES - (fallos + 1)
+        print(f"  FALLO — {restantes} intentos restantes para este job.")
+
+        # Re-detectar impresora tras varios fallos consecutivos
+        if self._fallos_seguidos >= FALLOS_ANTES_REDETECTAR:
+            self.redetectar()
+            self._fallos_seguidos = 0
+        time.sleep(POLL_INTERVAL)   # solo pausa esta impresora
+        return False
+
+    def redetectar(self):
+        """Vuelve a buscar la impresora. Llama cuando hay fallos consecutivos."""
+        print(f"[Impresora] Re-detectando '{self.printer_name}'...")
+        nuevo = self.bridge._verificar_y_activar(self.printer_name)
+        if nuevo != self.printer_name:
+            print(f"[Impresora] Cambiada a '{nuevo}'")
+            self.printer_name = nuevo
+            if self.guardar:
+                self.bridge._printer_name = nuevo
+                self.bridge._guardar_impresora(nuevo)
+
+
 class ThermalPrintBridge:
 
     def __init__(self):
         self._fallos = {}           # job_id → nº de fallos consecutivos
         self._fallos_globales = 0   # fallos seguidos para disparar re-detección
+        self._cursor = 0            # seq del último job visto (0 = cola completa)
+        self._long_poll = True      # se apaga si el servidor no regresa 'cursor'
+        self._claims = True         # se apaga si el servidor no tiene /api/print_queue/claim
+        self._por_confirmar = []    # ids impresos (o abandonados) aún sin mark_printed
+        self._en_curso = set()      # ids entregados a un worker y aún sin terminar
+        self._lock = threading.Lock()       # estado compartido con los workers
+        self._ack_lock = threading.Lock()   # un confirmar_impresos a la vez
+        self._workers = []
+        self._transports = {}       # nombre de impresora → transporte (conexión reutilizada)
+        self._latencia = {}         # tipo de transporte → LatencyStats
+        # Una sola sesión HTTP keep-alive: sondeo y confirmaciones reutilizan
+        # la conexión TCP en vez de abrir una por petición.
+        self._http = requests.Session()
         self._printer_name = self._leer_impresora()
         self._printer_name = self._verificar_y_activar(self._printer_name)
         print(f"Server URL:  {SERVER_URL}")
@@ -50,7 +198,7 @@ class ThermalPrintBridge:
     def _leer_impresora(self):
         """Lee el nombre guardado en la BD del servidor; usa env var como fallback."""
         try:
-            resp = requests.get(f'{SERVER_URL}/api/config', timeout=3)
+            resp = self._http.get(f'{SERVER_URL}/api/config', timeout=3)
             if resp.status_code == 200:
                 nombre = resp.json().get('printer_name', '').strip()
                 if nombre:
@@ -62,7 +210,7 @@ class ThermalPrintBridge:
     def _guardar_impresora(self, nombre):
         """Guarda el nombre detectado en la BD vía API para que persista."""
         try:
-            requests.post(
+            self._http.post(
                 f'{SERVER_URL}/api/config/printer',
                 json={'printer_name': nombre},
                 timeout=3,
@@ -133,6 +281,9 @@ class ThermalPrintBridge:
         # plano en cada reinicio, rompiendo la impresión de nuevo.
         if nombre_deseado.startswith('\\\\'):
             return nombre_deseado
+        # Socket o dispositivo directo: no pasa por CUPS ni por Windows
+        if print_transports.is_direct(nombre_deseado):
+            return nombre_deseado
 
         system = platform.system()
 
@@ -166,15 +317,6 @@ class ThermalPrintBridge:
         print(f"[Impresora] No se encontró impresora POS. Usando '{nombre_deseado}' como fallback.")
         return nombre_deseado
 
-    def redetectar(self):
-        """Vuelve a buscar la impresora. Llama cuando hay fallos consecutivos."""
-        print("[Impresora] Re-detectando impresora...")
-        nuevo = self._verificar_y_activar(self._printer_name)
-        if nuevo != self._printer_name:
-            print(f"[Impresora] Cambiada a '{nuevo}'")
-            self._printer_name = nuevo
-            self._guardar_impresora(nuevo)
-
     # ── Helpers de texto ──────────────────────────────────────────────────────
 
     def clean_text(self, text):
@@ -265,9 +407,52 @@ class ThermalPrintBridge:
 
     # ── Comunicación con la API ───────────────────────────────────────────────
 
+    def claim_jobs(self, stations=None, wait=LONG_POLL_WAIT, limit=CLAIM_BATCH):
+        """Reclama hasta `limit` jobs con préstamo (long-poll), solo de
+        `stations` si se indica. Devuelve None si la petición falló; si el
+        servidor no tiene el endpoint apaga el modo reclamo y usa
+        get_pending_jobs()."""
+        body = {'bridge': BRIDGE_ID, 'limit': limit,
+                'lease': LEASE_SECONDS, 'wait': wait}
+        if stations:
+            body['stations'] = stations
+        try:
+            resp = self._http.post(f'{SERVER_URL}/api/print_queue/claim',
+                                   json=body, timeout=wait + 5)
+            if resp.status_code in (404, 405):
+                print("Servidor sin reclamo de jobs — usando la cola compartida.")
+                self._claims = False
+                return self.get_pending_jobs()
+            if resp.status_code == 200:
+                try:
+                    return resp.json().get('jobs', [])
+                except ValueError:
+                    print("Respuesta no-JSON de /api/print_queue/claim — se ignora este ciclo.")
+        except requests.exceptions.RequestException as e:
+            print(f"Sin conexión al servidor: {e}")
+        return None
+
+    def liberar_jobs(self, job_ids):
+        """Devuelve a la cola los jobs que no se pudieron imprimir para que se
+        reintenten sin esperar a que venza el préstamo. Mejor esfuerzo."""
+        try:
+            self._http.post(f'{SERVER_URL}/api/print_queue/release',
+                            json={'bridge': BRIDGE_ID, 'ids': job_ids}, timeout=5)
+        except requests.exceptions.RequestException as e:
+            print(f"No se pudieron liberar {len(job_ids)} jobs: {e}")
+
     def get_pending_jobs(self):
+        """Jobs nuevos desde el último cursor. Con long-poll el servidor retiene
+        la petición hasta LONG_POLL_WAIT s y responde en cuanto se confirma un
+        job. Devuelve None si la petición falló (el llamador espera antes de
+        reintentar)."""
+        if self._long_poll:
+            params = {'since': self._cursor, 'wait': LONG_POLL_WAIT}
+            timeout = LONG_POLL_WAIT + 5
+        else:
+            params, timeout = None, 5
         try:
-            resp = requests.get(f'{SERVER_URL}/api/print_queue', timeout=5)
+            resp = self._http.get(f'{SERVER_URL}/api/print_queue', params=params, timeout=timeout)
             if resp.status_code == 200:
                 try:
                     data = resp.json()
@@ -275,86 +460,172 @@ class ThermalPrintBridge:
                     # Respuesta 200 pero no-JSON (p. ej. una página de error
                     # HTML mientras Flask reinicia). No es fatal: seguir sondeando.
                     print("Respuesta no-JSON de /api/print_queue — se ignora este ciclo.")
-                    return []
+                    return None
+                if 'cursor' in data:
+                    self._cursor = data['cursor']
+                elif self._long_poll:
+                    print("Servidor sin long-poll — sondeando cada "
+                          f"{POLL_INTERVAL}s.")
+                    self._long_poll = False
                 return data.get('jobs', [])
         except requests.exceptions.RequestException as e:
             print(f"Sin conexión al servidor: {e}")
-        return []
+        return None
 
     def mark_job_printed(self, job_id):
         try:
-            requests.post(f'{SERVER_URL}/api/mark_printed/{job_id}', timeout=5)
+            resp = self._http.post(f'{SERVER_URL}/api/mark_printed/{job_id}', timeout=5)
+            return resp.status_code == 200
         except requests.exceptions.RequestException as e:
             print(f"No se pudo marcar job {job_id}: {e}")
+            return False
 
-    # ── Impresión ─────────────────────────────────────────────────────────────
-
-    def send_to_printer(self, formatted_text):
-        system = platform.system()
-
-        if system == 'Windows':
-            tmp_path = None
-            try:
-                raw_data = formatted_text if isinstance(formatted_text, bytes) else formatted_text.encode('ascii', errors='replace')
-                with tempfile.NamedTemporaryFile(
-                    mode='wb', suffix='.bin', delete=False,
-                ) as tmp:
-                    tmp.write(raw_data)
-                    tmp_path = tmp.name
-                result = subprocess.run(
-                    ['print', f'/D:{self._printer_name}', tmp_path],
-                    capture_output=True, text=True, timeout=30,
-                )
-                if result.returncode != 0:
-                    print(f"Error de impresión Windows: {result.stderr}")
-                return result.returncode == 0
-            except Exception as e:
-                print(f"Error Windows: {e}")
-                return False
-            finally:
-                if tmp_path:
-                    try:
-                        os.unlink(tmp_path)
-                    except Exception:
-                        pass
-
-        elif system in ('Darwin', 'Linux'):
-            try:
-                # Enviar como bytes (necesario para comandos ESC/POS binarios)
-                raw_data = formatted_text if isinstance(formatted_text, bytes) else formatted_text.encode('ascii', errors='replace')
-                result = subprocess.run(
-                    ['lpr', '-P', self._printer_name, '-o', 'raw'],
-                    input=raw_data,
-                    capture_output=True,
-                    timeout=30,
-                )
-                if result.returncode != 0:
-                    print(f"lpr error: {result.stderr}")
-                return result.returncode == 0
-            except Exception as e:
-                print(f"Error Unix: {e}")
-                return False
+    def confirmar_impresos(self):
+        """Confirma en lote los jobs de _por_confirmar: una petición (y una
+        transacción en el servidor) por cada ACK_BATCH ids. Lo que no se pudo
+        confirmar se queda en la lista para el siguiente ciclo."""
+        with self._ack_lock:
+            while True:
+                with self._lock:
+                    lote = self._por_confirmar[:ACK_BATCH]
+                if not lote:
+                    return True
+                try:
+                    resp = self._http.post(f'{SERVER_URL}/api/mark_printed',
+                                           json={'ids': lote}, timeout=5)
+                except requests.exceptions.RequestException as e:
+                    print(f"No se pudieron marcar {len(lote)} jobs: {e}")
+                    return False
+                if resp.status_code in (404, 405):
+                    # Servidor sin confirmación en lote: uno por uno
+                    if not all(self.mark_job_printed(job_id) for job_id in lote):
+                        return False
+                elif resp.status_code != 200:
+                    print(f"mark_printed respondió {resp.status_code}")
+                    return False
+                with self._lock:
+                    del self._por_confirmar[:len(lote)]
+
+    # ── Estado compartido con los workers ─────────────────────────────────────
+
+    def _marcar_impreso(self, job_id):
+        with self._lock:
+            self._por_confirmar.append(job_id)
+            self._fallos.pop(job_id, None)
+
+    def _registrar_fallo(self, job_id, fallos):
+        with self._lock:
+            self._fallos[job_id] = fallos + 1
+            # El job fallido sigue pendiente pero ya quedó atrás del cursor:
+            # pedir la cola completa en el siguiente ciclo.
+            self._cursor = 0
+        if self._claims:
+            self.liberar_jobs([job_id])
+
+    def _terminado(self, job_id):
+        with self._lock:
+            self._en_curso.discard(job_id)
+
+    def _crear_workers(self):
+        """Un worker por impresora de POS_PRINTERS (varias estaciones pueden
+        compartir impresora); sin POS_PRINTERS, uno solo para todo."""
+        impresoras = parse_printers(PRINTERS)
+        if not impresoras:
+            return [PrinterWorker(self, self._printer_name, None, guardar=True)]
+        por_nombre = {}
+        for estacion, nombre in impresoras.items():
+            por_nombre.setdefault(nombre, []).append(estacion)
+        return [PrinterWorker(self, self._verificar_y_activar(nombre), estaciones)
+                for nombre, estaciones in por_nombre.items()]
+
+    def _worker_para(self, job):
+        station = job.get('station') or 'counter'
+        for worker in self._workers:
+            if worker.stations is None or station in worker.stations:
+                return worker
+        return self._workers[0]
+
+    def repartir(self, jobs):
+        """Encola cada job en el worker de su estación. Un job que ya está en
+        una cola o impreso sin confirmar no se vuelve a encolar."""
+        for job in jobs:
+            job_id = job.get('id', '?')
+            with self._lock:
+                if job_id in self._en_curso or job_id in self._por_confirmar:
+                    continue
+                self._en_curso.add(job_id)
+            self._worker_para(job).queue.put(job)
 
-        else:
-            print(f"OS no soportado: {system}")
-            return False
+    # ── Impresión ─────────────────────────────────────────────────────────────
 
-    def print_job(self, job):
+    def _transport(self, printer_name):
+        with self._lock:
+            transport = self._transports.get(printer_name)
+            if transport is None:
+                transport = self._transports[printer_name] = print_transports.transport_for(printer_name)
+            return transport
+
+    def send_to_printer(self, formatted_text, printer_name=None):
+        """Envía los bytes por el transporte de la impresora (socket 9100,
+        dispositivo o cola del sistema) y registra la latencia del envío."""
+        transport = self._transport(printer_name or self._printer_name)
+        # Enviar como bytes (necesario para comandos ESC/POS binarios)
+        raw_data = formatted_text if isinstance(formatted_text, bytes) else formatted_text.encode('ascii', errors='replace')
+        inicio = time.monotonic()
+        try:
+            transport.send(raw_data)
+            ok = True
+        except print_transports.TransportError as e:
+            print(f"Error de impresión ({transport.kind}): {e}")
+            ok = False
+        ms = (time.monotonic() - inicio) * 1000
+        with self._lock:
+            stats = self._latencia.get(transport.kind)
+            if stats is None:
+                stats = self._latencia[transport.kind] = print_transports.LatencyStats()
+        stats.observe(ms, ok)
+        return ok
+
+    def latency_report(self):
+        """{transporte: {count, errors, avg_ms, max_ms, p50_ms, p99_ms}}"""
+        with self._lock:
+            latencia = dict(self._latencia)
+        return {kind: stats.snapshot() for kind, stats in latencia.items()}
+
+    def _imprimir_latencia(self):
+        for kind, data in sorted(self.latency_report().items()):
+            print(f"[Latencia] {kind}: {data['count']} envíos, {data['errors']} errores, "
+                  f"p50 {data['p50_ms']} ms, p99 {data['p99_ms']} ms, máx {data['max_ms']} ms")
+
+    def close_transports(self):
+        with self._lock:
+            transports = list(self._transports.values())
+            self._transports.clear()
+        for transport in transports:
+            transport.close()
+
+    def print_job(self, job, printer_name=None):
         receipt_content = job.get('receipt_content', '')
         if not receipt_content:
             print(f"Job {job.get('id')} sin contenido — omitiendo")
             return False
-        return self.send_to_printer(self.format_for_printer(receipt_content))
+        return self.send_to_printer(self.format_for_printer(receipt_content), printer_name)
 
     # ── Loop principal ────────────────────────────────────────────────────────
 
     def run(self):
+        self._workers = self._crear_workers()
         print("Print Bridge iniciado")
-        print(f"Servidor: {SERVER_URL}  |  Revisión cada {POLL_INTERVAL}s")
-        print(f"Impresora activa: {self._printer_name}")
+        print(f"Servidor: {SERVER_URL}  |  Long-poll de {LONG_POLL_WAIT}s "
+              f"(sondeo cada {POLL_INTERVAL}s como respaldo)")
+        for worker in self._workers:
+            estaciones = ', '.join(worker.stations) if worker.stations else 'todas'
+            print(f"Impresora activa: {worker.printer_name}  ({estaciones})")
         print('-' * 50)
+        for worker in self._workers:
+            worker.start()
 
-        ciclos_sin_verificar = 0
+        ultima_verificacion = time.monotonic()
 
         # El bucle debe ser resiliente: cualquier error de un ciclo (red, JSON
         # inválido, impresora, etc.) se registra y el sondeo CONTINÚA. Solo se
@@ -362,51 +633,50 @@ class ThermalPrintBridge:
         # que el handler convierte en KeyboardInterrupt). Antes, un ValueError
         # de resp.json() caía al except global y el proceso terminaba con
         # código 0, deteniendo la impresión en silencio y sin reinicio.
+        # Este hilo solo reparte: imprimir y confirmar lo hacen los workers.
         while True:
             try:
-                # Verificar proactivamente que la impresora sigue habilitada
-                # aunque no haya jobs — evita que CUPS la deje desactivada silenciosamente
-                ciclos_sin_verificar += 1
-                if ciclos_sin_verificar >= VERIFICAR_IMPRESORA_CADA:
-                    self._verificar_y_activar(self._printer_name)
-                    ciclos_sin_verificar = 0
-
-                jobs = self.get_pending_jobs()
-                for job in jobs:
-                    job_id = job.get('id', '?')
-                    fallos = self._fallos.get(job_id, 0)
-
-                    # Abandonar job si superó el límite de reintentos
-                    if fallos >= MAX_RETRIES:
-                        print(f"Job {job_id}: {MAX_RETRIES} fallos — abandonando.")
-                        self.mark_job_printed(job_id)
-                        self._fallos.pop(job_id, None)
-                        continue
-
-                    intento = f" (reintento {fallos + 1})" if fallos else ""
-                    print(f"Imprimiendo job {job_id}{intento}...")
-                    success = self.print_job(job)
-
-                    if success:
-                        print(f"  OK — impreso correctamente.")
-                        self.mark_job_printed(job_id)
-                        self._fallos.pop(job_id, None)
-                        self._fallos_globales = 0
-                    else:
-                        self._fallos[job_id] = fallos + 1
-                        self._fallos_globales += 1
-                        restantes = MAX_RETRIES - (fallos + 1)
-                        print(f"  FALLO — {restantes} intentos restantes para este job.")
-
-                        # Re-detectar impresora tras varios fallos consecutivos
-                        if self._fallos_globales >= FALLOS_ANTES_REDETECTAR:
-                            self.redetectar()
-                            self._fallos_globales = 0
-
-                time.sleep(POLL_INTERVAL)
+                # Verificar proactivamente que las impresoras siguen habilitadas
+                # aunque no haya jobs — evita que CUPS las deje desactivadas silenciosamente
+                if time.monotonic() - ultima_verificacion >= VERIFICAR_IMPRESORA_CADA:
+                    for worker in self._workers:
+                        self._verificar_y_activar(worker.printer_name)
+                    self._imprimir_latencia()
+                    ultima_verificacion = time.monotonic()
+
+                # Solo se reclaman jobs para impresoras libres: los de una
+                # impresora atascada se quedan en el servidor (o los toma otro bridge)
+                libres = [w for w in self._workers if w.libre()]
+                if not libres:
+                    time.sleep(0.2)
+                    continue
+                if len(libres) == len(self._workers) or any(w.stations is None for w in libres):
+                    stations, wait = None, LONG_POLL_WAIT
+                else:
+                    stations = sorted({s for w in libres for s in w.stations})
+                    wait = POLL_INTERVAL   # volver pronto por las que se liberen
+
+                if self._claims:
+                    # Los jobs de un reclamo pueden caer todos en la misma
+                    # impresora: el límite es el de la más lenta de las libres
+                    jobs = self.claim_jobs(stations, wait, min(w.claim_limit() for w in libres))
+                else:
+                    jobs = self.get_pending_jobs()
+                if jobs is None:
+                    time.sleep(POLL_INTERVAL)
+                    continue
+                self.repartir(jobs)
+
+                if not self._long_poll:
+                    time.sleep(POLL_INTERVAL)
 
             except (KeyboardInterrupt, SystemExit):
                 print("\nPrint bridge detenido.")
+                for worker in self._workers:
+                    worker.stop()
+                self.confirmar_impresos()
+                self.close_transports()
+                self._imprimir_latencia()
                 break
             except Exception as e:
                 # Error inesperado en este ciclo — registrar y seguir sondeando.
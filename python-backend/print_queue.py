@@ -0,0 +1,158 @@
+"""Cola de impresión: consulta por cursor y aviso inmediato al print bridge.
+
+Antes el bridge pedía /api/print_queue cada 2 s y recibía el contenido de
+TODOS los pendientes en cada vuelta. Ahora:
+
+  * Cada job tiene un cursor `seq` (el rowid de print_jobs, creciente).
+    GET /api/print_queue?since=<seq> regresa solo los pendientes nuevos y el
+    cursor a usar en la siguiente petición; since=0 es la cola completa.
+  * Con wait=<segundos> es long-poll: si no hay nada nuevo la petición espera
+    hasta que otra transacción confirme un job (notify()) o venza el plazo.
+    Un ticket empieza a imprimirse en cuanto se confirma la venta y un local
+    sin ventas hace una petición cada ~25 s en vez de cada 2.
+
+notify() se llama DESPUÉS del commit que insertó en print_jobs, así el
+bridge nunca despierta antes de que el job sea visible.
+
+Los jobs impresos se confirman en lote (POST /api/mark_printed con una lista
+de ids): después de una falla de impresora, vaciar 50 tickets acumulados es
+una sola petición y una sola transacción.
+
+Varios bridges (mostrador, cocina) reparten la cola con préstamos (leases):
+POST /api/print_queue/claim reserva hasta N jobs para un bridge durante
+`lease` segundos, en una transacción de escritura, así dos bridges nunca
+reciben el mismo job. Si el bridge no confirma antes de que venza el
+préstamo, el job vuelve a estar disponible (entrega al-menos-una-vez);
+`attempts` cuenta cuántas veces se ha reclamado y `claimed_by` quién lo
+tiene. Un job con préstamo vigente tampoco aparece en GET /api/print_queue.
+
+Cada job lleva una estación (`station`): el ticket del cliente va al
+mostrador y, con config kitchen_tickets activo, la comanda con el sushi y las
+bolas de arroz va a cocina. Un bridge puede reclamar solo ciertas estaciones.
+"""
+import threading
+import time
+
+MAX_WAIT = 25.0   # segundos máximos que se retiene una petición long-poll
+MAX_ACK = 500     # ids por petición de mark_printed en lote
+DEFAULT_LEASE = 60.0   # segundos; más que el timeout de impresión del bridge (30 s)
+MIN_LEASE = 5.0
+MAX_LEASE = 600.0
+MAX_CLAIM = 50         # jobs por reclamo
+
+STATION_COUNTER = 'counter'
+STATION_KITCHEN = 'kitchen'
+KITCHEN_TYPES = ('Sushi', 'Bola de Arroz')   # líneas que prepara cocina
+
+_cond = threading.Condition()
+_version = 0
+
+
+def version():
+    with _cond:
+        return _version
+
+
+def notify():
+    """Despierta a las peticiones en espera: hay jobs nuevos confirmados."""
+    global _version
+    with _cond:
+        _version += 1
+        _cond.notify_all()
+
+
+def wait_for_jobs(seen_version, timeout):
+    """Espera hasta que version() cambie respecto a `seen_version` o venza el
+    plazo. Devuelve True si hubo un aviso."""
+    with _cond:
+        return _cond.wait_for(lambda: _version != seen_version, timeout=timeout)
+
+
+def queue_jobs(conn, jobs, created_at):
+    """Inserta (id, estación, contenido) en print_jobs sin commit. Un id que
+    ya existe se ignora. Llamar notify() después del commit."""
+    conn.executemany(
+        "INSERT OR IGNORE INTO print_jobs (id, receipt_content, status, created_at, station) "
+        "VALUES (?, ?, 'pending', ?, ?)",
+        [(job_id, content, created_at, station) for job_id, station, content in jobs])
+
+
+def last_seq(conn):
+    return conn.execute('SELECT COALESCE(MAX(rowid), 0) FROM print_jobs').fetchone()[0]
+
+
+def pending_jobs(conn, since=0):
+    """Pendientes con seq > since, en orden de llegada. Devuelve (jobs, cursor).
+
+    Si `since` es mayor que el último seq (la BD se restauró de un respaldo),
+    el cursor ya no sirve y se regresa la cola completa."""
+    ultimo = last_seq(conn)
+    if since > ultimo:
+        since = 0
+    now = time.time()
+    if since:
+        rows = conn.execute(
+            "SELECT rowid AS seq, id, receipt_content, status, created_at, station "
+            "FROM print_jobs WHERE status = 'pending' AND (lease_until IS NULL OR lease_until <= ?) "
+            "AND rowid > ? ORDER BY rowid", (now, since)
+        ).fetchall()
+    else:
+        # Cola completa: índice parcial de pendientes (print_jobs nunca se purga)
+        rows = conn.execute(
+            "SELECT rowid AS seq, id, receipt_content, status, created_at, station "
+            "FROM print_jobs WHERE status = 'pending' AND (lease_until IS NULL OR lease_until <= ?) "
+            "ORDER BY created_at", (now,)
+        ).fetchall()
+    jobs = [dict(r) for r in rows]
+    # Un job confirmado entre last_seq() y el SELECT ya viene en `jobs`
+    return jobs, max([ultimo] + [j['seq'] for j in jobs])
+
+
+def mark_printed(conn, job_ids):
+    """Marca los jobs como impresos en la transacción abierta de `conn`.
+    Devuelve cuántos cambiaron de estado."""
+    antes = conn.total_changes
+    conn.executemany("UPDATE print_jobs SET status = 'printed', lease_until = NULL WHERE id = ?",
+                     [(job_id,) for job_id in job_ids])
+    return conn.total_changes - antes
+
+
+def claim_jobs(conn, bridge, limit, lease=DEFAULT_LEASE, stations=None):
+    """Reserva para `bridge` hasta `limit` jobs pendientes sin préstamo vigente
+    (o con préstamo vencido), en la transacción de escritura abierta de `conn`.
+    Con `stations` solo jobs de esas estaciones. Devuelve los jobs reservados
+    con su `attempts` y `lease_until`."""
+    now = time.time()
+    filtro, params = '', [now]
+    if stations:
+        filtro = f" AND station IN ({', '.join('?' * len(stations))})"
+        params += list(stations)
+    rows = conn.execute(
+        "SELECT rowid AS seq, id, receipt_content, status, created_at, attempts, station "
+        "FROM print_jobs WHERE status = 'pending' AND (lease_until IS NULL OR lease_until <= ?)"
+        f"{filtro} ORDER BY created_at, rowid LIMIT ?", params + [limit]
+    ).fetchall()
+    hasta = now + lease
+    conn.executemany(
+        "UPDATE print_jobs SET claimed_by = ?, lease_until = ?, attempts = attempts + 1 "
+        "WHERE id = ?", [(bridge, hasta, r['id']) for r in rows])
+    return [dict(r, attempts=r['attempts'] + 1, lease_until=hasta, claimed_by=bridge)
+            for r in rows]
+
+
+def next_lease_expiry(conn):
+    """Epoch del préstamo vigente que vence primero, o None."""
+    return conn.execute(
+        "SELECT MIN(lease_until) FROM print_jobs WHERE status = 'pending' AND lease_until > ?",
+        (time.time(),)).fetchone()[0]
+
+
+def release_jobs(conn, bridge, job_ids):
+    """Devuelve a la cola los jobs que `bridge` no pudo imprimir (sin esperar a
+    que venza el préstamo). Solo libera los que siguen siendo suyos."""
+    antes = conn.total_changes
+    conn.executemany(
+        "UPDATE print_jobs SET lease_until = NULL "
+        "WHERE id = ? AND claimed_by = ? AND status = 'pending'",
+        [(job_id, bridge) for job_id in job_ids])
+    return conn.total_changes - antes
@@ -0,0 +1,302 @@
+"""Transportes del print bridge: cómo llegan los bytes ESC/POS a la impresora.
+
+Antes cada ticket lanzaba `lpr` (o un archivo temporal más `print /D:` en
+Windows): un proceso nuevo y la cola de CUPS por cada recibo, y CUPS
+deshabilita la cola cuando la impresora falla. El nombre de impresora decide
+el transporte:
+
+    tcp://192.168.1.50[:9100]   socket crudo (JetDirect / puerto 9100)
+    /dev/usb/lp0, file:///dev/usb/lp0, COM1:, LPT1:   archivo de dispositivo
+    cualquier otro nombre       cola del sistema (lpr -o raw / print /D:)
+
+TCP y dispositivo dejan la conexión abierta entre tickets y la cierran tras
+IDLE_CLOSE segundos sin uso (una impresora 9100 atiende un cliente a la vez).
+Cada escritura tiene plazo (WRITE_TIMEOUT): una impresora sin papel o
+desconectada hace fallar el envío en vez de colgar al worker. El socket usa
+su timeout; el dispositivo, O_NONBLOCK + select(). En Windows select() no
+sirve con archivos: la escritura bloqueante corre en un hilo auxiliar y, si
+no termina a tiempo, el descriptor se abandona (el hilo lo cierra cuando
+la escritura por fin regresa) y el envío falla.
+
+Este módulo corre en la PC de la impresora junto con print_bridge.py: solo
+usa la biblioteca estándar (nada de Flask ni de la BD).
+"""
+import os
+import platform
+import select
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from collections import deque
+
+RAW_PORT = 9100
+CONNECT_TIMEOUT = 3.0   # segundos para abrir el socket
+WRITE_TIMEOUT = 10.0    # segundos máximos para entregar un ticket
+IDLE_CLOSE = 30.0       # cerrar la conexión tras N segundos sin tickets
+SPOOLER_TIMEOUT = 30    # lpr / print
+LATENCY_SAMPLES = 500   # envíos recientes para los percentiles
+
+
+class TransportError(Exception):
+    """La impresora no recibió el ticket completo."""
+
+
+class LatencyStats:
+    """Latencia de envío por transporte: conteo, errores y percentiles de los
+    últimos LATENCY_SAMPLES envíos."""
+
+    def __init__(self, samples=LATENCY_SAMPLES):
+        self._recent = deque(maxlen=samples)
+        self._count = 0
+        self._errors = 0
+        self._total = 0.0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, ms, ok=True):
+        with self._lock:
+            self._count += 1
+            if not ok:
+                self._errors += 1
+            self._total += ms
+            self._max = max(self._max, ms)
+            self._recent.append(ms)
+
+    def snapshot(self):
+        with self._lock:
+            recent = sorted(self._recent)
+            data = {'count': self._count, 'errors': self._errors,
+                    'avg_ms': round(self._total / self._count, 3) if self._count else 0.0,
+                    'max_ms': round(self._max, 3)}
+        for nombre, pct in (('p50_ms', 50), ('p99_ms', 99)):
+            data[nombre] = round(recent[min(len(recent) - 1, len(recent) * pct // 100)], 3) if recent else 0.0
+        return data
+
+
+class RawSocketTransport:
+    """ESC/POS directo al puerto 9100 con la conexión reutilizada."""
+    kind = 'tcp'
+
+    def __init__(self, host, port=RAW_PORT, connect_timeout=CONNECT_TIMEOUT,
+                 write_timeout=WRITE_TIMEOUT, idle_close=IDLE_CLOSE):
+        self.host = host
+        self.port = port
+        self.connect_timeout = connect_timeout
+        self.write_timeout = write_timeout
+        self.idle_close = idle_close
+        self.max_seconds = connect_timeout + write_timeout   # peor caso de un envío
+        self._sock = None
+        self._last_used = 0.0
+        self.connects = 0
+
+    def _cerrada_por_impresora(self):
+        """True si la impresora cerró su lado mientras la conexión estaba ociosa
+        (muchas cierran tras cada trabajo): el siguiente sendall 'funcionaría'
+        y los bytes se perderían."""
+        try:
+            legible, _, _ = select.select([self._sock], [], [], 0)
+            # Legible sin datos pendientes = EOF; los bytes de estado se descartan
+            return bool(legible) and self._sock.recv(1024) == b''
+        except OSError:
+            return True
+
+    def _conexion(self):
+        if self._sock is not None and (
+                time.monotonic() - self._last_used > self.idle_close
+                or self._cerrada_por_impresora()):
+            self.close()
+        if self._sock is None:
+            self._sock = socket.create_connection((self.host, self.port),
+                                                  timeout=self.connect_timeout)
+            self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.connects += 1
+        return self._sock
+
+    def send(self, data):
+        try:
+            sock = self._conexion()
+            sock.settimeout(self.write_timeout)
+            sock.sendall(data)
+        except OSError as e:
+            self.close()
+            raise TransportError(f'{self.host}:{self.port}: {e}') from e
+        self._last_used = time.monotonic()
+
+    def close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+
+    def __str__(self):
+        return f'tcp://{self.host}:{self.port}'
+
+
+class DeviceFileTransport:
+    """Escritura directa al archivo de dispositivo (/dev/usb/lp0, COM1:)."""
+    kind = 'device'
+
+    def __init__(self, path, write_timeout=WRITE_TIMEOUT, idle_close=IDLE_CLOSE):
+        self.path = path
+        self.write_timeout = write_timeout
+        self.idle_close = idle_close
+        self.max_seconds = write_timeout
+        self._fd = None
+        self._last_used = 0.0
+        # En Windows select() no sirve con archivos: escritura bloqueante
+        # en un hilo auxiliar (ver _escribir_en_hilo)
+        self._sin_bloqueo = os.name != 'nt'
+
+    def _abrir(self):
+        if self._fd is not None and time.monotonic() - self._last_used > self.idle_close:
+            self.close()
+        if self._fd is None:
+            flags = os.O_WRONLY | getattr(os, 'O_BINARY', 0)
+            if self._sin_bloqueo:
+                flags |= os.O_NONBLOCK
+            self._fd = os.open(self.path, flags)
+        return self._fd
+
+    def send(self, data):
+        try:
+            fd = self._abrir()
+            if not self._sin_bloqueo:
+                self._escribir_en_hilo(fd, data)
+            else:
+                limite = time.monotonic() + self.write_timeout
+                vista = memoryview(data)
+                while vista:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        raise TimeoutError(f'{len(vista)} bytes sin escribir')
+                    _, escribible, _ = select.select([], [fd], [], restante)
+                    if not escribible:
+                        continue
+                    try:
+                        vista = vista[os.write(fd, vista):]
+                    except BlockingIOError:
+                        pass
+        except OSError as e:
+            self.close()
+            raise TransportError(f'{self.path}: {e}') from e
+        self._last_used = time.monotonic()
+
+    def _escribir_en_hilo(self, fd, data):
+        """os.write bloqueante con plazo: si el hilo no termina en
+        write_timeout, el descriptor queda en manos del hilo (que lo cierra
+        al regresar) y el siguiente envío abre uno nuevo."""
+        estado = {'error': None, 'abandonado': False}
+        cerrojo = threading.Lock()
+
+        def escribir():
+            try:
+                vista = memoryview(data)
+                while vista:
+                    vista = vista[os.write(fd, vista):]
+            except OSError as e:
+                estado['error'] = e
+            with cerrojo:
+                if estado['abandonado']:
+                    try:
+                        os.close(fd)
+                    except OSError:
+                        pass
+
+        hilo = threading.Thread(target=escribir, name=f'device-write {self.path}', daemon=True)
+        hilo.start()
+        hilo.join(self.write_timeout)
+        with cerrojo:
+            if hilo.is_alive():
+                estado['abandonado'] = True
+                self._fd = None     # close() no debe cerrarlo bajo el hilo
+                raise TimeoutError(f'{len(data)} bytes sin confirmar en {self.write_timeout}s')
+        if estado['error'] is not None:
+            raise estado['error']
+
+    def close(self):
+        if self._fd is not None:
+            try:
+                os.close(self._fd)
+            except OSError:
+                pass
+            self._fd = None
+
+    def __str__(self):
+        return self.path
+
+
+class SpoolerTransport:
+    """Cola del sistema: `lpr -o raw` (CUPS) o `print /D:` en Windows."""
+    kind = 'spooler'
+
+    def __init__(self, printer_name, timeout=SPOOLER_TIMEOUT):
+        self.printer_name = printer_name
+        self.timeout = timeout
+        self.max_seconds = timeout
+
+    def send(self, data):
+        system = platform.system()
+        if system == 'Windows':
+            tmp_path = None
+            try:
+                with tempfile.NamedTemporaryFile(mode='wb', suffix='.bin', delete=False) as tmp:
+                    tmp.write(data)
+                    tmp_path = tmp.name
+                result = subprocess.run(
+                    ['print', f'/D:{self.printer_name}', tmp_path],
+                    capture_output=True, text=True, timeout=self.timeout,
+                )
+            except (OSError, subprocess.SubprocessError) as e:
+                raise TransportError(f'Windows: {e}') from e
+            finally:
+                if tmp_path:
+                    try:
+                        os.unlink(tmp_path)
+                    except OSError:
+                        pass
+            if result.returncode != 0:
+                raise TransportError(f'print: {result.stderr}')
+        elif system in ('Darwin', 'Linux'):
+            try:
+                result = subprocess.run(
+                    ['lpr', '-P', self.printer_name, '-o', 'raw'],
+                    input=data, capture_output=True, timeout=self.timeout,
+                )
+            except (OSError, subprocess.SubprocessError) as e:
+                raise TransportError(f'lpr: {e}') from e
+            if result.returncode != 0:
+                raise TransportError(f'lpr: {result.stderr}')
+        else:
+            raise TransportError(f'OS no soportado: {system}')
+
+    def close(self):
+        pass
+
+    def __str__(self):
+        return self.printer_name
+
+
+def is_direct(printer_name):
+    """True si el nombre es un socket o dispositivo (no pasa por CUPS/Windows)."""
+    nombre = printer_name.lower()
+    puerto = nombre.rstrip(':')
+    return (nombre.startswith(('tcp://', 'file://', '/dev/'))
+            or (puerto.startswith(('com', 'lpt')) and puerto[3:].isdigit()))
+
+
+def transport_for(printer_name):
+    """Transporte para un nombre de impresora (ver el docstring del módulo)."""
+    if printer_name.lower().startswith('tcp://'):
+        host, _, port = printer_name[6:].rstrip('/').rpartition(':')
+        if not host or not port.isdigit():
+            host, port = printer_name[6:].rstrip('/'), RAW_PORT
+        return RawSocketTransport(host.strip('[]'), int(port))
+    if printer_name.lower().startswith('file://'):
+        return DeviceFileTransport(printer_name[7:])
+    if is_direct(printer_name):
+        return DeviceFileTransport(printer_name)
+    return SpoolerTransport(printer_name)
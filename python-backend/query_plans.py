@@ -0,0 +1,73 @@
+"""Revisión de planes (EXPLAIN QUERY PLAN) de las consultas calientes.
+
+HOT_QUERIES replica los filtros que corren en cada carga o sondeo (cola de
+impresión, bitácora, nómina, clientes, historial, reportes). full_scans()
+devuelve las que SQLite todavía resuelve recorriendo la tabla completa, para
+detectar un índice faltante antes de que se note en horas pico. Se expone en
+/admin/api/db-stats y lo verifica tests/test_query_plans.py.
+"""
+import re
+
+_DIA = ('2026-01-01 00:00:00', '2026-01-01 23:59:59')
+
+# nombre → (sql, parámetros de ejemplo)
+HOT_QUERIES = {
+    'print_queue': (
+        "SELECT rowid AS seq, id, receipt_content, status, created_at, station "
+        "FROM print_jobs WHERE status = 'pending' AND (lease_until IS NULL OR lease_until <= ?) "
+        "ORDER BY created_at", (0,)),
+    'print_queue_since': (
+        "SELECT rowid AS seq, id, receipt_content, status, created_at, station "
+        "FROM print_jobs WHERE status = 'pending' AND (lease_until IS NULL OR lease_until <= ?) "
+        "AND rowid > ? ORDER BY rowid", (0, 100)),
+    'print_claim': (
+        "SELECT rowid AS seq, id, receipt_content, status, created_at, attempts, station "
+        "FROM print_jobs WHERE status = 'pending' AND (lease_until IS NULL OR lease_until <= ?) "
+        "AND station IN (?) ORDER BY created_at, rowid LIMIT ?", (0, 'kitchen', 10)),
+    'pending_prints': (
+        "SELECT COUNT(*) FROM print_jobs WHERE status = 'pending'", ()),
+    'activity_log': (
+        'SELECT * FROM activity_log ORDER BY timestamp DESC LIMIT 200', ()),
+    'employee_schedule': (
+        'SELECT * FROM employee_schedules WHERE employee_id = ? AND effective_from <= ? '
+        'ORDER BY effective_from DESC, id DESC LIMIT 1', (1, '2026-01-05')),
+    'frequent_customers': (
+        "SELECT customer_name, COUNT(*) as visits, COALESCE(SUM(total_cents),0) / 100.0 as spent "
+        "FROM orders WHERE status != 'voided' AND customer_name IS NOT NULL "
+        "AND customer_name != '' AND customer_name != 'Cliente' "
+        "GROUP BY customer_name HAVING visits > 1 ORDER BY visits DESC LIMIT ?", (15,)),
+    'customer_orders': (
+        'SELECT id, customer_name, total, payment_method, date, status '
+        'FROM orders WHERE customer_name = ? ORDER BY date DESC LIMIT 20', ('Ana',)),
+    'voided_history': (
+        "SELECT * FROM orders WHERE date >= ? AND date <= ? AND status = 'voided' "
+        "ORDER BY date DESC LIMIT 500", _DIA),
+    'period_orders': (
+        "SELECT COUNT(*), COALESCE(SUM(total_cents),0) / 100.0 FROM orders "
+        "WHERE date >= ? AND date <= ? AND status != 'voided'", _DIA),
+    'top_items': (
+        "SELECT oi.name, SUM(oi.quantity) AS qty FROM order_items oi "
+        "JOIN orders o ON o.id = oi.order_id WHERE o.date >= ? AND o.date <= ? "
+        "AND o.status != 'voided' GROUP BY oi.name ORDER BY qty DESC LIMIT 10", _DIA),
+    'daily_sales': (
+        'SELECT SUM(orders), SUM(revenue_cents) FROM daily_sales WHERE day >= ? AND day <= ?',
+        ('2026-01-01', '2026-01-31')),
+}
+
+# "SCAN orders" (SQLite ≥ 3.36) o "SCAN TABLE orders AS o": sin "USING ... INDEX"
+_FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+
+
+def plan(conn, sql, params=()):
+    """Líneas de detalle de EXPLAIN QUERY PLAN."""
+    return [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()]
+
+
+def full_scans(conn, queries=None):
+    """{nombre: [tablas recorridas completas]} de las consultas sin índice."""
+    resultado = {}
+    for name, (sql, params) in (queries or HOT_QUERIES).items():
+        tablas = [m.group(1) for m in map(_FULL_SCAN.match, plan(conn, sql, params)) if m]
+        if tablas:
+            resultado[name] = tablas
+    return resultado
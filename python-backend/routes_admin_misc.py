@@ -5,8 +5,17 @@ import os
 from flask import render_template, request, redirect, url_for, flash, jsonify
 
 from auth import login_required, admin_required
-from db import get_db_connection, log_activity
+from write_coordinator import write_transaction
+from db import (get_db_connection, log_activity, pool_stats, report_pool_stats,
+                DURABILITY_PROFILES, _get_db_path)
 from routes_payment import _api_autorizada
+import activity_writer
+import cart_store
+import checkpoint_manager
+import config_store
+import query_plans
+import schema
+import write_coordinator
 
 _APP_DIR = os.environ.get('FLASK_APP_DIR') or os.path.dirname(os.path.abspath(__file__))
 
@@ -35,6 +44,20 @@ def register(app, csrf):
         ).fetchall()
         return render_template('activity_log.html', logs=[dict(l) for l in logs])
 
+    @app.route('/admin/api/db-stats')
+    @login_required
+    @admin_required
+    def db_stats_api():
+        """Métricas internas de la BD para dimensionar el pool en horas pico."""
+        return jsonify({'pool': pool_stats(), 'report_pool': report_pool_stats(),
+                        'activity_log': activity_writer.writer.stats(),
+                        'carts': cart_store.store.stats(),
+                        'writes': write_coordinator.stats(),
+                        'checkpoints': checkpoint_manager.get_manager(_get_db_path()).stats(),
+                        'full_scans': query_plans.full_scans(get_db_connection()),
+                        'migrations': [{'version': v, 'name': n, 'ms': ms}
+                                       for v, n, ms in schema.last_report]})
+
     @app.route('/admin/config/update', methods=['POST'])
     @login_required
     @admin_required
@@ -49,24 +72,42 @@ def register(app, csrf):
             if rate <= 0:
                 flash('El tipo de cambio debe ser un número mayor a 0.', 'error')
                 return redirect(url_for('admin_dashboard'))
-            conn.execute(
-                "INSERT OR REPLACE INTO config (key, value) VALUES ('usd_rate', ?)",
-                (f'{rate:.2f}',)
-            )
-            conn.commit()
+            with write_transaction(conn):
+                config_store.set_value(conn, 'usd_rate', f'{rate:.2f}')
+            config_store.invalidate()
             log_activity('config', f'Tipo de cambio USD actualizado a ${rate:.2f} MXN')
             flash(f'Tipo de cambio guardado: 1 USD = ${rate:.2f} MXN.', 'success')
             return redirect(url_for('admin_dashboard'))
 
+        if 'kitchen_tickets' in request.form:
+            enabled = request.form.get('kitchen_tickets') == '1'
+            with write_transaction(conn):
+                config_store.set_value(conn, 'kitchen_tickets', '1' if enabled else '0')
+            config_store.invalidate()
+            log_activity('config', f'Comanda de cocina {"activada" if enabled else "desactivada"}')
+            flash(f'Comanda de cocina {"activada" if enabled else "desactivada"}.', 'success')
+            return redirect(url_for('admin_dashboard'))
+
+        if 'durability_profile' in request.form:
+            profile = request.form.get('durability_profile', '').strip().lower()
+            if profile not in DURABILITY_PROFILES:
+                flash('Perfil de durabilidad no válido.', 'error')
+                return redirect(url_for('admin_dashboard'))
+            with write_transaction(conn):
+                config_store.set_value(conn, 'durability_profile', profile)
+            config_store.invalidate()
+            config_store.snapshot()  # aplica el perfil al pool de inmediato
+            log_activity('config', f'Perfil de durabilidad cambiado a "{profile}"')
+            flash(f'Perfil de durabilidad guardado: {profile}.', 'success')
+            return redirect(url_for('admin_dashboard'))
+
         printer_name = request.form.get('printer_name', '').strip()
         if not printer_name:
             flash('El nombre de la impresora no puede estar vacío.', 'error')
             return redirect(url_for('admin_dashboard'))
-        conn.execute(
-            "INSERT OR REPLACE INTO config (key, value) VALUES ('printer_name', ?)",
-            (printer_name,)
-        )
-        conn.commit()
+        with write_transaction(conn):
+            config_store.set_value(conn, 'printer_name', printer_name)
+        config_store.invalidate()
         flash(f'Impresora configurada como "{printer_name}".', 'success')
         return redirect(url_for('admin_dashboard'))
 
@@ -75,6 +116,4 @@ def register(app, csrf):
     def get_config_api():
         if not _api_autorizada():
             return jsonify({'error': 'No autorizado'}), 401
-        conn = get_db_connection()
-        rows = conn.execute('SELECT key, value FROM config').fetchall()
-        return jsonify({r['key']: r['value'] for r in rows})
+        return jsonify(config_store.all_raw())
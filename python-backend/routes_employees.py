@@ -10,6 +10,7 @@ from flask import (render_template, request, redirect, url_for, session,
                    flash, jsonify, Response, send_file)
 
 from auth import login_required, admin_required
+from write_coordinator import write_transaction
 from db import (get_db_connection, log_activity, _get_db_path,
                 backup_db_to_file, get_item_price, get_menu_options)
 from business import (money, format_num, get_week_bounds, parse_scheduled_days,
@@ -60,15 +61,15 @@ def register(app):
             return redirect(url_for('employees_manage'))
 
         conn = get_db_connection()
-        cur = conn.execute('INSERT INTO employees (name, role) VALUES (?, ?)', (name, role))
-        employee_id = cur.lastrowid
-        week_start, _ = get_week_bounds(datetime.now().strftime('%Y-%m-%d'))
-        conn.execute(
-            'INSERT INTO employee_schedules (employee_id, effective_from, scheduled_days, pay_amount) '
-            'VALUES (?, ?, ?, ?)',
-            (employee_id, week_start, days_csv, pay_amount)
-        )
-        conn.commit()
+        with write_transaction(conn):
+            cur = conn.execute('INSERT INTO employees (name, role) VALUES (?, ?)', (name, role))
+            employee_id = cur.lastrowid
+            week_start, _ = get_week_bounds(datetime.now().strftime('%Y-%m-%d'))
+            conn.execute(
+                'INSERT INTO employee_schedules (employee_id, effective_from, scheduled_days, pay_amount) '
+                'VALUES (?, ?, ?, ?)',
+                (employee_id, week_start, days_csv, pay_amount)
+            )
         flash(f'Empleado "{name}" agregado.', 'success')
         return redirect(url_for('employees_manage'))
 
@@ -97,19 +98,19 @@ def register(app):
             flash(error, 'error')
             return redirect(url_for('employees_manage'))
 
-        conn.execute('UPDATE employees SET name = ?, role = ? WHERE id = ?',
-                     (name, role, employee_id))
+        with write_transaction(conn):
+            conn.execute('UPDATE employees SET name = ?, role = ? WHERE id = ?',
+                         (name, role, employee_id))
 
-        today_week_start, _ = get_week_bounds(datetime.now().strftime('%Y-%m-%d'))
-        next_week_start = (
-            datetime.strptime(today_week_start, '%Y-%m-%d') + timedelta(days=7)
-        ).strftime('%Y-%m-%d')
-        conn.execute(
-            'INSERT INTO employee_schedules (employee_id, effective_from, scheduled_days, pay_amount) '
-            'VALUES (?, ?, ?, ?)',
-            (employee_id, next_week_start, days_csv, pay_amount)
-        )
-        conn.commit()
+            today_week_start, _ = get_week_bounds(datetime.now().strftime('%Y-%m-%d'))
+            next_week_start = (
+                datetime.strptime(today_week_start, '%Y-%m-%d') + timedelta(days=7)
+            ).strftime('%Y-%m-%d')
+            conn.execute(
+                'INSERT INTO employee_schedules (employee_id, effective_from, scheduled_days, pay_amount) '
+                'VALUES (?, ?, ?, ?)',
+                (employee_id, next_week_start, days_csv, pay_amount)
+            )
         flash(f'Empleado "{name}" actualizado. Los cambios de horario/pago aplican a partir de la próxima semana.', 'success')
         return redirect(url_for('employees_manage'))
 
@@ -129,13 +130,13 @@ def register(app):
         ).fetchone()[0] > 0
 
         if has_attendance:
-            conn.execute('UPDATE employees SET active = 0 WHERE id = ?', (employee_id,))
-            conn.commit()
+            with write_transaction(conn):
+                conn.execute('UPDATE employees SET active = 0 WHERE id = ?', (employee_id,))
             flash(f'Empleado "{employee["name"]}" desactivado.', 'success')
         else:
-            conn.execute('DELETE FROM employee_schedules WHERE employee_id = ?', (employee_id,))
-            conn.execute('DELETE FROM employees WHERE id = ?', (employee_id,))
-            conn.commit()
+            with write_transaction(conn):
+                conn.execute('DELETE FROM employee_schedules WHERE employee_id = ?', (employee_id,))
+                conn.execute('DELETE FROM employees WHERE id = ?', (employee_id,))
             flash(f'Empleado "{employee["name"]}" eliminado.', 'success')
         return redirect(url_for('employees_manage'))
 
@@ -153,31 +154,31 @@ def register(app):
             return redirect(url_for('employees_attendance'))
 
         conn = get_db_connection()
-        existing = conn.execute(
-            'SELECT id FROM attendance WHERE employee_id = ? AND work_date = ?',
-            (employee_id, work_date)
-        ).fetchone()
-        if existing:
-            # Desmarcar siempre se permite (limpiar un registro previo).
-            conn.execute('DELETE FROM attendance WHERE id = ?', (existing['id'],))
-        else:
-            # audit v2.1.1: no permitir marcar asistencia en una semana sin
-            # horario vigente. compute_employee_pay devolvería $0 para ese día
-            # (resolve_employee_schedule == None) y quedaría como asistencia
-            # fantasma que paga nada en silencio.
-            try:
-                week_start, _ = get_week_bounds(work_date)
-            except ValueError:
-                flash('Solicitud inválida.', 'error')
-                return redirect(url_for('employees_attendance', week=week_param or work_date))
-            if resolve_employee_schedule(conn, int(employee_id), week_start) is None:
-                flash('El empleado no tiene horario vigente para esta semana.', 'error')
-                return redirect(url_for('employees_attendance', week=week_param or work_date))
-            conn.execute(
-                'INSERT OR IGNORE INTO attendance (employee_id, work_date) VALUES (?, ?)',
+        with write_transaction(conn):
+            existing = conn.execute(
+                'SELECT id FROM attendance WHERE employee_id = ? AND work_date = ?',
                 (employee_id, work_date)
-            )
-        conn.commit()
+            ).fetchone()
+            if existing:
+                # Desmarcar siempre se permite (limpiar un registro previo).
+                conn.execute('DELETE FROM attendance WHERE id = ?', (existing['id'],))
+            else:
+                # audit v2.1.1: no permitir marcar asistencia en una semana sin
+                # horario vigente. compute_employee_pay devolvería $0 para ese día
+                # (resolve_employee_schedule == None) y quedaría como asistencia
+                # fantasma que paga nada en silencio.
+                try:
+                    week_start, _ = get_week_bounds(work_date)
+                except ValueError:
+                    flash('Solicitud inválida.', 'error')
+                    return redirect(url_for('employees_attendance', week=week_param or work_date))
+                if resolve_employee_schedule(conn, int(employee_id), week_start) is None:
+                    flash('El empleado no tiene horario vigente para esta semana.', 'error')
+                    return redirect(url_for('employees_attendance', week=week_param or work_date))
+                conn.execute(
+                    'INSERT OR IGNORE INTO attendance (employee_id, work_date) VALUES (?, ?)',
+                    (employee_id, work_date)
+                )
         return redirect(url_for('employees_attendance', week=week_param or work_date))
 
 
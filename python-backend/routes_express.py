@@ -0,0 +1,206 @@
+"""Órdenes exprés: una orden completa (o varias) en un solo request JSON.
+
+En hora pico la captura normal son al menos cinco páginas por orden
+(/customize/*, /cart, /payment, /ticket). Aquí la tablet manda todo junto:
+
+    POST /api/orders/express
+    {
+      "customer_name": "Ana",
+      "coupon_code": "DESC10",
+      "items": [
+        {"kind": "sushi", "quantity": 2,
+         "options": {"ingredients": ["Camarón"], "style": "Fría", "prepared": "Natural"}},
+        {"kind": "beverages", "options": {"beverage_type": "Agua"}}
+      ],
+      "payment": {"payment_method": "cash", "amount_paid": 500}
+    }
+
+`kind` es el mismo slug de /customize/<kind> y `options` los mismos campos de
+su formulario: el precio lo calculan en el servidor los builders de
+routes_customize (_calc_sushi_price, _calc_rice_ball_price, ...), y el cupón
+y el pago pasan por las mismas validaciones que el carrito y /ticket.
+"""
+from flask import request, jsonify
+from werkzeug.datastructures import MultiDict
+
+import idempotency
+from auth import login_required
+from business import money, from_cents, cart_total_cents
+from db import get_db_connection
+from routes_cart import _try_apply_coupon
+from routes_customize import ITEM_BUILDERS
+from routes_payment import settle_payment, commit_order, queue_receipt_file
+from write_coordinator import write_transaction
+
+MAX_BATCH = 50
+MAX_QUANTITY = 99       # piezas por línea
+
+
+def _options_form(options):
+    """dict de opciones → MultiDict con la forma de request.form (listas = getlist)."""
+    pairs = []
+    for key, value in options.items():
+        for v in (value if isinstance(value, list) else [value]):
+            pairs.append((key, v))
+    return MultiDict(pairs)
+
+
+def prepare_order(data):
+    """Precia y valida una orden exprés. Regresa (orden, None) o (None, error);
+    no escribe nada en la BD."""
+    if not isinstance(data, dict):
+        return None, 'Orden inválida'
+    lines = data.get('items')
+    if not isinstance(lines, list) or not lines:
+        return None, 'La orden no tiene productos.'
+
+    cart = []
+    for n, line in enumerate(lines, 1):
+        if not isinstance(line, dict):
+            return None, f'Producto {n}: formato inválido'
+        builder = ITEM_BUILDERS.get(line.get('kind'))
+        if builder is None:
+            return None, f'Producto {n}: tipo desconocido'
+        options = line.get('options') or {}
+        if not isinstance(options, dict):
+            return None, f'Producto {n}: opciones inválidas'
+        item, error = builder(_options_form(options))
+        if error:
+            return None, f'Producto {n}: {error}'
+        try:
+            quantity = int(line.get('quantity', 1))
+        except (TypeError, ValueError):
+            quantity = 0
+        if not 1 <= quantity <= MAX_QUANTITY:
+            return None, f'Producto {n}: cantidad inválida (1 a {MAX_QUANTITY})'
+        item['quantity'] = quantity
+        item['price'] = money(item['unit_price'] * quantity)
+        cart.append(item)
+
+    coupon_code = str(data.get('coupon_code') or '').strip().upper()
+    if coupon_code:
+        _, error = _try_apply_coupon(cart, coupon_code)
+        if error:
+            return None, error
+
+    total_price = from_cents(cart_total_cents(cart))
+    pay, error = settle_payment(total_price, data.get('payment') or {})
+    if error:
+        return None, error
+
+    return {
+        'cart': cart,
+        'total': total_price,
+        'pay': pay,
+        'customer_name': str(data.get('customer_name') or '').strip() or 'Cliente',
+    }, None
+
+
+def _commit(conn, order):
+    order_id, receipt_text = commit_order(conn, order['cart'], order['total'],
+                                          order['pay'], order['customer_name'])
+    return order_id, receipt_text, {
+        'success': True,
+        'order_id': order_id,
+        'total': order['total'],
+        'change': order['pay']['change'],
+        'print_queued': receipt_text is not None,
+    }
+
+
+def register(app):
+    @app.route('/api/orders/express', methods=['POST'])
+    @login_required
+    def express_order():
+        # Header Idempotency-Key: un reintento repite la respuesta original
+        idem_key = idempotency.request_key()
+        if idem_key:
+            replay = idempotency.lookup(get_db_connection(), 'express', idem_key)
+            if replay is not None:
+                return jsonify(replay)
+
+        order, error = prepare_order(request.get_json(silent=True))
+        if error:
+            return jsonify({'success': False, 'error': error}), 400
+
+        conn = get_db_connection()
+        try:
+            with write_transaction(conn):
+                if idem_key:
+                    idempotency.claim(conn, 'express', idem_key)
+                order_id, receipt_text, result = _commit(conn, order)
+                if idem_key:
+                    idempotency.record(conn, 'express', idem_key, order_id, result)
+        except idempotency.KeyInUse:
+            replay = idempotency.lookup(conn, 'express', idem_key)
+            if replay is not None:
+                return jsonify(replay)
+            return jsonify({'success': False, 'error': 'Orden en proceso'}), 409
+        except Exception as e:
+            print(f"Error al guardar la orden exprés: {e}")
+            return jsonify({'success': False, 'error': f'Error al guardar la orden: {e}'}), 500
+
+        queue_receipt_file(order_id, receipt_text)
+        return jsonify(result)
+
+    @app.route('/api/orders/express/batch', methods=['POST'])
+    @login_required
+    def express_order_batch():
+        """Varias órdenes en cola. Las inválidas se reportan y se saltan; las
+        válidas se guardan juntas en una sola transacción. Con Idempotency-Key
+        (una llave por lote) un reintento repite la respuesta del lote. Si
+        ninguna es válida responde 400 sin escribir ni registrar la llave:
+        el lote corregido puede reenviarse con la misma llave."""
+        idem_key = idempotency.request_key()
+        if idem_key:
+            replay = idempotency.lookup(get_db_connection(), 'express_batch', idem_key)
+            if replay is not None:
+                return jsonify(replay)
+
+        data = request.get_json(silent=True) or {}
+        orders = data.get('orders') if isinstance(data, dict) else None
+        if not isinstance(orders, list) or not orders:
+            return jsonify({'success': False, 'error': 'No hay órdenes'}), 400
+        if len(orders) > MAX_BATCH:
+            return jsonify({'success': False,
+                            'error': f'Máximo {MAX_BATCH} órdenes por lote'}), 400
+
+        results = []
+        valid = []
+        for index, raw in enumerate(orders):
+            order, error = prepare_order(raw)
+            if error:
+                results.append({'index': index, 'success': False, 'error': error})
+            else:
+                valid.append((index, order))
+        if not valid:
+            return jsonify({'success': False, 'error': 'Ninguna orden es válida',
+                            'saved': 0, 'results': results}), 400
+
+        receipts = []
+        conn = get_db_connection()
+        try:
+            with write_transaction(conn):
+                if idem_key:
+                    idempotency.claim(conn, 'express_batch', idem_key)
+                for index, order in valid:
+                    order_id, receipt_text, result = _commit(conn, order)
+                    receipts.append((order_id, receipt_text))
+                    results.append(dict(result, index=index))
+                results.sort(key=lambda r: r['index'])
+                response = {'success': True, 'saved': len(valid), 'results': results}
+                if idem_key:
+                    idempotency.record(conn, 'express_batch', idem_key,
+                                       receipts[0][0] if receipts else None, response)
+        except idempotency.KeyInUse:
+            replay = idempotency.lookup(conn, 'express_batch', idem_key)
+            if replay is not None:
+                return jsonify(replay)
+            return jsonify({'success': False, 'error': 'Lote en proceso'}), 409
+        except Exception as e:
+            print(f"Error al guardar el lote exprés: {e}")
+            return jsonify({'success': False, 'error': f'Error al guardar las órdenes: {e}'}), 500
+
+        for order_id, receipt_text in receipts:
+            queue_receipt_file(order_id, receipt_text)
+        return jsonify(response)
@@ -5,6 +5,8 @@ import requests
 from flask import render_template, request, jsonify
 
 from auth import login_required, admin_required
+from db import get_db_connection
+from write_coordinator import write_transaction
 
 JAVA_INVENTORY_SERVICE = os.environ.get('JAVA_SERVICE_URL', 'http://localhost:8081')
 
@@ -96,11 +98,11 @@ def register(app):
                 return jsonify({'success': False, 'error': 'El nombre es requerido'})
 
             conn = get_db_connection()
-            conn.execute(
-                'INSERT INTO inventory (name, quantity, min_threshold, unit) VALUES (?, ?, ?, ?)',
-                (name, quantity, min_threshold, unit)
-            )
-            conn.commit()
+            with write_transaction(conn):
+                conn.execute(
+                    'INSERT INTO inventory (name, quantity, min_threshold, unit) VALUES (?, ?, ?, ?)',
+                    (name, quantity, min_threshold, unit)
+                )
             return jsonify({'success': True})
         except Exception as e:
             err = str(e)
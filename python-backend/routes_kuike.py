@@ -9,9 +9,10 @@ from datetime import datetime, timedelta
 from flask import (render_template, request, redirect, url_for, session,
                    flash, jsonify, Response, send_file)
 
+import sales_rollup
 from auth import login_required, admin_required
-from db import (get_db_connection, log_activity, _get_db_path,
-                backup_db_to_file, get_item_price, get_menu_options)
+from db import (get_db_connection, get_report_connection, log_activity,
+                _get_db_path, backup_db_to_file, get_item_price, get_menu_options)
 from business import (money, format_num, get_week_bounds, parse_scheduled_days,
                       resolve_employee_schedule, compute_employee_pay)
 
@@ -54,41 +55,26 @@ def register(app):
 
 
     def _run_kuike_tool(name, inputs):
-        conn = get_db_connection()
+        conn = get_report_connection()
         if name == 'get_sales_summary':
             start, end = _period_range(inputs.get('period', 'today'))
-            row = conn.execute(
-                "SELECT COUNT(*) as cnt, COALESCE(SUM(total),0) as rev FROM orders "
-                "WHERE date >= ? AND date <= ? AND status != 'voided'", (start, end)
-            ).fetchone()
-            voided = conn.execute(
-                "SELECT COUNT(*) FROM orders WHERE date >= ? AND date <= ? AND status = 'voided'",
-                (start, end)
-            ).fetchone()[0]
-            avg = (row['rev'] / row['cnt']) if row['cnt'] else 0
-            return {"period": inputs.get('period'), "orders": row['cnt'],
-                    "revenue": round(row['rev'], 2), "avg_ticket": round(avg, 2), "voided": voided}
+            # Resumen diario: los períodos de Kuike cubren días completos
+            cnt, rev, voided = sales_rollup.summary(conn, start[:10], end[:10])
+            avg = (rev / cnt) if cnt else 0
+            return {"period": inputs.get('period'), "orders": cnt,
+                    "revenue": round(rev, 2), "avg_ticket": round(avg, 2), "voided": voided}
 
         elif name == 'get_top_items':
             start, end = _period_range(inputs.get('period', 'today'))
             limit = inputs.get('limit', 10)
             rows = conn.execute(
-                "SELECT items, total FROM orders WHERE date >= ? AND date <= ? AND status != 'voided'",
-                (start, end)
+                "SELECT oi.name AS name, SUM(oi.quantity) AS qty, COALESCE(SUM(oi.price),0) AS rev "
+                "FROM order_items oi JOIN orders o ON o.id = oi.order_id "
+                "WHERE o.date >= ? AND o.date <= ? AND o.status != 'voided' "
+                "GROUP BY oi.name ORDER BY qty DESC, rev DESC, oi.name LIMIT ?",
+                (start, end, limit)
             ).fetchall()
-            counts, revenues = {}, {}
-            for r in rows:
-                try:
-                    items = json.loads(r['items']) if r['items'] else []
-                except Exception:
-                    items = []
-                n = len(items) or 1
-                for it in items:
-                    nm = it.get('name') or it.get('type', '?')
-                    counts[nm] = counts.get(nm, 0) + it.get('quantity', 1)
-                    revenues[nm] = revenues.get(nm, 0.0) + it.get('price', r['total'] / n)
-            top = sorted(counts.items(), key=lambda x: x[1], reverse=True)[:limit]
-            return [{"item": nm, "qty": qty, "revenue": round(revenues.get(nm, 0), 2)} for nm, qty in top]
+            return [{"item": r['name'], "qty": r['qty'], "revenue": round(r['rev'], 2)} for r in rows]
 
         elif name == 'get_recent_orders':
             limit = inputs.get('limit', 20)
@@ -109,18 +95,14 @@ def register(app):
 
         elif name == 'get_payment_breakdown':
             start, end = _period_range(inputs.get('period', 'today'))
-            rows = conn.execute(
-                "SELECT payment_method, COUNT(*) as cnt, COALESCE(SUM(total),0) as rev "
-                "FROM orders WHERE date >= ? AND date <= ? AND status != 'voided' "
-                "GROUP BY payment_method", (start, end)
-            ).fetchall()
-            return [{"method": r['payment_method'], "orders": r['cnt'], "revenue": round(r['rev'], 2)} for r in rows]
+            return [{"method": method, "orders": cnt, "revenue": round(rev, 2)}
+                    for method, cnt, rev in sales_rollup.by_payment(conn, start[:10], end[:10])]
 
         elif name == 'get_peak_hours':
             start, end = _period_range(inputs.get('period', 'today'))
             rows = conn.execute(
                 "SELECT CAST(substr(date,12,2) AS INTEGER) as hr, COUNT(*) as cnt, "
-                "COALESCE(SUM(total),0) as rev FROM orders "
+                "COALESCE(SUM(total_cents),0) / 100.0 as rev FROM orders "
                 "WHERE date >= ? AND date <= ? AND status != 'voided' "
                 "GROUP BY hr ORDER BY cnt DESC", (start, end)
             ).fetchall()
@@ -168,7 +150,7 @@ def register(app):
         elif name == 'get_frequent_customers':
             limit = inputs.get('limit', 15)
             rows = conn.execute(
-                "SELECT customer_name, COUNT(*) as visits, COALESCE(SUM(total),0) as spent "
+                "SELECT customer_name, COUNT(*) as visits, COALESCE(SUM(total_cents),0) / 100.0 as spent "
                 "FROM orders WHERE status != 'voided' AND customer_name IS NOT NULL "
                 "AND customer_name != '' AND customer_name != 'Cliente' "
                 "GROUP BY customer_name HAVING visits > 1 ORDER BY visits DESC LIMIT ?", (limit,)
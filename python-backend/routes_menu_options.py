@@ -2,6 +2,8 @@
 from flask import render_template, request, redirect, url_for, flash, jsonify
 
 from auth import login_required, admin_required
+from write_coordinator import write_transaction
+import catalog
 from db import get_db_connection, log_activity, get_menu_options
 
 
@@ -23,33 +25,34 @@ def register(app):
             return redirect(url_for('manage_menu_options'))
 
         conn = get_db_connection()
-        existing = conn.execute(
-            'SELECT id FROM menu_options WHERE category=? AND name=?', (category, name)
-        ).fetchone()
-        if existing:
-            # Reactiva y aplica el precio/icono enviados (antes se ignoraban al re-agregar).
-            conn.execute('UPDATE menu_options SET active=1, price=?, icon=? WHERE id=?',
-                         (price, icon, existing['id']))
-            if category == 'beverage':
-                conn.execute(
-                    'INSERT OR REPLACE INTO menu_prices (key, label, price) VALUES (?, ?, ?)',
-                    (name, name, price)
-                )
-        else:
-            max_sort = conn.execute(
-                'SELECT COALESCE(MAX(sort_order),0) FROM menu_options WHERE category=?', (category,)
-            ).fetchone()[0]
-            conn.execute(
-                'INSERT INTO menu_options (category, name, icon, price, sort_order) VALUES (?, ?, ?, ?, ?)',
-                (category, name, icon, price, max_sort + 1)
-            )
-            # Sync new beverages to menu_prices so get_item_price works immediately
-            if category == 'beverage':
+        with write_transaction(conn):
+            existing = conn.execute(
+                'SELECT id FROM menu_options WHERE category=? AND name=?', (category, name)
+            ).fetchone()
+            if existing:
+                # Reactiva y aplica el precio/icono enviados (antes se ignoraban al re-agregar).
+                conn.execute('UPDATE menu_options SET active=1, price=?, icon=? WHERE id=?',
+                             (price, icon, existing['id']))
+                if category == 'beverage':
+                    conn.execute(
+                        'INSERT OR REPLACE INTO menu_prices (key, label, price) VALUES (?, ?, ?)',
+                        (name, name, price)
+                    )
+            else:
+                max_sort = conn.execute(
+                    'SELECT COALESCE(MAX(sort_order),0) FROM menu_options WHERE category=?', (category,)
+                ).fetchone()[0]
                 conn.execute(
-                    'INSERT OR IGNORE INTO menu_prices (key, label, price) VALUES (?, ?, ?)',
-                    (name, name, price)
+                    'INSERT INTO menu_options (category, name, icon, price, sort_order) VALUES (?, ?, ?, ?, ?)',
+                    (category, name, icon, price, max_sort + 1)
                 )
-        conn.commit()
+                # Sync new beverages to menu_prices so get_item_price works immediately
+                if category == 'beverage':
+                    conn.execute(
+                        'INSERT OR IGNORE INTO menu_prices (key, label, price) VALUES (?, ?, ?)',
+                        (name, name, price)
+                    )
+        catalog.bump()
         flash(f'"{name}" agregado al menú', 'success')
         return redirect(url_for('manage_menu_options'))
 
@@ -92,13 +95,14 @@ def register(app):
                 flash(f'Ya existe un precio registrado para "{name}". Elige otro nombre.', 'error')
                 return redirect(url_for('manage_menu_options'))
 
-        conn.execute('UPDATE menu_options SET name=?, icon=?, price=? WHERE id=?',
-                     (name, icon, price, option_id))
-        # Las bebidas cobran por nombre vía menu_prices: mantenerlo en sincronía
-        if option['category'] == 'beverage':
-            conn.execute('UPDATE menu_prices SET key=?, label=?, price=? WHERE key=?',
-                         (name, name, price, option['name']))
-        conn.commit()
+        with write_transaction(conn):
+            conn.execute('UPDATE menu_options SET name=?, icon=?, price=? WHERE id=?',
+                         (name, icon, price, option_id))
+            # Las bebidas cobran por nombre vía menu_prices: mantenerlo en sincronía
+            if option['category'] == 'beverage':
+                conn.execute('UPDATE menu_prices SET key=?, label=?, price=? WHERE key=?',
+                             (name, name, price, option['name']))
+        catalog.bump()
         log_activity('menu_opcion_editada',
                      f'"{option["name"]}" → "{name}" (${price:g}) en {option["category"]}')
         flash(f'"{name}" actualizado', 'success')
@@ -115,9 +119,10 @@ def register(app):
         if not ids or not all(isinstance(i, int) for i in ids):
             return jsonify({'ok': False, 'error': 'ids inválidos'}), 400
         conn = get_db_connection()
-        for pos, option_id in enumerate(ids):
-            conn.execute('UPDATE menu_options SET sort_order=? WHERE id=?', (pos, option_id))
-        conn.commit()
+        with write_transaction(conn):
+            for pos, option_id in enumerate(ids):
+                conn.execute('UPDATE menu_options SET sort_order=? WHERE id=?', (pos, option_id))
+        catalog.bump()
         return jsonify({'ok': True})
 
 
@@ -128,12 +133,13 @@ def register(app):
         conn = get_db_connection()
         option = conn.execute('SELECT * FROM menu_options WHERE id=?', (option_id,)).fetchone()
         if option:
-            conn.execute('DELETE FROM menu_options WHERE id=?', (option_id,))
-            # Bebidas: borra también su fila en menu_prices para no dejar un precio
-            # huérfano (seguiría siendo cobrable y provocaba colisiones al renombrar).
-            if option['category'] == 'beverage':
-                conn.execute('DELETE FROM menu_prices WHERE key=?', (option['name'],))
-            conn.commit()
+            with write_transaction(conn):
+                conn.execute('DELETE FROM menu_options WHERE id=?', (option_id,))
+                # Bebidas: borra también su fila en menu_prices para no dejar un precio
+                # huérfano (seguiría siendo cobrable y provocaba colisiones al renombrar).
+                if option['category'] == 'beverage':
+                    conn.execute('DELETE FROM menu_prices WHERE key=?', (option['name'],))
+            catalog.bump()
             flash(f'"{option["name"]}" eliminado del menú', 'success')
         return redirect(url_for('manage_menu_options'))
 
@@ -146,8 +152,9 @@ def register(app):
         option = conn.execute('SELECT * FROM menu_options WHERE id=?', (option_id,)).fetchone()
         if option:
             new_active = 0 if option['active'] else 1
-            conn.execute('UPDATE menu_options SET active=? WHERE id=?', (new_active, option_id))
-            conn.commit()
+            with write_transaction(conn):
+                conn.execute('UPDATE menu_options SET active=? WHERE id=?', (new_active, option_id))
+            catalog.bump()
             status = 'activado' if new_active else 'desactivado'
             flash(f'"{option["name"]}" {status}', 'success')
         return redirect(url_for('manage_menu_options'))
@@ -9,9 +9,12 @@ from datetime import datetime, timedelta
 from flask import (render_template, request, redirect, url_for, session,
                    flash, jsonify, Response, send_file)
 
+import print_queue
+import sales_rollup
+from write_coordinator import write_transaction
 from auth import login_required, admin_required
-from db import (get_db_connection, log_activity, _get_db_path,
-                backup_db_to_file, get_item_price, get_menu_options)
+from db import (get_db_connection, get_report_connection, log_activity,
+                _get_db_path, backup_db_to_file, get_item_price, get_menu_options)
 from business import (money, format_num, get_week_bounds, parse_scheduled_days,
                       resolve_employee_schedule, compute_employee_pay)
 
@@ -59,43 +62,32 @@ def register(app, print_receipt_physical):
             date_clause = "date >= ?"
             date_args = (start_str,)
 
-        conn = get_db_connection()
+        conn = get_report_connection()
 
-        # Core summary
-        row = conn.execute(
-            f"SELECT COUNT(*) as cnt, COALESCE(SUM(total),0) as rev FROM orders "
-            f"WHERE {date_clause} AND status != 'voided'", date_args
-        ).fetchone()
-        total_orders = row['cnt']
-        total_revenue = row['rev']
+        # Totales, pagos y tendencia desde el resumen diario (una fila por día/método)
+        start_day = start.strftime('%Y-%m-%d')
+        end_day = start_day if period == 'custom' and selected_date else None
+        total_orders, total_revenue, voided = sales_rollup.summary(conn, start_day, end_day)
         avg_ticket = (total_revenue / total_orders) if total_orders else 0
 
         # Payment method split
-        pay_rows = conn.execute(
-            f"SELECT payment_method, COUNT(*) as cnt, COALESCE(SUM(total),0) as rev "
-            f"FROM orders WHERE {date_clause} AND status != 'voided' "
-            f"GROUP BY payment_method", date_args
-        ).fetchall()
-        payment_split = {r['payment_method']: {'count': r['cnt'], 'revenue': r['rev']} for r in pay_rows}
+        payment_split = {method: {'count': cnt, 'revenue': rev}
+                         for method, cnt, rev in sales_rollup.by_payment(conn, start_day, end_day)}
 
         # Daily revenue for trend (last 14 days always shown for context)
         trend_start = (now - timedelta(days=13)).replace(hour=0, minute=0, second=0, microsecond=0)
-        trend_rows = conn.execute(
-            "SELECT substr(date,1,10) as day, COALESCE(SUM(total),0) as rev, COUNT(*) as cnt "
-            "FROM orders WHERE date >= ? AND status != 'voided' "
-            "GROUP BY day ORDER BY day", (trend_start.strftime('%Y-%m-%d %H:%M:%S'),)
-        ).fetchall()
+        trend_rows = sales_rollup.by_day(conn, trend_start.strftime('%Y-%m-%d'))
         # Fill all 14 days so gaps show as zero
         daily_trend = {}
         for i in range(14):
             d = (trend_start + timedelta(days=i)).strftime('%Y-%m-%d')
             daily_trend[d] = {'rev': 0, 'cnt': 0}
-        for r in trend_rows:
-            daily_trend[r['day']] = {'rev': r['rev'], 'cnt': r['cnt']}
+        for day, (cnt, rev) in sorted(trend_rows.items()):
+            daily_trend[day] = {'rev': rev, 'cnt': cnt}
 
         # Hourly distribution within selected period — orders + revenue
         hour_rows = conn.execute(
-            f"SELECT CAST(substr(date,12,2) AS INTEGER) as hr, COUNT(*) as cnt, COALESCE(SUM(total),0) as rev "
+            f"SELECT CAST(substr(date,12,2) AS INTEGER) as hr, COUNT(*) as cnt, COALESCE(SUM(total_cents),0) / 100.0 as rev "
             f"FROM orders WHERE {date_clause} AND status != 'voided' "
             f"GROUP BY hr ORDER BY hr", date_args
         ).fetchall()
@@ -107,32 +99,16 @@ def register(app, print_receipt_physical):
         # that landed after the pre-seeded 8–22 range don't render out of order.
         hourly = {h: hourly[h] for h in sorted(hourly)}
 
-        # Item popularity — parse JSON items, track qty + revenue
-        all_orders = conn.execute(
-            f"SELECT items, total FROM orders WHERE {date_clause} AND status != 'voided'", date_args
-        ).fetchall()
-        item_counts = {}
-        item_revenue = {}
-        for o in all_orders:
-            try:
-                items = json.loads(o['items']) if o['items'] else []
-            except (json.JSONDecodeError, TypeError):
-                items = []
-            n_items = len(items) or 1
-            per_item_rev = (o['total'] or 0) / n_items
-            for it in items:
-                name = it.get('name') or it.get('type', 'Desconocido')
-                qty = it.get('quantity', 1)
-                item_counts[name] = item_counts.get(name, 0) + qty
-                item_revenue[name] = item_revenue.get(name, 0.0) + it.get('price', per_item_rev)
-        top_items = sorted(item_counts.items(), key=lambda x: x[1], reverse=True)[:10]
-        # Build enriched top_items list: (name, qty, revenue)
-        top_items_data = [(name, qty, item_revenue.get(name, 0.0)) for name, qty in top_items]
-
-        # Voided orders count
-        voided = conn.execute(
-            f"SELECT COUNT(*) FROM orders WHERE {date_clause} AND status = 'voided'", date_args
-        ).fetchone()[0]
+        # Item popularity — qty + revenue agregados en SQL sobre order_items
+        top_items_data = [
+            (r['name'], r['qty'], r['rev']) for r in conn.execute(
+                f"SELECT oi.name AS name, SUM(oi.quantity) AS qty, COALESCE(SUM(oi.price),0) AS rev "
+                f"FROM order_items oi JOIN orders o ON o.id = oi.order_id "
+                f"WHERE {date_clause} AND status != 'voided' "
+                f"GROUP BY oi.name ORDER BY qty DESC, rev DESC, oi.name LIMIT 10", date_args
+            ).fetchall()
+        ]
+        top_items = [(name, qty) for name, qty, _ in top_items_data]
 
         return render_template('reports.html',
             period=period, label=label,
@@ -194,7 +170,7 @@ def register(app, print_receipt_physical):
         if period == 'custom' and not selected_date:
             period = 'today'
 
-        conn = get_db_connection()
+        conn = get_report_connection()
 
         conditions = ['date >= ?']
         params     = [start_str]
@@ -217,14 +193,14 @@ def register(app, print_receipt_physical):
         # money totals; the same param bindings are reused (no extra placeholder).
         totals_where = 'WHERE ' + ' AND '.join(conditions + ["status != 'voided'"])
         summary = conn.execute(
-            f'SELECT COUNT(*) AS cnt, COALESCE(SUM(total),0) AS rev FROM orders {totals_where}',
+            f'SELECT COUNT(*) AS cnt, COALESCE(SUM(total_cents),0) / 100.0 AS rev FROM orders {totals_where}',
             params
         ).fetchone()
         total_orders  = summary['cnt']
         total_revenue = summary['rev']
         daily_totals  = {
             r['day']: r['rev'] for r in conn.execute(
-                f'SELECT substr(date,1,10) AS day, COALESCE(SUM(total),0) AS rev '
+                f'SELECT substr(date,1,10) AS day, COALESCE(SUM(total_cents),0) / 100.0 AS rev '
                 f'FROM orders {totals_where} GROUP BY day', params
             ).fetchall()
         }
@@ -259,8 +235,8 @@ def register(app, print_receipt_physical):
     @admin_required
     def void_order(order_id):
         conn = get_db_connection()
-        cursor = conn.execute("UPDATE orders SET status = 'voided' WHERE id = ?", (order_id,))
-        conn.commit()
+        with write_transaction(conn):
+            cursor = conn.execute("UPDATE orders SET status = 'voided' WHERE id = ?", (order_id,))
         if cursor.rowcount == 0:
             flash('Orden no encontrada.', 'error')
             return redirect(url_for('order_history'))
@@ -274,8 +250,8 @@ def register(app, print_receipt_physical):
     @admin_required
     def delete_order(order_id):
         conn = get_db_connection()
-        conn.execute('DELETE FROM orders WHERE id = ?', (order_id,))
-        conn.commit()
+        with write_transaction(conn):
+            conn.execute('DELETE FROM orders WHERE id = ?', (order_id,))
         flash(f'Orden {order_id} eliminada.', 'success')
         return redirect(url_for('order_history'))
 
@@ -287,8 +263,8 @@ def register(app, print_receipt_physical):
         order_ids = request.form.getlist('order_ids')
         if order_ids:
             conn = get_db_connection()
-            conn.executemany('DELETE FROM orders WHERE id = ?', [(oid,) for oid in order_ids])
-            conn.commit()
+            with write_transaction(conn):
+                conn.executemany('DELETE FROM orders WHERE id = ?', [(oid,) for oid in order_ids])
             flash(f'{len(order_ids)} orden(es) eliminada(s).', 'success')
         return redirect(url_for('order_history'))
 
@@ -320,8 +296,8 @@ def register(app, print_receipt_physical):
 
         where  = 'WHERE ' + ' AND '.join(conditions)
         conn   = get_db_connection()
-        cursor = conn.execute(f'DELETE FROM orders {where}', params)
-        conn.commit()
+        with write_transaction(conn):
+            cursor = conn.execute(f'DELETE FROM orders {where}', params)
         flash(f'{cursor.rowcount} orden(es) eliminada(s).', 'success')
         return redirect(url_for('order_history', q=q, period=period, date=selected_date, estado=estado))
 
@@ -351,11 +327,12 @@ def register(app, print_receipt_physical):
 
             # Usar un ID único para que no choque con el job original
             reprint_id = f"re_{order_id}_{datetime.now().strftime('%H%M%S')}"
-            conn.execute(
-                "INSERT INTO print_jobs (id, receipt_content, status, created_at) VALUES (?, ?, 'pending', ?)",
-                (reprint_id, receipt_text, datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
-            )
-            conn.commit()
+            # Solo el ticket del cliente: la comanda de cocina no se repite
+            with write_transaction(conn):
+                print_queue.queue_jobs(
+                    conn, [(reprint_id, print_queue.STATION_COUNTER, receipt_text)],
+                    datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+            print_queue.notify()
             flash(f'Ticket #{order_id} enviado a reimprimir.', 'success')
         except Exception as e:
             flash(f'Error al reimprimir: {str(e)}', 'error')
@@ -391,23 +368,23 @@ def register(app, print_receipt_physical):
 
         where = 'WHERE ' + ' AND '.join(conditions)
 
-        conn = get_db_connection()
+        conn = get_report_connection()
         orders = conn.execute(
             f'SELECT * FROM orders {where} ORDER BY date DESC', params
         ).fetchall()
+        items_by_order = {}
+        for it in conn.execute(
+            f'SELECT order_id, name, quantity FROM order_items '
+            f'WHERE order_id IN (SELECT id FROM orders {where}) ORDER BY order_id, line_no', params
+        ):
+            items_by_order.setdefault(it['order_id'], []).append(
+                f"{it['name']} x{it['quantity']}")
 
         buf = io.StringIO()
         w = csv.writer(buf)
         w.writerow(['ID', 'Fecha', 'Cliente', 'Total', 'Método de pago',
                     'Monto pagado', 'Cambio', 'Estado', 'Artículos'])
         for o in orders:
-            try:
-                items = json.loads(o['items']) if o['items'] else []
-                items_str = ' | '.join(
-                    f"{it.get('name','?')} x{it.get('quantity',1)}" for it in items
-                )
-            except Exception:
-                items_str = ''
             w.writerow([
                 o['id'],
                 o['date'],
@@ -417,7 +394,7 @@ def register(app, print_receipt_physical):
                 f"{o['amount_paid']:.2f}" if o['amount_paid'] else '0.00',
                 f"{o['change_amount']:.2f}" if o['change_amount'] else '0.00',
                 'Anulada' if o['status'] == 'voided' else 'Completada',
-                items_str,
+                ' | '.join(items_by_order.get(o['id'], [])),
             ])
 
         fecha_str = datetime.now().strftime('%Y-%m-%d')
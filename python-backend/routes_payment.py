@@ -1,18 +1,25 @@
 """Payment, ticket processing, receipt printing, and print queue."""
 import json
 import os
-import sqlite3
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 from flask import render_template, request, redirect, url_for, session, flash, jsonify
 
 from auth import login_required
-from db import get_db_connection, log_activity, get_config, get_item_price
-from business import money
+import cart_store
+import config_store
+import idempotency
+import print_queue
+from db import get_db_connection, log_activity, get_item_price, release_db_connection
+from business import money, order_item_rows, to_cents, from_cents, cart_total_cents
+from order_ids import next_order_id
+from write_coordinator import write_transaction
 
 
-DEFAULT_USD_RATE = 18.0
+DEFAULT_USD_RATE = config_store.DEFAULT_USD_RATE
 
 
 def _api_autorizada():
@@ -23,11 +30,7 @@ def _api_autorizada():
 
 
 def _usd_rate():
-    try:
-        rate = float(get_config('usd_rate', str(DEFAULT_USD_RATE)))
-    except (ValueError, TypeError):
-        return DEFAULT_USD_RATE
-    return rate if rate > 0 else DEFAULT_USD_RATE
+    return config_store.usd_rate()
 
 
 def _issue_ticket_token():
@@ -38,12 +41,60 @@ def _issue_ticket_token():
     return token
 
 
-def print_receipt_physical(cart, total, payment_method, amount_paid=0, change=0,
-                           order_id=None, customer_name=None,
-                           paid_currency='mxn', paid_amount_usd=0, usd_rate=0,
-                           split_cash_mxn=None, split_card=None):
+def _item_details(item):
+    """Líneas de detalle de un artículo (salsas, ingredientes, notas), comunes
+    al ticket del cliente y a la comanda de cocina."""
+    lines = []
+    if item['type'] == 'Bebida':
+        if item.get('beverage_type'):
+            lines.append(f"  {item['beverage_type']}")
+
+    elif item['type'] == 'Boneless':
+        if item.get('sauces'):
+            lines.append(f"  {', '.join(item['sauces'])}")
+        elif item.get('sauce'):
+            lines.append(f"  {item['sauce']}")
+        if item.get('accompaniment'):
+            lines.append(f"  {item['accompaniment']}")
+
+    elif item['type'] == 'Complementos':
+        if item.get('sauces'):
+            lines.append(f"  {', '.join(item['sauces'])}")
+            sauce_count = len(item['sauces'])
+            sauce_price = get_item_price('Complementos')
+            lines.append(f"  {sauce_count} x ${sauce_price:.0f} = ${sauce_count * sauce_price:.2f}")
+
+    elif item['type'] in ('Bola de Arroz', 'Sushi'):
+        _skip = {'queso', 'aguacate'}
+        if 'ingredients' in item:
+            filtered = [i for i in item['ingredients'] if i.lower() not in _skip]
+            abbr = [i[:3] for i in filtered] if filtered else []
+            if abbr:
+                lines.append(f"  {', '.join(abbr)}")
+            if item.get('ostion_cost', 0) > 0:
+                lines.append(f"  Ostión: +${item['ostion_cost']:.2f}")
+        if item.get('style'):
+            lines.append(f"  {item['style']}")
+        if item.get('sauce'):
+            lines.append(f"  {item['sauce']}")
+        if item.get('prepared'):
+            lines.append(f"  {item['prepared']}")
+        if 'toppings' in item:
+            topping_text = ', '.join(item['toppings']) if item['toppings'] else "Ninguno"
+            lines.append(f"  {topping_text}")
+
+    if item.get('notes'):
+        lines.append(f"  Notas: {item['notes']}")
+    return lines
+
+
+def format_receipt(cart, total, payment_method, amount_paid=0, change=0,
+                   order_id=None, customer_name=None,
+                   paid_currency='mxn', paid_amount_usd=0, usd_rate=0,
+                   split_cash_mxn=None, split_card=None):
+    """Texto del ticket (sin efectos: no escribe archivos)."""
     receipt_content = []
-    receipt_content.append(f"Orden #: {order_id or session.get('order_id')}")
+    receipt_content.append(f"Orden #: {order_id}")
     receipt_content.append(f"Cliente: {customer_name or 'Cliente'}")
     receipt_content.append("-" * 38)
     receipt_content.append("ARTICULO                PRECIO")
@@ -52,47 +103,7 @@ def print_receipt_physical(cart, total, payment_method, amount_paid=0, change=0,
     for item in cart:
         quantity = item.get('quantity', 1)
         receipt_content.append(f"{item['name']} x{quantity:<2}      ${item['price']:.2f}")
-
-        if item['type'] == 'Bebida':
-            if item.get('beverage_type'):
-                receipt_content.append(f"  {item['beverage_type']}")
-
-        elif item['type'] == 'Boneless':
-            if item.get('sauces'):
-                receipt_content.append(f"  {', '.join(item['sauces'])}")
-            elif item.get('sauce'):
-                receipt_content.append(f"  {item['sauce']}")
-            if item.get('accompaniment'):
-                receipt_content.append(f"  {item['accompaniment']}")
-
-        elif item['type'] == 'Complementos':
-            if item.get('sauces'):
-                receipt_content.append(f"  {', '.join(item['sauces'])}")
-                sauce_count = len(item['sauces'])
-                sauce_price = get_item_price('Complementos')
-                receipt_content.append(f"  {sauce_count} x ${sauce_price:.0f} = ${sauce_count * sauce_price:.2f}")
-
-        elif item['type'] in ('Bola de Arroz', 'Sushi'):
-            _skip = {'queso', 'aguacate'}
-            if 'ingredients' in item:
-                filtered = [i for i in item['ingredients'] if i.lower() not in _skip]
-                abbr = [i[:3] for i in filtered] if filtered else []
-                if abbr:
-                    receipt_content.append(f"  {', '.join(abbr)}")
-                if item.get('ostion_cost', 0) > 0:
-                    receipt_content.append(f"  Ostión: +${item['ostion_cost']:.2f}")
-            if item.get('style'):
-                receipt_content.append(f"  {item['style']}")
-            if item.get('sauce'):
-                receipt_content.append(f"  {item['sauce']}")
-            if item.get('prepared'):
-                receipt_content.append(f"  {item['prepared']}")
-            if 'toppings' in item:
-                topping_text = ', '.join(item['toppings']) if item['toppings'] else "Ninguno"
-                receipt_content.append(f"  {topping_text}")
-
-        if item.get('notes'):
-            receipt_content.append(f"  Notas: {item['notes']}")
+        receipt_content.extend(_item_details(item))
         receipt_content.append("-" * 38)
 
     receipt_content.append(f"TOTAL: ${total:.2f}")
@@ -115,36 +126,230 @@ def print_receipt_physical(cart, total, payment_method, amount_paid=0, change=0,
         if change:
             receipt_content.append(f"CAMBIO (MXN): ${change:.2f}")
 
-    receipt_id = order_id or session.get('order_id')
-    receipts_dir = os.path.join(os.getcwd(), 'receipts')
+    return "\n".join(receipt_content)
+
+
+def _receipts_dir():
+    # RESTAURANT_RECEIPTS_DIR lo fijan las pruebas y el benchmark para no
+    # llenar el directorio de trabajo con tickets
+    return os.environ.get('RESTAURANT_RECEIPTS_DIR') or os.path.join(os.getcwd(), 'receipts')
+
+
+def save_receipt_file(receipt_id, receipt_text):
+    receipts_dir = _receipts_dir()
     os.makedirs(receipts_dir, exist_ok=True)
     receipt_path = os.path.join(receipts_dir, f"receipt_{receipt_id}.txt")
-    receipt_text = "\n".join(receipt_content)
     with open(receipt_path, "w", encoding="utf-8") as f:
         f.write(receipt_text)
-    return receipt_path, receipt_text
+    return receipt_path
+
+
+# La copia en archivo del ticket es un efecto secundario: /ticket la encola
+# aquí después del commit para no pagar la escritura dentro del request.
+_receipt_files = ThreadPoolExecutor(max_workers=1, thread_name_prefix='receipt-files')
+
+
+def _save_receipt_quietly(receipt_id, receipt_text):
+    try:
+        save_receipt_file(receipt_id, receipt_text)
+    except OSError as e:
+        print(f"Error saving receipt: {e}")
+
+
+def format_kitchen_ticket(cart, order_id=None, customer_name=None):
+    """Comanda de cocina: solo sushi y bolas de arroz, sin precios. None si la
+    orden no lleva nada que preparar en cocina."""
+    items = [item for item in cart if item.get('type') in print_queue.KITCHEN_TYPES]
+    if not items:
+        return None
+    lines = [f"COCINA - Orden #: {order_id}",
+             f"Cliente: {customer_name or 'Cliente'}",
+             "-" * 38]
+    for item in items:
+        # \x02: el bridge imprime la línea en doble altura
+        lines.append(f"\x02{item['name']} x{item.get('quantity', 1)}")
+        lines.extend(_item_details(item))
+        lines.append("-" * 38)
+    return "\n".join(lines)
+
+
+def receipt_print_jobs(order_id, cart, receipt_text, customer_name=None):
+    """Jobs de impresión de una orden como (id, estación, contenido): el ticket
+    del cliente va al mostrador y, con kitchen_tickets activo, la comanda a
+    cocina."""
+    jobs = [(order_id, print_queue.STATION_COUNTER, receipt_text)]
+    if config_store.kitchen_tickets():
+        comanda = format_kitchen_ticket(cart, order_id, customer_name)
+        if comanda is not None:
+            jobs.append((f'{order_id}-K', print_queue.STATION_KITCHEN, comanda))
+    return jobs
+
+
+def print_receipt_physical(cart, total, payment_method, amount_paid=0, change=0,
+                           order_id=None, customer_name=None,
+                           paid_currency='mxn', paid_amount_usd=0, usd_rate=0,
+                           split_cash_mxn=None, split_card=None):
+    receipt_text = format_receipt(
+        cart, total, payment_method, amount_paid, change, order_id, customer_name,
+        paid_currency=paid_currency, paid_amount_usd=paid_amount_usd, usd_rate=usd_rate,
+        split_cash_mxn=split_cash_mxn, split_card=split_card)
+    return save_receipt_file(order_id, receipt_text), receipt_text
+
+
+def settle_payment(total_price, data):
+    """Valida el pago de una orden de `total_price`. `data` es el formulario de
+    /ticket o un dict con las mismas llaves (payment_method, amount_paid,
+    currency, cash_portion, card_portion, cash_currency). Regresa (pay, None)
+    o (None, mensaje de error)."""
+    payment_method = data.get('payment_method', 'card')
+
+    paid_currency = str(data.get('currency', 'mxn')).lower()
+    if paid_currency not in ('mxn', 'usd'):
+        paid_currency = 'mxn'
+    paid_amount_usd = 0.0
+    usd_rate_used = 0.0
+
+    try:
+        amount_paid = money(float(data.get('amount_paid', total_price)))
+    except (ValueError, TypeError):
+        amount_paid = total_price
+        paid_currency = 'mxn'
+
+    if payment_method == 'cash' and paid_currency == 'usd':
+        usd_rate_used = _usd_rate()
+        paid_amount_usd = amount_paid
+        amount_paid = money(paid_amount_usd * usd_rate_used)
+
+    change = money(amount_paid - total_price) if payment_method == 'cash' else 0
+
+    if payment_method == 'cash' and amount_paid < total_price:
+        return None, f'Pago insuficiente. Se recibió ${amount_paid:.2f} de ${total_price:.2f}.'
+
+    split_cash_mxn = None
+    split_card = None
+    if payment_method == 'split':
+        try:
+            cash_portion = float(data.get('cash_portion', 0))
+            card_portion = float(data.get('card_portion', 0))
+        except (ValueError, TypeError):
+            cash_portion = 0.0
+            card_portion = 0.0
+        if cash_portion < 0 or card_portion < 0:
+            return None, 'Los montos de pago no pueden ser negativos.'
+        if money(card_portion) > total_price:
+            return None, 'El monto con tarjeta no puede exceder el total.'
+        cash_currency = str(data.get('cash_currency', 'mxn')).lower()
+        if cash_currency == 'usd' and cash_portion > 0:
+            usd_rate_used = _usd_rate()
+            paid_amount_usd = money(cash_portion)
+            paid_currency = 'usd'
+            cash_portion = money(paid_amount_usd * usd_rate_used)
+        else:
+            paid_currency = 'mxn'
+            cash_portion = money(cash_portion)
+        amount_paid = money(cash_portion + card_portion)
+        if amount_paid < total_price:
+            return None, f'Pago insuficiente. Se recibió ${amount_paid:.2f} de ${total_price:.2f}.'
+        change = money(max(0, amount_paid - total_price))
+        split_cash_mxn = cash_portion
+        split_card = money(card_portion)
+
+    return {
+        'payment_method': payment_method, 'amount_paid': amount_paid, 'change': change,
+        'paid_currency': paid_currency, 'paid_amount_usd': paid_amount_usd,
+        'usd_rate': usd_rate_used, 'split_cash_mxn': split_cash_mxn,
+        'split_card': split_card,
+    }, None
+
+
+def commit_order(conn, cart, total_price, pay, customer_name):
+    """Escribe la orden, sus líneas, el trabajo de impresión y la bitácora en la
+    transacción abierta de `conn` (el commit lo hace quien llama). Regresa
+    (order_id, receipt_text); receipt_text es None si el ticket no se pudo
+    formatear."""
+    now = datetime.now()
+    # El ID se asigna aquí, dentro de la transacción (ver order_ids.py)
+    order_id = next_order_id(conn, now)
+    conn.execute(
+        'INSERT INTO orders (id, items, total, payment_method, amount_paid, '
+        'change_amount, date, status, customer_name, paid_currency, '
+        'paid_amount_usd, usd_rate, total_cents, amount_paid_cents) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        (order_id, json.dumps(cart), total_price, pay['payment_method'],
+         pay['amount_paid'], pay['change'], now.strftime('%Y-%m-%d %H:%M:%S'),
+         'completed', customer_name, pay['paid_currency'], pay['paid_amount_usd'],
+         pay['usd_rate'], to_cents(total_price), to_cents(pay['amount_paid']))
+    )
+    conn.executemany(
+        'INSERT INTO order_items (order_id, line_no, type, name, quantity, '
+        'unit_price, price, discount) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+        order_item_rows(order_id, cart, total_price)
+    )
+
+    # Un ticket que no se puede formatear no debe perder la venta
+    receipt_text = None
+    try:
+        receipt_text = format_receipt(
+            cart, total_price, pay['payment_method'], pay['amount_paid'], pay['change'],
+            order_id, customer_name,
+            paid_currency=pay['paid_currency'], paid_amount_usd=pay['paid_amount_usd'],
+            usd_rate=pay['usd_rate'], split_cash_mxn=pay['split_cash_mxn'],
+            split_card=pay['split_card'])
+    except Exception as e:
+        print(f"Error saving receipt: {e}")
+    if receipt_text is not None:
+        print_queue.queue_jobs(conn, receipt_print_jobs(order_id, cart, receipt_text, customer_name),
+                               now.strftime('%Y-%m-%d %H:%M:%S'))
+
+    log_activity('orden_completada',
+                 f'Orden #{order_id} — {customer_name} — ${total_price:.2f} ({pay["payment_method"]})',
+                 conn=conn)
+    return order_id, receipt_text
+
+
+def queue_receipt_file(order_id, receipt_text):
+    """Después del commit: avisa al print bridge y guarda copia del ticket en
+    archivo, fuera del request."""
+    if receipt_text is not None:
+        print_queue.notify()
+        _receipt_files.submit(_save_receipt_quietly, order_id, receipt_text)
+
+
+def _reset_sale_session():
+    session['customer_name'] = ''
+    session.pop('coupon_code', None)
+    session['ticket_token'] = str(uuid.uuid4())
+    session.modified = True
+
+
+def _replay_ticket(result):
+    """Respuesta de un /ticket repetido con la misma llave de idempotencia. El
+    carrito ya se descartó en el primer intento; no se toca aquí para no
+    borrar una orden nueva que el cajero ya haya empezado."""
+    _reset_sale_session()
+    return render_template('thank_you.html', **result)
 
 
 def register(app, csrf):
     @app.route('/payment')
     @login_required
     def payment():
-        cart = session.get('cart', [])
+        cart = cart_store.current()
         if not cart:
             flash('Agrega al menos un ítem antes de proceder al pago.', 'error')
             return redirect(url_for('home'))
-        total_price = money(sum(item['price'] for item in cart))
+        total_price = from_cents(cart_total_cents(cart))
         return render_template('payment.html', total_price=total_price,
                                ticket_token=_issue_ticket_token())
 
     @app.route('/cash_payment')
     @login_required
     def cash_payment():
-        cart = session.get('cart', [])
+        cart = cart_store.current()
         if not cart:
             flash('Agrega al menos un ítem antes de proceder al pago.', 'error')
             return redirect(url_for('home'))
-        total_price = money(sum(item['price'] for item in cart))
+        total_price = from_cents(cart_total_cents(cart))
         return render_template('cash_payment.html', total_price=total_price,
                                usd_rate=_usd_rate(),
                                ticket_token=_issue_ticket_token())
@@ -152,8 +357,8 @@ def register(app, csrf):
     @app.route('/split_payment')
     @login_required
     def split_payment():
-        cart = session.get('cart', [])
-        total_price = money(sum(item['price'] for item in cart))
+        cart = cart_store.current()
+        total_price = from_cents(cart_total_cents(cart))
         return render_template('split_payment.html', total_price=total_price,
                                usd_rate=_usd_rate(),
                                ticket_token=_issue_ticket_token())
@@ -161,7 +366,14 @@ def register(app, csrf):
     @app.route('/ticket', methods=['POST'])
     @login_required
     def ticket():
-        cart = session.get('cart', [])
+        # Reintento de un cobro que ya se guardó: se repite la respuesta original
+        idem_key = idempotency.request_key()
+        if idem_key:
+            replay = idempotency.lookup(get_db_connection(), 'ticket', idem_key)
+            if replay is not None:
+                return _replay_ticket(replay)
+
+        cart = cart_store.current()
         if not cart:
             flash('Agrega al menos un ítem antes de proceder al pago.', 'error')
             return redirect(url_for('home'))
@@ -173,148 +385,129 @@ def register(app, csrf):
                 return redirect(url_for('home'))
             session.pop('ticket_token', None)
 
-        total_price = money(sum(item['price'] for item in cart))
-        payment_method = request.form.get('payment_method', 'card')
-
-        paid_currency = request.form.get('currency', 'mxn').lower()
-        if paid_currency not in ('mxn', 'usd'):
-            paid_currency = 'mxn'
-        paid_amount_usd = 0.0
-        usd_rate_used = 0.0
-
-        try:
-            amount_paid = money(float(request.form.get('amount_paid', total_price)))
-        except (ValueError, TypeError):
-            amount_paid = total_price
-            paid_currency = 'mxn'
-
-        if payment_method == 'cash' and paid_currency == 'usd':
-            usd_rate_used = _usd_rate()
-            paid_amount_usd = amount_paid
-            amount_paid = money(paid_amount_usd * usd_rate_used)
-
-        change = money(amount_paid - total_price) if payment_method == 'cash' else 0
-
-        if payment_method == 'cash' and amount_paid < total_price:
-            flash(f'Pago insuficiente. Se recibió ${amount_paid:.2f} de ${total_price:.2f}.', 'error')
+        total_price = from_cents(cart_total_cents(cart))
+        pay, error = settle_payment(total_price, request.form)
+        if error:
+            flash(error, 'error')
             return redirect(url_for('view_cart'))
 
-        split_cash_mxn = None
-        split_card = None
-        if payment_method == 'split':
-            try:
-                cash_portion = float(request.form.get('cash_portion', 0))
-                card_portion = float(request.form.get('card_portion', 0))
-            except (ValueError, TypeError):
-                cash_portion = 0.0
-                card_portion = 0.0
-            if cash_portion < 0 or card_portion < 0:
-                flash('Los montos de pago no pueden ser negativos.', 'error')
-                return redirect(url_for('view_cart'))
-            if money(card_portion) > total_price:
-                flash('El monto con tarjeta no puede exceder el total.', 'error')
-                return redirect(url_for('view_cart'))
-            cash_currency = request.form.get('cash_currency', 'mxn').lower()
-            if cash_currency == 'usd' and cash_portion > 0:
-                usd_rate_used = _usd_rate()
-                paid_amount_usd = money(cash_portion)
-                paid_currency = 'usd'
-                cash_portion = money(paid_amount_usd * usd_rate_used)
-            else:
-                paid_currency = 'mxn'
-                cash_portion = money(cash_portion)
-            amount_paid = money(cash_portion + card_portion)
-            if amount_paid < total_price:
-                flash(f'Pago insuficiente. Se recibió ${amount_paid:.2f} de ${total_price:.2f}.', 'error')
-                return redirect(url_for('view_cart'))
-            change = money(max(0, amount_paid - total_price))
-            split_cash_mxn = cash_portion
-            split_card = money(card_portion)
-
-        order_id = session.get('order_id')
         customer_name = session.get('customer_name', 'Cliente')
 
-        conn = None
+        # Una sola transacción: llave de idempotencia, orden, líneas, borrado de
+        # la orden en espera y del carrito, trabajo de impresión y auditoría (un solo fsync).
+        conn = get_db_connection()
         try:
-            conn = get_db_connection()
-            for _intento in range(5):
-                try:
-                    conn.execute(
-                        'INSERT INTO orders (id, items, total, payment_method, amount_paid, '
-                        'change_amount, date, status, customer_name, paid_currency, '
-                        'paid_amount_usd, usd_rate) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
-                        (order_id, json.dumps(cart), total_price, payment_method,
-                         amount_paid, change,
-                         datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                         'completed', customer_name, paid_currency, paid_amount_usd, usd_rate_used)
-                    )
-                    break
-                except sqlite3.IntegrityError:
-                    if _intento == 4:
-                        raise
-                    order_id = str(uuid.uuid4())[:8]
-
-            held_id = session.pop('held_id', None)
-            if held_id:
-                conn.execute('DELETE FROM held_orders WHERE id = ?', (held_id,))
-            conn.commit()
-
-            receipt_file_success = False
-            try:
-                receipt_path, receipt_text = print_receipt_physical(
-                    cart, total_price, payment_method, amount_paid, change,
-                    order_id, customer_name,
-                    paid_currency=paid_currency, paid_amount_usd=paid_amount_usd,
-                    usd_rate=usd_rate_used, split_cash_mxn=split_cash_mxn,
-                    split_card=split_card)
-                receipt_file_success = True
-                conn.execute(
-                    "INSERT OR IGNORE INTO print_jobs (id, receipt_content, status, created_at) "
-                    "VALUES (?, ?, 'pending', ?)",
-                    (order_id, receipt_text, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-                )
-                conn.commit()
-            except Exception as e:
-                print(f"Error saving receipt: {e}")
-
-            log_activity('orden_completada',
-                         f'Orden #{order_id} — {customer_name} — ${total_price:.2f} ({payment_method})')
-            session['cart'] = []
-            session['order_id'] = str(uuid.uuid4())[:8]
-            session['customer_name'] = ''
-            session.pop('coupon_code', None)
-            session['ticket_token'] = str(uuid.uuid4())
-            session.modified = True
-
-            job_status = 'none'
-            if receipt_file_success:
-                job_row = conn.execute(
-                    "SELECT status FROM print_jobs WHERE id = ?", (order_id,)
-                ).fetchone()
-                job_status = job_row['status'] if job_row else 'none'
-
-            return render_template('thank_you.html', order_id=order_id,
-                                   print_success=receipt_file_success,
-                                   job_status=job_status)
+            with write_transaction(conn):
+                if idem_key:
+                    idempotency.claim(conn, 'ticket', idem_key)
+                order_id, receipt_text = commit_order(conn, cart, total_price, pay,
+                                                      customer_name)
+                held_id = session.pop('held_id', None)
+                if held_id:
+                    conn.execute('DELETE FROM held_orders WHERE id = ?', (held_id,))
+                cart_store.delete_spilled(conn)
+                # El trabajo se acaba de encolar en la misma transacción: sigue pendiente
+                result = {'order_id': order_id,
+                          'print_success': receipt_text is not None,
+                          'job_status': 'pending' if receipt_text is not None else 'none'}
+                if idem_key:
+                    idempotency.record(conn, 'ticket', idem_key, order_id, result)
+
+        except idempotency.KeyInUse:
+            replay = idempotency.lookup(conn, 'ticket', idem_key)
+            if replay is not None:
+                return _replay_ticket(replay)
+            flash('Esta orden ya fue procesada.', 'error')
+            return redirect(url_for('home'))
 
         except Exception as e:
             flash(f"Error al guardar la orden: {e}", "error")
             print(f"Error al guardar la orden: {e}")
-            if conn:
-                conn.rollback()
             return redirect(url_for('view_cart'))
 
+        queue_receipt_file(order_id, receipt_text)
+
+        cart_store.discard_current()
+        _reset_sale_session()
+        return render_template('thank_you.html', **result)
+
     @app.route('/api/print_queue')
     @csrf.exempt
     def get_print_queue():
+        """Pendientes con seq > since (0 = todos). Con wait=<s>, long-poll: si
+        no hay nada nuevo espera un aviso de print_queue.notify(). Ver print_queue."""
         if not _api_autorizada():
             return jsonify({'error': 'No autorizado'}), 401
+        since = request.args.get('since', 0, type=int) or 0
+        wait = min(max(request.args.get('wait', 0, type=float) or 0, 0), print_queue.MAX_WAIT)
+
+        visto = print_queue.version()
+        jobs, cursor = print_queue.pending_jobs(get_db_connection(), since)
+        if not jobs and wait:
+            # No retener una conexión del pool mientras se espera
+            release_db_connection()
+            if print_queue.wait_for_jobs(visto, wait):
+                jobs, cursor = print_queue.pending_jobs(get_db_connection(), cursor)
+        return jsonify({'jobs': jobs, 'cursor': cursor})
+
+    @app.route('/api/print_queue/claim', methods=['POST'])
+    @csrf.exempt
+    def claim_print_jobs():
+        """Reserva jobs para un bridge: {"bridge": "cocina", "limit": 10,
+        "lease": 60, "wait": 25, "stations": ["kitchen"]}. Con wait es long-poll, igual que
+        /api/print_queue. Ver print_queue.claim_jobs."""
+        if not _api_autorizada():
+            return jsonify({'error': 'No autorizado'}), 401
+        data = request.get_json(silent=True) or {}
+        if not isinstance(data, dict):
+            return jsonify({'error': 'JSON inválido'}), 400
+        bridge = str(data.get('bridge') or '').strip()[:100] or request.remote_addr or 'bridge'
+        try:
+            limit = min(max(int(data.get('limit', 10)), 1), print_queue.MAX_CLAIM)
+            lease = min(max(float(data.get('lease', print_queue.DEFAULT_LEASE)),
+                            print_queue.MIN_LEASE), print_queue.MAX_LEASE)
+            wait = min(max(float(data.get('wait', 0)), 0), print_queue.MAX_WAIT)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'limit, lease y wait deben ser números'}), 400
+        stations = data.get('stations') or None
+        if stations is not None and (not isinstance(stations, list)
+                                     or not all(isinstance(s, str) for s in stations)):
+            return jsonify({'error': 'stations debe ser una lista'}), 400
+
+        visto = print_queue.version()
         conn = get_db_connection()
-        jobs = conn.execute(
-            "SELECT id, receipt_content, status, created_at FROM print_jobs "
-            "WHERE status = 'pending' ORDER BY created_at"
-        ).fetchall()
-        return jsonify({'jobs': [dict(j) for j in jobs]})
+        with write_transaction(conn):
+            jobs = print_queue.claim_jobs(conn, bridge, limit, lease, stations)
+        if not jobs and wait:
+            # Despertar también cuando venza el préstamo de otro bridge
+            proximo = print_queue.next_lease_expiry(conn)
+            if proximo is not None:
+                wait = min(wait, max(proximo - time.time(), 0.05))
+            release_db_connection()
+            print_queue.wait_for_jobs(visto, wait)
+            conn = get_db_connection()
+            with write_transaction(conn):
+                jobs = print_queue.claim_jobs(conn, bridge, limit, lease, stations)
+        return jsonify({'jobs': jobs, 'bridge': bridge, 'lease': lease})
+
+    @app.route('/api/print_queue/release', methods=['POST'])
+    @csrf.exempt
+    def release_print_jobs():
+        """El bridge no pudo imprimir: {"bridge": "cocina", "ids": [...]} vuelve
+        los jobs a la cola sin esperar a que venza el préstamo."""
+        if not _api_autorizada():
+            return jsonify({'error': 'No autorizado'}), 401
+        data = request.get_json(silent=True) or {}
+        ids = data.get('ids') if isinstance(data, dict) else None
+        if not isinstance(ids, list) or not all(isinstance(i, str) and i for i in ids):
+            return jsonify({'error': 'ids required'}), 400
+        bridge = str(data.get('bridge') or '').strip()[:100] or request.remote_addr or 'bridge'
+        conn = get_db_connection()
+        with write_transaction(conn):
+            released = print_queue.release_jobs(conn, bridge, ids[:print_queue.MAX_ACK])
+        if released:
+            print_queue.notify()
+        return jsonify({'ok': True, 'released': released})
 
     @app.route('/api/mark_printed/<job_id>', methods=['POST'])
     @csrf.exempt
@@ -322,10 +515,27 @@ def register(app, csrf):
         if not _api_autorizada():
             return jsonify({'error': 'No autorizado'}), 401
         conn = get_db_connection()
-        conn.execute("UPDATE print_jobs SET status = 'printed' WHERE id = ?", (job_id,))
-        conn.commit()
+        with write_transaction(conn):
+            print_queue.mark_printed(conn, [job_id])
         return jsonify({'ok': True})
 
+    @app.route('/api/mark_printed', methods=['POST'])
+    @csrf.exempt
+    def mark_printed_batch():
+        """Confirma varios jobs en una sola transacción: {"ids": ["A", "B", ...]}."""
+        if not _api_autorizada():
+            return jsonify({'error': 'No autorizado'}), 401
+        data = request.get_json(silent=True) or {}
+        ids = data.get('ids') if isinstance(data, dict) else None
+        if not isinstance(ids, list) or not all(isinstance(i, str) and i for i in ids):
+            return jsonify({'error': 'ids required'}), 400
+        if len(ids) > print_queue.MAX_ACK:
+            return jsonify({'error': f'Máximo {print_queue.MAX_ACK} ids por petición'}), 400
+        conn = get_db_connection()
+        with write_transaction(conn):
+            marked = print_queue.mark_printed(conn, ids)
+        return jsonify({'ok': True, 'marked': marked})
+
     @app.route('/api/config/printer', methods=['POST'])
     @csrf.exempt
     def update_printer_api():
@@ -336,9 +546,7 @@ def register(app, csrf):
         if not printer_name:
             return jsonify({'error': 'printer_name required'}), 400
         conn = get_db_connection()
-        conn.execute(
-            "INSERT OR REPLACE INTO config (key, value) VALUES ('printer_name', ?)",
-            (printer_name,)
-        )
-        conn.commit()
+        with write_transaction(conn):
+            config_store.set_value(conn, 'printer_name', printer_name)
+        config_store.invalidate()
         return jsonify({'ok': True, 'printer_name': printer_name})
@@ -1,7 +1,11 @@
 """Precios del menú — edición por el admin."""
+import sqlite3
+
 from flask import render_template, request, redirect, url_for, flash
 
 from auth import login_required, admin_required
+from write_coordinator import write_transaction
+import catalog
 from db import get_db_connection, log_activity
 
 
@@ -11,12 +15,13 @@ def register(app):
     @admin_required
     def update_prices():
         conn = get_db_connection()
-        for key, value in request.form.items():
-            try:
-                conn.execute('UPDATE menu_prices SET price = ? WHERE key = ?', (float(value), key))
-            except (ValueError, sqlite3.Error):
-                pass
-        conn.commit()
+        with write_transaction(conn):
+            for key, value in request.form.items():
+                try:
+                    conn.execute('UPDATE menu_prices SET price = ? WHERE key = ?', (float(value), key))
+                except (ValueError, sqlite3.Error):
+                    pass
+        catalog.bump()
         log_activity('precios_actualizados', 'Precios del menú actualizados')
         flash('Precios actualizados correctamente.', 'success')
         return redirect(url_for('manage_prices'))
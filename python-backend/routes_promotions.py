@@ -10,6 +10,7 @@ from flask import (render_template, request, redirect, url_for, session,
                    flash, jsonify, Response, send_file)
 
 from auth import login_required, admin_required
+from write_coordinator import write_transaction
 from db import (get_db_connection, log_activity, _get_db_path,
                 backup_db_to_file, get_item_price, get_menu_options)
 from business import (money, format_num, get_week_bounds, parse_scheduled_days,
@@ -66,12 +67,12 @@ def register(app):
         if existing:
             flash(f'Ya existe una promoción con el código "{name}".', 'error')
             return redirect(url_for('manage_promotions'))
-        conn.execute(
-            'INSERT INTO promotions (name, description, type, value, get_free, min_purchase, applicable_items, active) '
-            'VALUES (?, ?, ?, ?, ?, ?, ?, 1)',
-            (name, description, promo_type, value, get_free, min_purchase, applicable_json)
-        )
-        conn.commit()
+        with write_transaction(conn):
+            conn.execute(
+                'INSERT INTO promotions (name, description, type, value, get_free, min_purchase, applicable_items, active) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, 1)',
+                (name, description, promo_type, value, get_free, min_purchase, applicable_json)
+            )
         flash(f'Promoción "{name}" creada.', 'success')
         return redirect(url_for('manage_promotions'))
 
@@ -83,8 +84,8 @@ def register(app):
         conn = get_db_connection()
         promo = conn.execute('SELECT name FROM promotions WHERE id = ?', (promo_id,)).fetchone()
         if promo:
-            conn.execute('DELETE FROM promotions WHERE id = ?', (promo_id,))
-            conn.commit()
+            with write_transaction(conn):
+                conn.execute('DELETE FROM promotions WHERE id = ?', (promo_id,))
             flash(f'Promoción "{promo["name"]}" eliminada.', 'success')
         return redirect(url_for('manage_promotions'))
 
@@ -97,8 +98,8 @@ def register(app):
         promo = conn.execute('SELECT active, name FROM promotions WHERE id = ?', (promo_id,)).fetchone()
         if promo:
             new_state = 0 if promo['active'] else 1
-            conn.execute('UPDATE promotions SET active = ? WHERE id = ?', (new_state, promo_id))
-            conn.commit()
+            with write_transaction(conn):
+                conn.execute('UPDATE promotions SET active = ? WHERE id = ?', (new_state, promo_id))
             state_label = 'activada' if new_state else 'desactivada'
             flash(f'Promoción "{promo["name"]}" {state_label}.', 'success')
         return redirect(url_for('manage_promotions'))
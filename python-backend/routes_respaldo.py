@@ -11,6 +11,10 @@ from flask import (render_template, request, redirect, url_for, session,
                    flash, jsonify, Response, send_file)
 
 from auth import login_required, admin_required
+import catalog
+import config_store
+import sales_rollup
+from write_coordinator import write_transaction
 from db import (get_db_connection, log_activity, _get_db_path,
                 backup_db_to_file, get_item_price, get_menu_options)
 from business import (money, format_num, get_week_bounds, parse_scheduled_days,
@@ -105,6 +109,8 @@ def register(app):
             # actual. Import diferido para evitar import circular al cargar módulo.
             import app as _app
             _app.init_db()
+            catalog.bump()
+            config_store.invalidate()
 
             # log_activity antes de limpiar la sesión (lee el usuario de la sesión)
             log_activity('respaldo_importado', 'Base de datos restaurada desde un respaldo')
@@ -116,3 +122,16 @@ def register(app):
                 os.remove(tmp_path)
             except OSError:
                 pass
+
+
+    @app.route('/admin/respaldo/recalcular-ventas', methods=['POST'])
+    @login_required
+    @admin_required
+    def respaldo_recalcular_ventas():
+        """Reconstruye el resumen diario (daily_sales) desde la tabla orders."""
+        conn = get_db_connection()
+        with write_transaction(conn):
+            filas = sales_rollup.rebuild(conn)
+        log_activity('resumen_recalculado', f'Resumen diario de ventas recalculado ({filas} filas)')
+        flash('Resumen de ventas recalculado.', 'success')
+        return redirect(url_for('respaldo'))
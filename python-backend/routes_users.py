@@ -10,6 +10,7 @@ from flask import (render_template, request, redirect, url_for, session,
                    flash, jsonify, Response, send_file)
 
 from auth import login_required, admin_required
+from write_coordinator import write_transaction
 from db import (get_db_connection, log_activity, _get_db_path,
                 backup_db_to_file, get_item_price, get_menu_options)
 from business import (money, format_num, get_week_bounds, parse_scheduled_days,
@@ -53,10 +54,10 @@ def register(app):
                 flash('Usuario no encontrado.', 'error')
                 return render_template('forgot_password.html')
 
-            conn.execute('UPDATE users SET password = ? WHERE id = ?',
-                         (generate_password_hash(new_pw), user['id']))
-            conn.execute('UPDATE users SET password_changed = 1 WHERE id = ?', (user['id'],))
-            conn.commit()
+            with write_transaction(conn):
+                conn.execute('UPDATE users SET password = ? WHERE id = ?',
+                             (generate_password_hash(new_pw), user['id']))
+                conn.execute('UPDATE users SET password_changed = 1 WHERE id = ?', (user['id'],))
             flash('Contraseña actualizada. Ya puedes iniciar sesión.', 'success')
             return redirect(url_for('login'))
 
@@ -90,10 +91,10 @@ def register(app):
                 flash('Contraseña actual incorrecta.', 'error')
                 return render_template('change_password.html')
 
-            conn.execute('UPDATE users SET password = ? WHERE id = ?',
-                         (generate_password_hash(new_pw), session['user_id']))
-            conn.execute('UPDATE users SET password_changed = 1 WHERE id = ?', (session['user_id'],))
-            conn.commit()
+            with write_transaction(conn):
+                conn.execute('UPDATE users SET password = ? WHERE id = ?',
+                             (generate_password_hash(new_pw), session['user_id']))
+                conn.execute('UPDATE users SET password_changed = 1 WHERE id = ?', (session['user_id'],))
             flash('Contraseña actualizada exitosamente.', 'success')
             return redirect(url_for('admin_dashboard') if session.get('role') == 'admin' else url_for('home'))
 
@@ -133,9 +134,9 @@ def register(app):
             flash(f'El usuario "{username}" ya existe.', 'error')
             return redirect(url_for('manage_users'))
 
-        conn.execute('INSERT INTO users (username, password, role) VALUES (?, ?, ?)',
-                     (username, generate_password_hash(password), role))
-        conn.commit()
+        with write_transaction(conn):
+            conn.execute('INSERT INTO users (username, password, role) VALUES (?, ?, ?)',
+                         (username, generate_password_hash(password), role))
         log_activity('usuario_creado', f'Usuario "{username}" ({role}) creado')
         flash(f'Usuario "{username}" creado exitosamente.', 'success')
         return redirect(url_for('manage_users'))
@@ -156,10 +157,10 @@ def register(app):
             flash('Usuario no encontrado.', 'error')
             return redirect(url_for('manage_users'))
 
-        conn.execute('UPDATE users SET password = ? WHERE id = ?',
-                     (generate_password_hash(new_pw), user_id))
-        conn.execute('UPDATE users SET password_changed = 1 WHERE id = ?', (user_id,))
-        conn.commit()
+        with write_transaction(conn):
+            conn.execute('UPDATE users SET password = ? WHERE id = ?',
+                         (generate_password_hash(new_pw), user_id))
+            conn.execute('UPDATE users SET password_changed = 1 WHERE id = ?', (user_id,))
         log_activity('contraseña_restablecida', f'Contraseña de "{user["username"]}" restablecida')
         flash(f'Contraseña de "{user["username"]}" restablecida.', 'success')
         return redirect(url_for('manage_users'))
@@ -176,8 +177,8 @@ def register(app):
         conn = get_db_connection()
         user = conn.execute('SELECT username FROM users WHERE id = ?', (user_id,)).fetchone()
         if user:
-            conn.execute('DELETE FROM users WHERE id = ?', (user_id,))
-            conn.commit()
+            with write_transaction(conn):
+                conn.execute('DELETE FROM users WHERE id = ?', (user_id,))
             log_activity('usuario_eliminado', f'Usuario "{user["username"]}" eliminado')
             flash(f'Usuario "{user["username"]}" eliminado.', 'success')
         return redirect(url_for('manage_users'))
@@ -0,0 +1,141 @@
+"""Resumen diario de ventas (daily_sales) mantenido de forma incremental.
+
+Una fila por (día, método de pago) con órdenes completadas, ingresos en
+centavos y órdenes anuladas. Lo mantienen triggers sobre `orders`, así se
+actualiza en la MISMA transacción que ticket(), void_order() y los borrados
+del historial (y que cualquier otro escritor de la tabla). El dashboard,
+reports() y Kuike leen a lo más una fila por día/método en vez de escanear
+todas las órdenes.
+
+Semántica idéntica a las consultas que reemplaza: una orden cuenta en
+`orders`/`revenue_cents` si status != 'voided' y en `voided` si
+status = 'voided' (una orden con status NULL no cuenta en ninguno).
+rebuild() recalcula la tabla desde cero si alguna vez se desalinea.
+
+Los ingresos suman `total_cents` (la columna entera de la orden), no el
+REAL `total`; solo una fila sin centavos cae al total redondeado, el mismo
+valor que luego le asigna trg_orders_cents_insert.
+"""
+
+_CREATE = '''
+CREATE TABLE IF NOT EXISTS daily_sales (
+    day            TEXT NOT NULL,
+    payment_method TEXT NOT NULL DEFAULT '',
+    orders         INTEGER NOT NULL DEFAULT 0,
+    revenue_cents  INTEGER NOT NULL DEFAULT 0,
+    voided         INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, payment_method)
+)
+'''
+
+# Centavos de una fila de orders (NEW, OLD o la tabla misma)
+def _cents(row):
+    prefix = f'{row}.' if row else ''
+    return (f'COALESCE({prefix}total_cents, '
+            f'CAST(ROUND(COALESCE({prefix}total, 0) * 100) AS INTEGER))')
+
+
+# Aporte de una fila de orders (NEW u OLD) multiplicado por `sign` (+1 / -1)
+def _upsert(row, sign):
+    return f'''
+    INSERT INTO daily_sales (day, payment_method, orders, revenue_cents, voided)
+    VALUES (
+        COALESCE(substr({row}.date, 1, 10), ''),
+        COALESCE({row}.payment_method, ''),
+        {sign} * (CASE WHEN {row}.status != 'voided' THEN 1 ELSE 0 END),
+        {sign} * (CASE WHEN {row}.status != 'voided'
+                       THEN {_cents(row)} ELSE 0 END),
+        {sign} * (CASE WHEN {row}.status = 'voided' THEN 1 ELSE 0 END)
+    )
+    ON CONFLICT (day, payment_method) DO UPDATE SET
+        orders        = orders + excluded.orders,
+        revenue_cents = revenue_cents + excluded.revenue_cents,
+        voided        = voided + excluded.voided;
+'''
+
+
+_TRIGGER_NAMES = ('trg_daily_sales_insert', 'trg_daily_sales_delete', 'trg_daily_sales_update')
+
+# Un cambio solo de `total` llega aquí vía trg_orders_cents_update, que
+# reescribe total_cents.
+_TRIGGERS = (
+    f'''CREATE TRIGGER IF NOT EXISTS trg_daily_sales_insert AFTER INSERT ON orders
+    BEGIN {_upsert('NEW', 1)} END''',
+    f'''CREATE TRIGGER IF NOT EXISTS trg_daily_sales_delete AFTER DELETE ON orders
+    BEGIN {_upsert('OLD', -1)} END''',
+    f'''CREATE TRIGGER IF NOT EXISTS trg_daily_sales_update
+    AFTER UPDATE OF date, payment_method, status, total_cents ON orders
+    BEGIN {_upsert('OLD', -1)} {_upsert('NEW', 1)} END''',
+)
+
+
+def install(conn):
+    """Crea la tabla y los triggers; la llena desde orders si es nueva."""
+    conn.execute(_CREATE)
+    for trigger in _TRIGGERS:
+        conn.execute(trigger)
+    vacia = conn.execute('SELECT 1 FROM daily_sales LIMIT 1').fetchone() is None
+    if vacia and conn.execute('SELECT 1 FROM orders LIMIT 1').fetchone() is not None:
+        rebuild(conn)
+
+
+def reinstall(conn):
+    """Reemplaza los triggers (CREATE IF NOT EXISTS no cambia los viejos) y
+    recalcula la tabla con la definición actual."""
+    for name in _TRIGGER_NAMES:
+        conn.execute(f'DROP TRIGGER IF EXISTS {name}')
+    conn.execute(_CREATE)
+    for trigger in _TRIGGERS:
+        conn.execute(trigger)
+    return rebuild(conn)
+
+
+def rebuild(conn):
+    """Recalcula daily_sales completa desde orders (reparación de desfases)."""
+    conn.execute('DELETE FROM daily_sales')
+    conn.execute(f'''
+        INSERT INTO daily_sales (day, payment_method, orders, revenue_cents, voided)
+        SELECT COALESCE(substr(date, 1, 10), ''), COALESCE(payment_method, ''),
+               SUM(CASE WHEN status != 'voided' THEN 1 ELSE 0 END),
+               SUM(CASE WHEN status != 'voided' THEN {_cents('')} ELSE 0 END),
+               SUM(CASE WHEN status = 'voided' THEN 1 ELSE 0 END)
+        FROM orders
+        GROUP BY 1, 2
+    ''')
+    return conn.execute('SELECT COUNT(*) FROM daily_sales').fetchone()[0]
+
+
+def _range(start_day, end_day):
+    if end_day is None:
+        return 'day >= ?', (start_day,)
+    return 'day >= ? AND day <= ?', (start_day, end_day)
+
+
+def summary(conn, start_day, end_day=None):
+    """(órdenes, ingresos, anuladas) para los días [start_day, end_day]."""
+    clause, args = _range(start_day, end_day)
+    row = conn.execute(
+        f'SELECT COALESCE(SUM(orders),0), COALESCE(SUM(revenue_cents),0), COALESCE(SUM(voided),0) '
+        f'FROM daily_sales WHERE {clause}', args
+    ).fetchone()
+    return row[0], row[1] / 100, row[2]
+
+
+def by_payment(conn, start_day, end_day=None):
+    """[(método, órdenes, ingresos)] con al menos una orden completada."""
+    clause, args = _range(start_day, end_day)
+    rows = conn.execute(
+        f"SELECT NULLIF(payment_method, ''), SUM(orders), SUM(revenue_cents) FROM daily_sales "
+        f'WHERE {clause} GROUP BY 1 HAVING SUM(orders) > 0', args
+    ).fetchall()
+    return [(r[0], r[1], r[2] / 100) for r in rows]
+
+
+def by_day(conn, start_day, end_day=None):
+    """{día: (órdenes, ingresos)} para los días con ventas completadas."""
+    clause, args = _range(start_day, end_day)
+    rows = conn.execute(
+        f'SELECT day, SUM(orders), SUM(revenue_cents) FROM daily_sales '
+        f'WHERE {clause} GROUP BY day HAVING SUM(orders) > 0', args
+    ).fetchall()
+    return {r[0]: (r[1], r[2] / 100) for r in rows}
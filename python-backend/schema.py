@@ -1,30 +1,90 @@
 """Esquema e inicialización de la base de datos.
-Crea tablas si faltan, aplica migraciones idempotentes y siembra datos por
-defecto (precios, opciones de menú, usuarios admin/user). Se llama al arrancar
-(app.py __main__) y desde las pruebas."""
+Aplica en orden las migraciones de MIGRATIONS que la BD todavía no tiene
+(según PRAGMA user_version): tablas, columnas, índices y datos por defecto
+(precios, opciones de menú, usuarios admin/user). Se llama al arrancar
+(app.py __main__), después de importar un respaldo y desde las pruebas."""
+import json
 import sqlite3
+import time
+from collections import namedtuple
 
 from werkzeug.security import generate_password_hash
 
+import catalog
+import config_store
+import sales_rollup
+from business import order_item_rows
 from db import get_db_connection
 
+ORDER_ITEMS_BACKFILL_CHUNK = 500
 
-def init_db():
-    conn = get_db_connection()
+# atomic=False: la migración maneja sus propios commits
+Migration = namedtuple('Migration', 'version name apply atomic', defaults=(True,))
 
-    # WAL mode: uncommitted writes are rolled back on crash instead of
-    # leaving the DB in a half-written state.
-    conn.execute('PRAGMA journal_mode=WAL')
-
-    # Detect corruption early; log a warning but don't crash so the owner
-    # can still open the app and restore from a backup manually.
-    integrity = conn.execute('PRAGMA quick_check').fetchone()[0]
-    if integrity != 'ok':
-        import logging
-        logging.getLogger(__name__).error(
-            '[DB] Integrity check failed: %s — restore from a backup in userData/backups/', integrity
-        )
+# Índices para los filtros calientes (ver query_plans.HOT_QUERIES), creados
+# por la migración 5. Un índice nuevo va en una migración nueva.
+INDEX_PACK = (
+    # El bridge consulta la cola cada 2 s: índice parcial solo con pendientes
+    ('idx_print_jobs_pending',
+     "CREATE INDEX IF NOT EXISTS idx_print_jobs_pending ON print_jobs(created_at) "
+     "WHERE status = 'pending'"),
+    # Bitácora del admin y Kuike: ORDER BY timestamp DESC LIMIT n
+    ('idx_activity_log_timestamp',
+     'CREATE INDEX IF NOT EXISTS idx_activity_log_timestamp ON activity_log(timestamp)'),
+    # Nómina: versión de horario vigente por empleado
+    ('idx_employee_schedules_emp',
+     'CREATE INDEX IF NOT EXISTS idx_employee_schedules_emp '
+     'ON employee_schedules(employee_id, effective_from)'),
+    # Clientes recientes / frecuentes
+    ('idx_orders_customer',
+     'CREATE INDEX IF NOT EXISTS idx_orders_customer ON orders(customer_name)'),
+    # Historial filtrado por estado (anuladas) dentro de un rango de fechas
+    ('idx_orders_status_date',
+     'CREATE INDEX IF NOT EXISTS idx_orders_status_date ON orders(status, date)'),
+)
 
+
+def backfill_order_items(conn, chunk=ORDER_ITEMS_BACKFILL_CHUNK):
+    """Llena order_items para órdenes anteriores a la tabla. Reanudable: avanza
+    por rowid en bloques y guarda el cursor en config en la MISMA transacción
+    que cada bloque, así un cierre a la mitad continúa donde se quedó."""
+    row = conn.execute("SELECT value FROM config WHERE key = 'order_items_backfill'").fetchone()
+    cursor = int(row['value']) if row else 0
+    total = 0
+    while True:
+        orders = conn.execute(
+            'SELECT rowid, id, items, total FROM orders WHERE rowid > ? ORDER BY rowid LIMIT ?',
+            (cursor, chunk)
+        ).fetchall()
+        if not orders:
+            break
+        for o in orders:
+            ya = conn.execute('SELECT 1 FROM order_items WHERE order_id = ? LIMIT 1',
+                              (o['id'],)).fetchone()
+            if ya:
+                continue  # escrita por ticket() después de crear la tabla
+            try:
+                items = json.loads(o['items']) if o['items'] else []
+            except (json.JSONDecodeError, TypeError):
+                items = []
+            if not isinstance(items, list):
+                items = []
+            rows = order_item_rows(o['id'], items, o['total'])
+            conn.executemany(
+                'INSERT OR IGNORE INTO order_items (order_id, line_no, type, name, quantity, '
+                'unit_price, price, discount) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            total += len(rows)
+        cursor = orders[-1]['rowid']
+        conn.execute("INSERT OR REPLACE INTO config (key, value) VALUES ('order_items_backfill', ?)",
+                     (str(cursor),))
+        conn.commit()
+    return total
+
+
+def _m001_esquema_base(conn):
+    """Tablas, columnas y datos por defecto anteriores al registro de
+    migraciones. Idempotente: también lleva al día una BD (o un respaldo)
+    creada por cualquier versión previa."""
     conn.execute('''
     CREATE TABLE IF NOT EXISTS orders (
         id TEXT PRIMARY KEY,
@@ -161,14 +221,12 @@ def init_db():
     # Migration: add description column to promotions if missing
     try:
         conn.execute('ALTER TABLE promotions ADD COLUMN description TEXT DEFAULT ""')
-        conn.commit()
     except Exception:
         pass  # Column already exists
 
     # Migration: add get_free column for NxM promotions
     try:
         conn.execute('ALTER TABLE promotions ADD COLUMN get_free INTEGER DEFAULT 1')
-        conn.commit()
     except Exception:
         pass  # Column already exists
 
@@ -258,14 +316,12 @@ def init_db():
 
     try:
         conn.execute('ALTER TABLE users ADD COLUMN password_changed INTEGER DEFAULT 0')
-        conn.commit()
     except sqlite3.OperationalError:
         pass
 
     # Migrar tipo legacy 'buy_x_get_y' a 'bxgy' (unificar con el tipo que crea el admin)
     try:
         conn.execute("UPDATE promotions SET type = 'bxgy' WHERE type = 'buy_x_get_y'")
-        conn.commit()
     except Exception:
         pass
 
@@ -280,7 +336,6 @@ def init_db():
                 'INSERT INTO menu_options (category, name, icon, price, sort_order) VALUES (?, ?, ?, 0, ?)',
                 ('sushi_sauce', name, icon, sort)
             )
-        conn.commit()
 
     # Add demo promotions if they don't exist
     existing_promos = conn.execute('SELECT COUNT(*) FROM promotions').fetchone()[0]
@@ -365,5 +420,202 @@ def init_db():
     )
     ''')
 
-    conn.commit()
+
+def _m002_order_items(conn):
+    # Líneas de cada orden normalizadas: los reportes de productos agregan con
+    # GROUP BY en SQL en vez de hacer json.loads de orders.items por orden.
+    # La PK (order_id, line_no) sirve como índice por order_id.
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS order_items (
+        order_id   TEXT NOT NULL REFERENCES orders(id) ON DELETE CASCADE,
+        line_no    INTEGER NOT NULL,
+        type       TEXT,
+        name       TEXT NOT NULL,
+        quantity   INTEGER NOT NULL DEFAULT 1,
+        unit_price REAL,
+        price      REAL NOT NULL DEFAULT 0,
+        discount   TEXT,
+        PRIMARY KEY (order_id, line_no)
+    )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_order_items_name ON order_items(name)')
+
+
+def _m004_daily_sales(conn):
+    # Resumen diario de ventas mantenido por triggers (ver sales_rollup.py)
+    sales_rollup.install(conn)
+
+
+def _m005_index_pack(conn):
+    for _, sql in INDEX_PACK:
+        conn.execute(sql)
+
+
+def _m006_order_sequence(conn):
+    # Secuencia diaria de IDs de orden (ver order_ids.py)
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS order_sequence (
+        day  TEXT PRIMARY KEY,
+        last INTEGER NOT NULL
+    )
+    ''')
+
+
+def _m007_order_cents(conn):
+    # Montos en centavos enteros: los reportes suman enteros en vez de REAL.
+    # total/amount_paid siguen existiendo como vista en float.
+    for col in ('total_cents INTEGER', 'amount_paid_cents INTEGER'):
+        try:
+            conn.execute(f'ALTER TABLE orders ADD COLUMN {col}')
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+    conn.execute('''
+        UPDATE orders SET
+            total_cents       = CAST(ROUND(COALESCE(total, 0) * 100) AS INTEGER),
+            amount_paid_cents = CAST(ROUND(COALESCE(amount_paid, 0) * 100) AS INTEGER)
+        WHERE total_cents IS NULL OR amount_paid_cents IS NULL
+    ''')
+    # Escritores que solo llenan los REAL (servicios externos, respaldos
+    # viejos, pruebas) quedan consistentes: los triggers derivan los centavos.
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_orders_cents_insert AFTER INSERT ON orders
+    WHEN NEW.total_cents IS NULL OR NEW.amount_paid_cents IS NULL
+    BEGIN
+        UPDATE orders SET
+            total_cents = COALESCE(NEW.total_cents,
+                                   CAST(ROUND(COALESCE(NEW.total, 0) * 100) AS INTEGER)),
+            amount_paid_cents = COALESCE(NEW.amount_paid_cents,
+                                         CAST(ROUND(COALESCE(NEW.amount_paid, 0) * 100) AS INTEGER))
+        WHERE rowid = NEW.rowid;
+    END
+    ''')
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_orders_cents_update AFTER UPDATE OF total, amount_paid ON orders
+    BEGIN
+        UPDATE orders SET
+            total_cents       = CAST(ROUND(COALESCE(NEW.total, 0) * 100) AS INTEGER),
+            amount_paid_cents = CAST(ROUND(COALESCE(NEW.amount_paid, 0) * 100) AS INTEGER)
+        WHERE rowid = NEW.rowid;
+    END
+    ''')
+
+
+def _m008_carts(conn):
+    # Carritos que cart_store saca de memoria (capacidad o apagado)
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS carts (
+        cart_id TEXT PRIMARY KEY,
+        items TEXT NOT NULL,
+        updated_at REAL NOT NULL
+    )
+    ''')
+
+
+def _m009_idempotency_keys(conn):
+    # Llaves de idempotencia de cobro (ver idempotency.py)
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS idempotency_keys (
+        scope TEXT NOT NULL,
+        key TEXT NOT NULL,
+        order_id TEXT,
+        response TEXT,
+        created_at REAL NOT NULL,
+        expires_at REAL NOT NULL,
+        PRIMARY KEY (scope, key)
+    )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires '
+                 'ON idempotency_keys(expires_at)')
+
+
+def _m010_print_job_leases(conn):
+    # Reparto de la cola entre varios print bridges (ver print_queue.claim_jobs):
+    # quién tiene el job, hasta cuándo y cuántas veces se ha reclamado.
+    for col in ('claimed_by TEXT', 'attempts INTEGER NOT NULL DEFAULT 0', 'lease_until REAL'):
+        try:
+            conn.execute(f'ALTER TABLE print_jobs ADD COLUMN {col}')
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+
+
+def _m011_print_job_station(conn):
+    # Estación de impresión (ver print_queue): mostrador o cocina
+    try:
+        conn.execute("ALTER TABLE print_jobs ADD COLUMN station TEXT NOT NULL DEFAULT 'counter'")
+    except sqlite3.OperationalError:
+        pass  # Column already exists
+
+
+def _m012_daily_sales_cents(conn):
+    # daily_sales suma total_cents en vez del REAL total: triggers nuevos
+    # y la tabla recalculada (ver sales_rollup.reinstall)
+    sales_rollup.reinstall(conn)
+
+
+# Registro ordenado de migraciones. PRAGMA user_version guarda la última
+# aplicada: una BD al día solo hace esa lectura al arrancar. Para cambiar el
+# esquema se AGREGA una migración al final; nunca se edita una ya publicada.
+MIGRATIONS = (
+    Migration(1, 'esquema_base', _m001_esquema_base),
+    Migration(2, 'order_items', _m002_order_items),
+    # Hace commit por bloque para poder reanudarse (ver backfill_order_items)
+    Migration(3, 'order_items_backfill', backfill_order_items, atomic=False),
+    Migration(4, 'daily_sales', _m004_daily_sales),
+    Migration(5, 'indices_consultas_calientes', _m005_index_pack),
+    Migration(6, 'order_sequence', _m006_order_sequence),
+    Migration(7, 'order_cents', _m007_order_cents),
+    Migration(8, 'carts', _m008_carts),
+    Migration(9, 'idempotency_keys', _m009_idempotency_keys),
+    Migration(10, 'print_job_leases', _m010_print_job_leases),
+    Migration(11, 'print_job_station', _m011_print_job_station),
+    Migration(12, 'daily_sales_cents', _m012_daily_sales_cents),
+)
+
+# Reporte de la última corrida de migrate(): [(versión, nombre, ms)]
+last_report = []
+
+
+def schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn, migrations=MIGRATIONS):
+    """Aplica en orden las migraciones pendientes. Cada una corre en su propia
+    transacción junto con el nuevo user_version: si falla, la BD queda en la
+    versión anterior y el siguiente arranque la reintenta."""
+    global last_report
+    if conn.in_transaction:
+        conn.commit()
+    actual = schema_version(conn)
+    reporte = []
+    for m in migrations:
+        if m.version <= actual:
+            continue
+        inicio = time.perf_counter()
+        if m.atomic:
+            conn.execute('BEGIN IMMEDIATE')
+        try:
+            m.apply(conn)
+            conn.execute(f'PRAGMA user_version = {int(m.version)}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        ms = (time.perf_counter() - inicio) * 1000
+        reporte.append((m.version, m.name, round(ms, 1)))
+        print(f'[DB] Migración {m.version} ({m.name}): {ms:.1f} ms')
+    if migrations and actual > migrations[-1].version:
+        print(f'[DB] La BD está en la versión {actual}, más nueva que esta app '
+              f'({migrations[-1].version})')
+    last_report = reporte
+    return reporte
+
+
+def init_db():
+    conn = get_db_connection()
+    # La verificación de integridad ya no bloquea el arranque: la hace
+    # integrity_check.IntegrityChecker en segundo plano.
+    migrate(conn)
     conn.close()
+    catalog.bump()
+    config_store.invalidate()
@@ -147,9 +147,10 @@ document.addEventListener("DOMContentLoaded", function () {
   setupFormValidation();
   setupButtonFeedback();
   setupCashPaymentCalculation();
-  if (!window._cartQuantitySetup) setupCartQuantityControls();
+  setupCartQuantityControls();
   setupFlashAutoDismiss();
   setupFormLoadingState();
+  setupIdempotencyKeys();
   ensureTextSelection();
 
   window.tabletJsLoaded = true;
@@ -183,6 +184,24 @@ function cerrarAlerta(alerta) {
   }, 450);
 }
 
+// ── Llave de idempotencia para cobrar ────────────────────────────────────────
+// Una llave por carga de la página de pago: si el POST a /ticket se reintenta
+// (Wi-Fi caído, doble toque), el servidor repite la respuesta original en vez
+// de cobrar otra vez.
+
+function nuevaLlave() {
+  if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+  return (
+    Date.now().toString(36) + "-" + Math.random().toString(36).slice(2, 12)
+  );
+}
+
+function setupIdempotencyKeys() {
+  document.querySelectorAll("input.idempotency-key").forEach(function (inp) {
+    if (!inp.value) inp.value = nuevaLlave();
+  });
+}
+
 // ── Estado de carga en formularios ───────────────────────────────────────────
 
 function setupFormLoadingState() {
@@ -446,88 +465,240 @@ function calculateChange() {
   if (navigator.vibrate) navigator.vibrate(50);
 }
 
-// ── Controles de cantidad en carrito ─────────────────────────────────────────
+// ── Carrito: API JSON (/api/cart) ────────────────────────────────────────────
+// Cada cambio responde solo las líneas modificadas y el total nuevo; se
+// aplican sobre el DOM sin recargar cart.html. Si la red falla, los
+// formularios HTML (remove_item, apply_coupon, remove_coupon) siguen como
+// respaldo.
 
-function setupCartQuantityControls() {
-  var plusBtns = document.querySelectorAll(".quantity-btn.plus");
-  var minusBtns = document.querySelectorAll(".quantity-btn.minus");
-  if (plusBtns.length === 0 && minusBtns.length === 0) return;
+function cartApi(method, url, body) {
+  var headers = { "Content-Type": "application/json" };
+  var csrf = document.querySelector('meta[name="csrf-token"]');
+  if (csrf) headers["X-CSRFToken"] = csrf.content;
+  return fetch(url, {
+    method: method,
+    headers: headers,
+    body: body ? JSON.stringify(body) : undefined,
+  }).then(function (r) {
+    if (r.status >= 500) throw new Error("HTTP " + r.status);
+    return r.json();
+  });
+}
 
-  plusBtns.forEach(function (btn) {
-    btn.addEventListener("click", function () {
-      var idx = this.getAttribute("data-index");
-      var inp = document.querySelector(
-        '.quantity-input[data-index="' + idx + '"]',
-      );
-      if (!inp) return;
-      var v = parseInt(inp.value);
-      if (isNaN(v)) v = 1;
-      inp.value = v + 1;
-      updateQuantity(idx, inp.value);
+function formatoPrecio(valor) {
+  return "$" + Number(valor).toFixed(2);
+}
+
+function renderPrecioLinea(contenedor, linea) {
+  contenedor.textContent = "";
+  function div(clase, texto) {
+    var el = document.createElement("div");
+    el.className = clase;
+    el.textContent = texto;
+    contenedor.appendChild(el);
+  }
+  if (linea.original_price != null) {
+    div("price-original", formatoPrecio(linea.original_price));
+    div("price-discounted", formatoPrecio(linea.price));
+    if (linea.discount) div("discount-badge", linea.discount);
+  } else {
+    div("price-normal", formatoPrecio(linea.price));
+  }
+}
+
+function renumerarCarrito() {
+  document.querySelectorAll(".cart-item").forEach(function (item, i) {
+    item.setAttribute("data-index", i);
+    item.querySelectorAll("[data-index]").forEach(function (el) {
+      el.setAttribute("data-index", i);
     });
+    var form = item.querySelector('form[action*="remove_item"]');
+    if (form) form.action = form.action.replace(/\/remove_item\/\d+/, "/remove_item/" + i);
   });
+}
 
-  minusBtns.forEach(function (btn) {
-    btn.addEventListener("click", function () {
-      var idx = this.getAttribute("data-index");
-      var inp = document.querySelector(
-        '.quantity-input[data-index="' + idx + '"]',
-      );
-      if (!inp) return;
-      var v = parseInt(inp.value);
-      if (isNaN(v)) v = 1;
-      if (v > 1) {
-        inp.value = v - 1;
-        updateQuantity(idx, inp.value);
-      }
-    });
+function actualizarBarraPromo(aplicado) {
+  var barra = document.getElementById("promo-applied-bar");
+  var boton = document.getElementById("promo-toggle-btn");
+  var detalle = document.getElementById("promo-applied-detail");
+  var seccion = document.getElementById("promo-section-body");
+  if (barra) barra.style.display = aplicado ? "" : "none";
+  if (boton) boton.style.display = aplicado ? "none" : "";
+  if (detalle) detalle.textContent = aplicado || "";
+  if (seccion && aplicado) seccion.style.display = "none";
+}
+
+function aplicarDiffCarrito(data) {
+  if (data.count === 0) {
+    window.location.reload(); // estado vacío lo pinta el servidor
+    return;
+  }
+  if (data.removed != null) {
+    var quitada = document.querySelector(
+      '.cart-item[data-index="' + data.removed + '"]',
+    );
+    if (quitada) quitada.remove();
+    renumerarCarrito();
+  }
+  data.changed.forEach(function (linea) {
+    var item = document.querySelector(
+      '.cart-item[data-index="' + linea.index + '"]',
+    );
+    if (!item) return;
+    if (linea.unit_price != null) item.setAttribute("data-unit-price", linea.unit_price);
+    var precio = item.querySelector(".item-price");
+    if (precio) renderPrecioLinea(precio, linea);
+    var inp = item.querySelector(".quantity-input");
+    if (inp && linea.quantity != null) inp.value = linea.quantity;
+    syncMinus(linea.index);
   });
+  var totalEl = document.querySelector(".total-amount");
+  if (totalEl) totalEl.textContent = formatoPrecio(data.total);
+  actualizarBarraPromo(data.applied_discount);
+}
 
-  document.querySelectorAll(".quantity-input").forEach(function (inp) {
-    inp.addEventListener("change", function () {
-      var idx = this.getAttribute("data-index");
-      var v = parseInt(this.value);
-      if (v < 1 || isNaN(v)) {
-        v = 1;
-        this.value = 1;
-      }
-      updateQuantity(idx, v);
-    });
+function syncMinus(index) {
+  var inp = document.querySelector('.quantity-input[data-index="' + index + '"]');
+  var btn = document.querySelector('.quantity-btn.minus[data-index="' + index + '"]');
+  if (inp && btn) btn.disabled = parseInt(inp.value) <= 1;
+}
+
+function showLoadingIndicator(cartItem) {
+  var itemPrice = cartItem && cartItem.querySelector(".item-price");
+  if (!itemPrice) return;
+  itemPrice.querySelectorAll(".loading-indicator").forEach(function (ind) {
+    ind.remove();
   });
+  var indicator = document.createElement("div");
+  indicator.className = "loading-indicator";
+  indicator.textContent = "Actualizando...";
+  itemPrice.appendChild(indicator);
+}
 
-  document.querySelectorAll(".item-action.delete").forEach(function (btn) {
-    btn.addEventListener("click", function (e) {
-      if (!confirm("¿Seguro que quieres eliminar este artículo?")) {
-        e.preventDefault();
-      }
-    });
+function quitarIndicadores() {
+  document.querySelectorAll(".loading-indicator").forEach(function (el) {
+    el.remove();
+  });
+}
+
+function setupCartQuantityControls() {
+  var items = document.querySelector(".cart-items");
+  if (!items) return;
+
+  // Delegación: los índices cambian al borrar líneas
+  items.addEventListener("click", function (e) {
+    var btn = e.target.closest(".quantity-btn");
+    if (!btn) return;
+    var idx = btn.getAttribute("data-index");
+    var inp = document.querySelector('.quantity-input[data-index="' + idx + '"]');
+    if (!inp) return;
+    var v = parseInt(inp.value);
+    if (isNaN(v)) v = 1;
+    if (btn.classList.contains("plus")) {
+      v += 1;
+    } else if (v > 1) {
+      v -= 1;
+    } else {
+      return;
+    }
+    inp.value = v;
+    syncMinus(idx);
+    showLoadingIndicator(btn.closest(".cart-item"));
+    updateQuantity(idx, v);
+  });
+
+  items.addEventListener("input", function (e) {
+    var inp = e.target;
+    if (!inp.classList.contains("quantity-input")) return;
+    inp.value = inp.value.replace(/[^0-9]/g, "");
+    if (inp.value === "" || parseInt(inp.value) < 1) inp.value = 1;
+    syncMinus(inp.getAttribute("data-index"));
+  });
+
+  items.addEventListener("change", function (e) {
+    var inp = e.target;
+    if (!inp.classList.contains("quantity-input")) return;
+    var v = parseInt(inp.value);
+    if (v < 1 || isNaN(v)) {
+      v = 1;
+      inp.value = 1;
+    }
+    syncMinus(inp.getAttribute("data-index"));
+    showLoadingIndicator(inp.closest(".cart-item"));
+    updateQuantity(inp.getAttribute("data-index"), v);
+  });
+
+  document.querySelectorAll(".quantity-input").forEach(function (inp) {
+    syncMinus(inp.getAttribute("data-index"));
   });
 }
 
 function updateQuantity(index, quantity) {
-  var csrf = document.querySelector('meta[name="csrf-token"]');
-  fetch("/update_quantity/" + index + "/" + quantity, {
-    method: "POST",
-    headers: csrf ? { "X-CSRFToken": csrf.content } : {},
-  })
-    .then(function (r) {
-      if (!r.ok) throw new Error("HTTP " + r.status);
-      return r.json();
-    })
+  cartApi("PATCH", "/api/cart/items/" + index, { quantity: quantity })
     .then(function (data) {
-      if (data.success) {
-        window.location.reload();
-      } else {
+      quitarIndicadores();
+      if (!data.success) {
+        mostrarToast(data.error || "No se pudo actualizar la cantidad.", "error");
+        return;
+      }
+      aplicarDiffCarrito(data);
+      if (data.promo_cleared) {
         mostrarToast(
-          data.error || "No se pudo actualizar la cantidad.",
+          "Promoción removida. Reaplícala si sigue siendo válida.",
           "error",
         );
       }
     })
     .catch(function () {
+      quitarIndicadores();
       mostrarToast(
         "No se pudo actualizar la cantidad. Intenta de nuevo.",
         "error",
       );
     });
 }
+
+function eliminarLineaCarrito(form) {
+  var item = form.closest(".cart-item");
+  var idx = item ? item.getAttribute("data-index") : null;
+  if (idx == null) return form.submit();
+  cartApi("DELETE", "/api/cart/items/" + idx)
+    .then(function (data) {
+      if (!data.success) {
+        mostrarToast(data.error || "No se pudo eliminar el producto.", "error");
+        return;
+      }
+      aplicarDiffCarrito(data);
+      mostrarToast("Producto eliminado de la orden", "success");
+    })
+    .catch(function () {
+      form.submit();
+    });
+}
+
+function aplicarCuponCarrito(codigo, form) {
+  return cartApi("POST", "/api/cart/coupon", { coupon_code: codigo })
+    .then(function (data) {
+      if (!data.success) {
+        mostrarToast(data.error, "error");
+        return data;
+      }
+      aplicarDiffCarrito(data);
+      mostrarToast(data.message, "success");
+      return data;
+    })
+    .catch(function () {
+      if (form) form.submit();
+    });
+}
+
+function quitarCuponCarrito(form) {
+  cartApi("DELETE", "/api/cart/coupon")
+    .then(function (data) {
+      aplicarDiffCarrito(data);
+      mostrarToast("Promoción eliminada de la orden", "success");
+    })
+    .catch(function () {
+      form.submit();
+    });
+}
@@ -9,11 +9,13 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 
 @pytest.fixture
-def app_module(monkeypatch):
+def app_module(monkeypatch, tmp_path):
     db_fd, db_path = tempfile.mkstemp(suffix=".db")
     os.close(db_fd)
     monkeypatch.setenv("RESTAURANT_DB_PATH", db_path)
+    monkeypatch.setenv("RESTAURANT_RECEIPTS_DIR", str(tmp_path / "receipts"))
     monkeypatch.setenv("SECRET_KEY", "test-secret-key-not-for-prod")
+    monkeypatch.setenv("RESTAURANT_ACTIVITY_LOG_SYNC", "1")
 
     import app as _app_module
     importlib.reload(_app_module)
@@ -24,6 +26,7 @@ def app_module(monkeypatch):
     try:
         yield _app_module
     finally:
+        _app_module.close_pools()
         os.remove(db_path)
 
 
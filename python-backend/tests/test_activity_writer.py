@@ -0,0 +1,116 @@
+"""Bitácora con escritura diferida: lotes, contrapresión y vaciado al apagar."""
+import os
+import sqlite3
+import time
+
+import activity_writer
+
+
+def _rows(action):
+    c = sqlite3.connect(os.environ['RESTAURANT_DB_PATH'])
+    try:
+        return c.execute('SELECT COUNT(*) FROM activity_log WHERE action = ?', (action,)).fetchone()[0]
+    finally:
+        c.close()
+
+
+def _row(action):
+    return (action, 'desc', 'sistema', '2026-01-01 00:00:00')
+
+
+def test_batch_is_written_in_one_flush(app_module):
+    w = activity_writer.ActivityLogWriter(batch_size=100, flush_interval=60)
+    db_path = os.environ['RESTAURANT_DB_PATH']
+    for _ in range(5):
+        assert w.enqueue(db_path, _row('lote'))
+    assert w.flush() == 5
+    assert _rows('lote') == 5
+    stats = w.stats()
+    assert stats['written'] == 5 and stats['batches'] == 1 and stats['pending'] == 0
+    w.stop()
+
+
+def test_background_thread_flushes_after_interval(app_module):
+    w = activity_writer.ActivityLogWriter(batch_size=100, flush_interval=0.01)
+    w.enqueue(os.environ['RESTAURANT_DB_PATH'], _row('fondo'))
+    deadline = time.monotonic() + 2
+    while _rows('fondo') == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert _rows('fondo') == 1
+    w.stop()
+
+
+def test_full_queue_drops_and_counts(app_module):
+    w = activity_writer.ActivityLogWriter(max_queue=2, batch_size=100, flush_interval=60)
+    db_path = os.environ['RESTAURANT_DB_PATH']
+    assert w.enqueue(db_path, _row('lleno'))
+    assert w.enqueue(db_path, _row('lleno'))
+    assert not w.enqueue(db_path, _row('lleno'))
+    assert w.stats()['dropped'] == 1
+    w.stop()
+    assert _rows('lleno') == 2
+
+
+def test_stop_flushes_pending_rows(app_module):
+    w = activity_writer.ActivityLogWriter(batch_size=100, flush_interval=60)
+    w.enqueue(os.environ['RESTAURANT_DB_PATH'], _row('apagado'))
+    w.stop()
+    assert _rows('apagado') == 1
+
+
+def test_ticket_enqueues_audit_row_in_async_mode(admin_client, monkeypatch):
+    monkeypatch.delenv('RESTAURANT_ACTIVITY_LOG_SYNC')
+    with admin_client.session_transaction() as sess:
+        sess['cart'] = [{'type': 'Bebida', 'name': 'Agua', 'beverage_type': 'Agua',
+                         'price': 10.0, 'unit_price': 10.0, 'quantity': 1}]
+    resp = admin_client.post('/ticket', data={'payment_method': 'card'})
+    assert resp.status_code == 200
+    activity_writer.writer.flush()
+    assert _rows('orden_completada') == 1
+
+
+def test_sync_write_returns_its_connection_to_the_pool(app_module, monkeypatch):
+    # Fuera de un request (hilos de fondo, scripts): nada de conexiones sueltas
+    from db import get_pool
+    db_path = os.environ['RESTAURANT_DB_PATH']
+    monkeypatch.setattr(activity_writer, 'get_db_connection', None, raising=False)
+    for _ in range(5):
+        assert activity_writer.write(db_path, _row('sync'))
+    assert _rows('sync') == 5
+    assert get_pool(db_path).stats()['in_use'] == 0
+
+
+def _start_server(tmp_path):
+    import subprocess
+    import sys
+    env = dict(os.environ, RESTAURANT_DB_PATH=str(tmp_path / 'srv.db'), PORT='0',
+               SECRET_KEY='test-secret-key-not-for-prod', RESTAURANT_STOP_ON_STDIN_EOF='1',
+               RESTAURANT_RECEIPTS_DIR=str(tmp_path / 'receipts'))
+    env.pop('RESTAURANT_ACTIVITY_LOG_SYNC', None)
+    proc = subprocess.Popen([sys.executable, '-u', 'app.py'], env=env,
+                            cwd=os.path.dirname(activity_writer.__file__),
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT, text=True)
+    for line in proc.stdout:
+        if 'Running on' in line:
+            return proc
+    raise AssertionError(f'el servidor no arrancó (código {proc.wait()})')
+
+
+def test_server_shuts_down_cleanly_when_stdin_closes(tmp_path):
+    # Electron cierra stdin al salir (en Windows no hay SIGTERM)
+    proc = _start_server(tmp_path)
+    proc.stdin.close()
+    salida = proc.stdout.read()
+    assert proc.wait(timeout=15) == 0
+    assert '[App] Apagando' in salida
+
+
+def test_server_shuts_down_cleanly_on_sigterm(tmp_path):
+    import signal
+    proc = _start_server(tmp_path)
+    proc.send_signal(signal.SIGTERM)
+    salida = proc.stdout.read()
+    assert proc.wait(timeout=15) == 0
+    assert '[App] Apagando' in salida
+    proc.stdin.close()
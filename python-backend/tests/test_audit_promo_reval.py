@@ -4,6 +4,8 @@ Cubre los bugs 1 (promo no revalidada tras remove/update/qty) y 2 (cupón de
 monto fijo aplicado por-línea en vez de por-orden)."""
 import pytest
 
+import cart_store
+
 
 def _item(item_type, price, quantity=1, name=None):
     return {
@@ -22,7 +24,7 @@ def _set_cart(client, items):
 
 def _cart(client):
     with client.session_transaction() as sess:
-        return sess.get('cart', [])
+        return cart_store.for_session(sess)
 
 
 def _coupon_code(client):
@@ -0,0 +1,187 @@
+"""Carrito del lado del servidor: la cookie solo lleva cart_id."""
+import os
+import threading
+import time
+
+import cart_store
+from cart_store import CartStore
+
+LINE = {'type': 'Bebida', 'name': 'Agua', 'beverage_type': 'Agua',
+        'price': 10.0, 'unit_price': 10.0, 'quantity': 1}
+
+
+def _db_path():
+    return os.environ['RESTAURANT_DB_PATH']
+
+
+def test_session_cookie_holds_only_cart_id(admin_client):
+    with admin_client.session_transaction() as sess:
+        sess['cart'] = [dict(LINE) for _ in range(20)]
+    admin_client.get('/cart')
+    with admin_client.session_transaction() as sess:
+        assert 'cart' not in sess
+        assert sess['cart_id']
+        assert len(cart_store.for_session(sess)) == 20
+
+
+def test_customize_appends_to_store(admin_client):
+    admin_client.post('/customize/beverages', data={'beverage_type': 'Agua'})
+    admin_client.post('/customize/beverages', data={'beverage_type': 'Agua'})
+    with admin_client.session_transaction() as sess:
+        assert len(cart_store.for_session(sess)) == 2
+
+
+def test_ticket_discards_cart(admin_client):
+    with admin_client.session_transaction() as sess:
+        sess['cart'] = [dict(LINE)]
+    resp = admin_client.post('/ticket', data={'payment_method': 'card'})
+    assert resp.status_code == 200
+    with admin_client.session_transaction() as sess:
+        assert 'cart_id' not in sess
+        assert cart_store.for_session(sess) == []
+
+
+def test_concurrent_edits_are_not_lost(app_module):
+    store = CartStore()
+
+    def agregar():
+        for _ in range(50):
+            with store.edit(_db_path(), 'c1') as items:
+                items.append(dict(LINE))
+
+    hilos = [threading.Thread(target=agregar) for _ in range(4)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    assert len(store.load(_db_path(), 'c1')) == 200
+
+
+def test_failed_edit_is_not_saved(app_module):
+    store = CartStore()
+    store.save(_db_path(), 'c1', [dict(LINE)])
+    try:
+        with store.edit(_db_path(), 'c1') as items:
+            items.clear()
+            raise ValueError('boom')
+    except ValueError:
+        pass
+    assert len(store.load(_db_path(), 'c1')) == 1
+
+
+def test_spill_to_sqlite_and_back(app_module):
+    store = CartStore(max_memory=2)
+    for i in range(4):
+        store.save(_db_path(), f'c{i}', [dict(LINE, quantity=i + 1)])
+        store.flush()               # solo sale de memoria lo ya escrito
+    assert store.stats()['in_memory'] == 2
+    assert store.stats()['spilled'] == 2
+    # El más viejo regresa desde SQLite intacto
+    assert store.load(_db_path(), 'c0')[0]['quantity'] == 1
+    assert store.stats()['loads_from_disk'] == 1
+
+
+def test_flush_persists_carts_for_next_process(app_module):
+    store = CartStore()
+    store.save(_db_path(), 'c1', [dict(LINE)])
+    store.flush()
+    assert CartStore().load(_db_path(), 'c1') == [LINE]
+
+
+def test_expired_carts_are_evicted(app_module):
+    store = CartStore(ttl=60, sweep_interval=0)
+    store.save(_db_path(), 'viejo', [dict(LINE)])
+    store._carts[(_db_path(), 'viejo')].touched = time.time() - 120
+    store.save(_db_path(), 'nuevo', [dict(LINE)])
+    assert store.stats()['evicted'] == 1
+    assert store.load(_db_path(), 'viejo') == []
+
+
+def test_db_stats_reports_cart_metrics(admin_client):
+    data = admin_client.get('/admin/api/db-stats').get_json()
+    assert {'in_memory', 'max_bytes', 'spilled'} <= set(data['carts'])
+
+
+def test_sale_takes_the_writer_once(admin_client, monkeypatch):
+    import write_coordinator
+    monkeypatch.setattr(cart_store.store, 'write_delay', 30)
+    admin_client.post('/customize/beverages', data={'beverage_type': 'Agua'})
+    antes = write_coordinator.stats()['transactions']
+    assert admin_client.post('/ticket', data={'payment_method': 'card'}).status_code == 200
+    assert write_coordinator.stats()['transactions'] == antes + 1
+    # El primer producto de la siguiente orden no escribe dentro del request:
+    # queda pendiente para el hilo de fondo
+    admin_client.post('/customize/beverages', data={'beverage_type': 'Agua'})
+    assert write_coordinator.stats()['transactions'] == antes + 1
+    assert cart_store.store.stats()['pending'] >= 1
+
+
+def test_concurrent_loads_of_spilled_cart_keep_lines(app_module, monkeypatch):
+    store = CartStore()
+    store._spill(_db_path(), [('c1', [dict(LINE)], time.time())])
+    original = store._unspill
+
+    def lento(db_path, cart_id):
+        time.sleep(0.1)
+        return original(db_path, cart_id)
+
+    monkeypatch.setattr(store, '_unspill', lento)
+    resultados = []
+    hilos = [threading.Thread(target=lambda: resultados.append(store.load(_db_path(), 'c1')))
+             for _ in range(2)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    assert resultados == [[LINE], [LINE]]
+    assert store.stats()['loads_from_disk'] == 1
+
+
+def test_carts_survive_without_flush(app_module):
+    # El proceso muere sin apagado ordenado (SIGKILL): el hilo ya escribió
+    store = CartStore(write_delay=0.05)
+    store.save(_db_path(), 'c1', [dict(LINE)])
+    with store.edit(_db_path(), 'c1') as items:
+        items.append(dict(LINE, quantity=2))
+    limite = time.monotonic() + 3
+    while store.stats()['pending'] and time.monotonic() < limite:
+        time.sleep(0.02)
+    assert CartStore().load(_db_path(), 'c1') == [LINE, dict(LINE, quantity=2)]
+
+
+def test_edit_waits_out_eviction_of_its_entry(app_module):
+    # La entrada se expulsa entre _entry() y tomar su lock: la edición no se
+    # pierde en la entrada huérfana
+    store = CartStore(write_delay=0.05)
+    store.save(_db_path(), 'c1', [dict(LINE)])
+    store.flush()
+    original = store._entry
+    expulsada = []
+
+    def entry_y_expulsar(db_path, cart_id):
+        entry = original(db_path, cart_id)
+        if not expulsada:
+            with store._lock:
+                expulsada.append(store._evict((db_path, cart_id), entry))
+        return entry
+
+    store._entry = entry_y_expulsar
+    with store.edit(_db_path(), 'c1') as items:
+        items.append(dict(LINE, quantity=2))
+    store._entry = original
+    assert expulsada == [True]
+    assert len(store.load(_db_path(), 'c1')) == 2
+    store.flush()
+    assert len(CartStore().load(_db_path(), 'c1')) == 2
+
+
+def test_eviction_skips_carts_in_use(app_module):
+    store = CartStore(max_memory=1, sweep_interval=0, ttl=60)
+    store.save(_db_path(), 'c1', [dict(LINE)])
+    store.flush()
+    store._carts[(_db_path(), 'c1')].touched = time.time() - 120
+    with store.edit(_db_path(), 'c1') as items:
+        store.save(_db_path(), 'c2', [dict(LINE)])     # barre TTL y capacidad
+        items.append(dict(LINE, quantity=2))
+    assert len(store.load(_db_path(), 'c1')) == 2
+    assert store.stats()['evicted'] == 0
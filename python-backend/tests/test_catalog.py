@@ -0,0 +1,50 @@
+"""Catálogo del menú en memoria con versión: lecturas sin SQL e invalidación."""
+import catalog
+import db
+
+
+def test_snapshot_is_reused_until_bumped(app_module):
+    with app_module.app.test_request_context():
+        first = catalog.get()
+        assert catalog.get() is first
+        catalog.bump()
+        second = catalog.get()
+        assert second is not first
+        assert second.version == catalog.version()
+
+
+def test_price_lookups_do_not_query_sqlite(app_module):
+    with app_module.app.test_request_context():
+        catalog.get()
+        statements = []
+        db.get_db_connection().set_trace_callback(statements.append)
+        assert db.get_item_price('Sushi', 'Seco') == 110.0
+        assert db.get_item_price('Ostión') == 10.0
+        assert db.get_sushi_prep_prices()['Sushi Flamin'] == 125
+        assert [o['name'] for o in db.get_menu_options('sushi_sauce')][0] == 'Tradicional'
+        db.get_db_connection().set_trace_callback(None)
+        assert statements == []
+
+
+def test_admin_price_update_bumps_version(admin_client, app_module):
+    with app_module.app.test_request_context():
+        before = catalog.version()
+    admin_client.post('/admin/prices/update', data={'Boneless': '150'})
+    assert catalog.version() > before
+    with app_module.app.test_request_context():
+        assert db.get_item_price('Boneless') == 150.0
+
+
+def test_menu_option_toggle_refreshes_options(admin_client, app_module):
+    with app_module.app.test_request_context():
+        option = db.get_menu_options('beverage')[0]
+    admin_client.post(f"/admin/menu-options/toggle/{option['id']}")
+    with app_module.app.test_request_context():
+        names = [o['name'] for o in db.get_menu_options('beverage')]
+    assert option['name'] not in names
+
+
+def test_returned_options_are_copies(app_module):
+    with app_module.app.test_request_context():
+        db.get_menu_options('beverage')[0]['name'] = 'Mutado'
+        assert db.get_menu_options('beverage')[0]['name'] != 'Mutado'
@@ -0,0 +1,98 @@
+"""Checkpoints del WAL en momentos tranquilos, fuera del camino de /ticket."""
+import os
+import time
+
+import checkpoint_manager
+import db
+from checkpoint_manager import CheckpointManager
+
+
+def _db_path():
+    return os.environ['RESTAURANT_DB_PATH']
+
+
+def _grow_wal(rows=200):
+    pool = db.get_pool(_db_path())
+    conn = pool.acquire()
+    try:
+        for i in range(rows):
+            conn.execute("INSERT OR REPLACE INTO config (key, value) VALUES (?, ?)",
+                         (f'wal_{i}', 'x' * 2000))
+        conn.commit()
+    finally:
+        pool.release(conn)
+
+
+def test_pool_raises_autocheckpoint_threshold(app_module):
+    pool = db.get_pool(_db_path())
+    conn = pool.acquire()
+    try:
+        assert conn.execute('PRAGMA wal_autocheckpoint').fetchone()[0] == 10000
+    finally:
+        pool.release(conn)
+
+
+def test_passive_checkpoint_when_idle(app_module):
+    _grow_wal()
+    manager = CheckpointManager(_db_path(), min_wal_bytes=1, closed_idle=3600)
+    manager._seen = (checkpoint_manager._requests, time.monotonic() - 60)
+    result = manager.tick()
+    assert result['mode'] == 'PASSIVE'
+    assert result['checkpointed_pages'] == result['log_pages'] > 0
+    stats = manager.stats()
+    assert stats['passive'] == 1
+    assert stats['duration']['count'] == 1
+    assert stats['last']['ms'] >= 0
+
+
+def test_skips_while_requests_are_flowing(app_module):
+    _grow_wal()
+    manager = CheckpointManager(_db_path(), min_wal_bytes=1, closed_idle=3600)
+    for _ in range(50):
+        checkpoint_manager.note_request()
+    assert manager.tick() is None
+    assert manager.stats()['skipped_busy'] == 1
+
+
+def test_large_wal_is_checkpointed_even_when_busy(app_module):
+    _grow_wal()
+    manager = CheckpointManager(_db_path(), min_wal_bytes=1, force_wal_bytes=1,
+                                closed_idle=3600)
+    for _ in range(50):
+        checkpoint_manager.note_request()
+    assert manager.tick()['mode'] == 'PASSIVE'
+    assert manager.stats()['forced'] == 1
+
+
+def test_truncate_after_closing_once(app_module):
+    _grow_wal()
+    assert checkpoint_manager.wal_bytes(_db_path()) > 0
+    manager = CheckpointManager(_db_path(), closed_idle=0)
+    assert manager.tick()['mode'] == 'TRUNCATE'
+    assert checkpoint_manager.wal_bytes(_db_path()) == 0
+    assert manager.tick() is None  # mismo periodo sin requests: no repite
+
+
+def test_stop_truncates_wal(app_module):
+    _grow_wal()
+    manager = CheckpointManager(_db_path(), interval=0.01)
+    manager.start()
+    manager.stop()
+    assert checkpoint_manager.wal_bytes(_db_path()) == 0
+    assert manager.stats()['truncate'] == 1
+
+
+def test_db_stats_and_dashboard_show_wal(admin_client):
+    data = admin_client.get('/admin/api/db-stats').get_json()
+    assert 'wal_bytes' in data['checkpoints']
+    assert 'WAL:' in admin_client.get('/admin').get_data(as_text=True)
+
+
+def test_bridge_polling_is_not_activity(admin_client):
+    antes = checkpoint_manager._requests
+    admin_client.get('/api/print_queue')
+    admin_client.post('/api/print_queue/claim', json={'bridge': 'b'})
+    admin_client.get('/api/config')
+    assert checkpoint_manager._requests == antes
+    admin_client.get('/cart')
+    assert checkpoint_manager._requests == antes + 1
@@ -0,0 +1,71 @@
+"""Tabla config en memoria: lecturas sin SQL, parseo único e invalidación."""
+import config_store
+import db
+
+
+def _write(app_module, key, value):
+    conn = app_module.get_db_connection()
+    conn.execute('INSERT OR REPLACE INTO config (key, value) VALUES (?, ?)', (key, value))
+    conn.commit()
+    conn.close()
+
+
+def test_values_are_parsed_once_and_served_from_memory(app_module):
+    with app_module.app.test_request_context():
+        assert config_store.usd_rate() == 18.0
+        statements = []
+        db.get_db_connection().set_trace_callback(statements.append)
+        assert config_store.usd_rate() == 18.0
+        assert config_store.printer_name() == 'Printer_POS_80'
+        assert db.get_config('usd_rate') == '18.00'
+        db.get_db_connection().set_trace_callback(None)
+        assert statements == []
+
+
+def test_invalid_rate_falls_back_to_default(app_module):
+    _write(app_module, 'usd_rate', 'abc')
+    config_store.invalidate()
+    with app_module.app.test_request_context():
+        assert config_store.usd_rate() == config_store.DEFAULT_USD_RATE
+
+
+def test_admin_update_invalidates_snapshot(admin_client, app_module):
+    with app_module.app.test_request_context():
+        assert config_store.usd_rate() == 18.0
+    admin_client.post('/admin/config/update', data={'usd_rate': '19.5'})
+    with app_module.app.test_request_context():
+        assert config_store.usd_rate() == 19.5
+
+
+def test_printer_api_invalidates_and_config_api_reflects_it(client, app_module):
+    assert client.get('/api/config').get_json()['printer_name'] == 'Printer_POS_80'
+    resp = client.post('/api/config/printer', json={'printer_name': 'EPSON_TM'})
+    assert resp.status_code == 200
+    assert client.get('/api/config').get_json()['printer_name'] == 'EPSON_TM'
+
+
+def test_durability_profile_update_applies_and_measures_commits(admin_client, app_module):
+    import write_coordinator
+    try:
+        admin_client.post('/admin/config/update', data={'durability_profile': 'rush'})
+        assert db.durability_profile() == 'rush'
+        admin_client.post('/api/orders/express', json={
+            'items': [{'kind': 'beverages', 'options': {'beverage_type': 'Agua'}}],
+            'payment': {'payment_method': 'card'}})
+        writes = admin_client.get('/admin/api/db-stats').get_json()['writes']
+        assert writes['durability_profile'] == 'rush'
+        assert writes['commit_ms']['rush']['count'] >= 1
+
+        admin_client.post('/admin/config/update', data={'durability_profile': 'yolo'})
+        with app_module.app.test_request_context():
+            assert config_store.durability_profile() == 'rush'
+            assert write_coordinator.stats()['durability_profile'] == 'rush'
+    finally:
+        db.set_durability_profile(db.DEFAULT_DURABILITY)
+
+
+def test_unknown_durability_profile_falls_back_to_default(app_module):
+    _write(app_module, 'durability_profile', 'turbo')
+    config_store.invalidate()
+    with app_module.app.test_request_context():
+        assert config_store.durability_profile() == db.DEFAULT_DURABILITY
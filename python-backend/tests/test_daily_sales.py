@@ -0,0 +1,110 @@
+"""daily_sales: resumen diario mantenido por triggers en ticket, anulación y
+borrado; rebuild() repara desfases."""
+import os
+import sqlite3
+from datetime import datetime
+
+import sales_rollup
+
+
+def _db():
+    conn = sqlite3.connect(os.environ['RESTAURANT_DB_PATH'])
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _insert(conn, oid, total, method='cash', date='2026-03-10 13:00:00', status='completed'):
+    conn.execute(
+        "INSERT INTO orders (id, items, total, payment_method, date, status) "
+        "VALUES (?, '[]', ?, ?, ?, ?)", (oid, total, method, date, status))
+    conn.commit()
+
+
+def _rows(conn):
+    return [tuple(r) for r in conn.execute(
+        'SELECT day, payment_method, orders, revenue_cents, voided '
+        'FROM daily_sales ORDER BY day, payment_method')]
+
+
+def test_insert_void_delete_keep_rollup_in_sync(app_module):
+    conn = _db()
+    _insert(conn, 'a', 100.10)
+    _insert(conn, 'b', 50.25, method='card')
+    _insert(conn, 'c', 20.0, date='2026-03-11 09:00:00')
+    assert _rows(conn) == [('2026-03-10', 'card', 1, 5025, 0),
+                           ('2026-03-10', 'cash', 1, 10010, 0),
+                           ('2026-03-11', 'cash', 1, 2000, 0)]
+
+    conn.execute("UPDATE orders SET status = 'voided' WHERE id = 'a'")
+    conn.execute("DELETE FROM orders WHERE id = 'c'")
+    conn.commit()
+    assert _rows(conn) == [('2026-03-10', 'card', 1, 5025, 0),
+                           ('2026-03-10', 'cash', 0, 0, 1),
+                           ('2026-03-11', 'cash', 0, 0, 0)]
+    assert sales_rollup.summary(conn, '2026-03-10', '2026-03-10') == (1, 50.25, 1)
+    assert sales_rollup.by_payment(conn, '2026-03-10') == [('card', 1, 50.25)]
+    conn.close()
+
+
+def test_rebuild_repairs_drift(app_module):
+    conn = _db()
+    _insert(conn, 'a', 10.0)
+    _insert(conn, 'b', 5.5, status='voided')
+    esperado = _rows(conn)
+    conn.execute('UPDATE daily_sales SET orders = 99, revenue_cents = 1')
+    conn.commit()
+    sales_rollup.rebuild(conn)
+    conn.commit()
+    assert _rows(conn) == esperado
+    conn.close()
+
+
+def test_void_route_updates_report_totals(admin_client):
+    conn = _db()
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    _insert(conn, 'hoy1', 80.0, date=now)
+    _insert(conn, 'hoy2', 20.0, date=now)
+    conn.close()
+    admin_client.post('/admin/void_order/hoy2')
+    resp = admin_client.get('/admin/api/dashboard-summary')
+    assert resp.get_json() == {'today_total': 80.0, 'today_orders': 1}
+
+
+def test_recalcular_route(admin_client):
+    conn = _db()
+    _insert(conn, 'a', 10.0)
+    conn.execute('DELETE FROM daily_sales')
+    conn.commit()
+    resp = admin_client.post('/admin/respaldo/recalcular-ventas')
+    assert resp.status_code == 302
+    assert _rows(conn) == [('2026-03-10', 'cash', 1, 1000, 0)]
+    conn.close()
+
+
+def test_rollup_sums_total_cents(app_module):
+    # total_cents manda sobre el REAL; un cambio solo de total pasa por
+    # trg_orders_cents_update y el resumen lo sigue
+    conn = _db()
+    conn.execute("INSERT INTO orders (id, items, total, total_cents, payment_method, date, status) "
+                 "VALUES ('a', '[]', 0.3, 31, 'cash', '2026-03-10 13:00:00', 'completed')")
+    conn.commit()
+    assert _rows(conn) == [('2026-03-10', 'cash', 1, 31, 0)]
+    conn.execute("UPDATE orders SET total = 12.5 WHERE id = 'a'")
+    conn.commit()
+    assert _rows(conn) == [('2026-03-10', 'cash', 1, 1250, 0)]
+    sales_rollup.rebuild(conn)
+    assert _rows(conn) == [('2026-03-10', 'cash', 1, 1250, 0)]
+    conn.close()
+
+
+def test_reinstall_replaces_old_triggers(app_module):
+    conn = _db()
+    conn.execute('DROP TRIGGER trg_daily_sales_insert')
+    conn.execute('''CREATE TRIGGER trg_daily_sales_insert AFTER INSERT ON orders
+                    BEGIN SELECT 1; END''')
+    _insert(conn, 'a', 10.0)
+    assert sales_rollup.summary(conn, '2026-03-10') == (0, 0, 0)
+    sales_rollup.reinstall(conn)
+    _insert(conn, 'b', 5.0)
+    assert _rows(conn) == [('2026-03-10', 'cash', 2, 1500, 0)]
+    conn.close()
@@ -0,0 +1,128 @@
+"""Pool de conexiones SQLite detrás de db.get_db_connection."""
+import os
+import sqlite3
+
+import db
+
+
+# ---------------------------------------------------------------------------
+# Reutilización entre requests
+# ---------------------------------------------------------------------------
+
+def test_connection_is_reused_across_requests(admin_client):
+    admin_client.get('/admin')
+    before = db.pool_stats()
+    admin_client.get('/admin')
+    admin_client.get('/admin')
+    after = db.pool_stats()
+    assert after['hits'] >= before['hits'] + 2
+    assert after['opened'] == before['opened']
+    assert after['in_use'] == 0
+
+
+def test_pragmas_applied_once_per_connection(app_module):
+    pool = db.ConnectionPool(os.environ['RESTAURANT_DB_PATH'], size=1)
+    conn = pool.acquire()
+    try:
+        assert conn.execute('PRAGMA busy_timeout').fetchone()[0] == 5000
+        assert conn.execute('PRAGMA foreign_keys').fetchone()[0] == 1
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert isinstance(conn.execute('SELECT 1 AS x').fetchone(), sqlite3.Row)
+    finally:
+        pool.release(conn)
+        pool.close()
+
+
+def test_durability_profile_applied_on_next_acquire(app_module):
+    pool = db.ConnectionPool(os.environ['RESTAURANT_DB_PATH'], size=1, durability=True)
+    try:
+        conn = pool.acquire()
+        assert conn.execute('PRAGMA synchronous').fetchone()[0] == 2  # FULL
+        pool.release(conn)
+        db.set_durability_profile('balanced')
+        conn = pool.acquire()
+        assert conn.execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+        pool.release(conn)
+    finally:
+        db.set_durability_profile(db.DEFAULT_DURABILITY)
+        pool.close()
+
+
+def test_uncommitted_write_is_rolled_back_on_release(app_module):
+    pool = db.ConnectionPool(os.environ['RESTAURANT_DB_PATH'], size=1)
+    conn = pool.acquire()
+    conn.execute("INSERT INTO config (key, value) VALUES ('pool_test', 'x')")
+    pool.release(conn)
+    conn = pool.acquire()
+    try:
+        row = conn.execute("SELECT 1 FROM config WHERE key = 'pool_test'").fetchone()
+        assert row is None
+    finally:
+        pool.release(conn)
+        pool.close()
+
+
+# ---------------------------------------------------------------------------
+# Agotamiento: espera y conexión extra
+# ---------------------------------------------------------------------------
+
+def test_exhausted_pool_waits_then_opens_overflow(app_module):
+    pool = db.ConnectionPool(os.environ['RESTAURANT_DB_PATH'], size=1, timeout=0.05)
+    first = pool.acquire()
+    extra = pool.acquire()
+    stats = pool.stats()
+    assert stats['waits'] == 1
+    assert stats['overflow'] == 1
+    assert stats['open'] == 1
+    pool.release(extra)
+    pool.release(first)
+    stats = pool.stats()
+    assert stats['idle'] == 1 and stats['in_use'] == 0
+    pool.close()
+
+
+def test_db_stats_endpoint(admin_client):
+    resp = admin_client.get('/admin/api/db-stats')
+    assert resp.status_code == 200
+    pool = resp.get_json()['pool']
+    assert {'hits', 'waits', 'open', 'size'} <= set(pool)
+
+
+# ---------------------------------------------------------------------------
+# Carril de solo lectura para reportes
+# ---------------------------------------------------------------------------
+
+def test_report_connection_is_query_only(app_module):
+    with app_module.app.test_request_context():
+        conn = db.get_report_connection()
+        assert conn.execute('PRAGMA query_only').fetchone()[0] == 1
+        assert conn.in_transaction  # un solo snapshot de lectura por reporte
+        try:
+            conn.execute("INSERT INTO config (key, value) VALUES ('x', 'y')")
+            assert False, 'la conexión de reportes no debe escribir'
+        except sqlite3.OperationalError:
+            pass
+        assert db.get_report_connection() is conn
+
+
+def test_report_lane_used_by_reports_and_released(admin_client):
+    before = db.report_pool_stats()
+    assert admin_client.get('/admin/reports?period=alltime').status_code == 200
+    assert admin_client.get('/admin/orders?period=alltime').status_code == 200
+    after = db.report_pool_stats()
+    assert after['hits'] + after['opened'] >= before['hits'] + before['opened'] + 2
+    assert after['in_use'] == 0
+
+
+def test_reader_snapshot_does_not_block_checkout_write(admin_client, app_module):
+    with app_module.app.test_request_context():
+        reader = db.get_report_connection()
+        reader.execute('SELECT COUNT(*) FROM orders').fetchone()
+        writer = sqlite3.connect(os.environ['RESTAURANT_DB_PATH'], timeout=0.1)
+        writer.execute(
+            "INSERT INTO orders (id, items, total, date, status) "
+            "VALUES ('snap1', '[]', 1, '2026-01-01 00:00:00', 'completed')")
+        writer.commit()
+        writer.close()
+        # El snapshot abierto del reporte no ve la orden nueva
+        assert reader.execute("SELECT COUNT(*) FROM orders WHERE id='snap1'").fetchone()[0] == 0
@@ -2,6 +2,7 @@
 import os
 import sqlite3
 
+import cart_store
 from business import money
 
 
@@ -100,7 +101,7 @@ def test_apply_coupon_with_null_min_purchase_does_not_crash(admin_client):
                              follow_redirects=True)
     assert resp.status_code == 200
     with admin_client.session_transaction() as sess:
-        assert sess['cart'][0]['price'] == 103.5
+        assert cart_store.for_session(sess)[0]['price'] == 103.5
 
 
 def test_exact_split_payment_after_percentage_promo(admin_client):
@@ -109,7 +110,7 @@ def test_exact_split_payment_after_percentage_promo(admin_client):
     admin_client.post('/apply_coupon', data={'coupon_code': 'SPLIT10'})
     with admin_client.session_transaction() as sess:
         # Sin money() esto era 103.50000000000001 y el pago exacto fallaba
-        assert sess['cart'][0]['price'] == 103.5
+        assert cart_store.for_session(sess)[0]['price'] == 103.5
     resp = admin_client.post('/ticket', data={
         'payment_method': 'split',
         'cash_portion': '100.00',
@@ -2,6 +2,8 @@
 import os
 import sqlite3
 
+import cart_store
+
 
 CART_ITEM = {
     'type': 'Bebida',
@@ -38,7 +40,7 @@ def test_resume_does_not_delete_held_order(admin_client):
     assert any(r[0] == held_id for r in _held_rows())
     with admin_client.session_transaction() as sess:
         assert sess['held_id'] == held_id
-        assert sess['cart']
+        assert cart_store.for_session(sess)
 
 
 def test_held_order_survives_logout_and_login(admin_client):
@@ -81,7 +83,7 @@ def test_cancel_and_start_over_keeps_order_in_queue(admin_client):
     assert any(r[0] == held_id for r in _held_rows())
     with admin_client.session_transaction() as sess:
         assert 'held_id' not in sess
-        assert sess['cart'] == []
+        assert cart_store.for_session(sess) == []
 
 
 def test_normal_sale_without_resume_touches_no_held_orders(admin_client):
@@ -93,3 +95,12 @@ def test_normal_sale_without_resume_touches_no_held_orders(admin_client):
     })
     assert resp.status_code == 200
     assert any(r[0] == held_id for r in _held_rows())
+
+
+def test_held_total_is_summed_in_cents(admin_client):
+    _set_cart(admin_client, [dict(CART_ITEM, price=0.1), dict(CART_ITEM, price=0.2)])
+    admin_client.post('/hold_order')
+    conn = sqlite3.connect(os.environ['RESTAURANT_DB_PATH'])
+    total = conn.execute('SELECT total FROM held_orders').fetchone()[0]
+    conn.close()
+    assert total == 0.3
@@ -0,0 +1,106 @@
+"""Llaves de idempotencia: un reintento repite la respuesta sin cobrar otra vez."""
+import time
+
+import idempotency
+
+BEBIDA = {'type': 'Bebida', 'name': 'Agua', 'beverage_type': 'Agua',
+          'price': 115.0, 'unit_price': 115.0, 'quantity': 1}
+
+
+def _set_cart(client, items):
+    with client.session_transaction() as sess:
+        sess['cart'] = items
+        sess.pop('ticket_token', None)
+
+
+def _order_count(conn):
+    return conn.execute('SELECT COUNT(*) FROM orders').fetchone()[0]
+
+
+def test_retry_with_same_key_replays_original_receipt(admin_client, conn):
+    _set_cart(admin_client, [dict(BEBIDA)])
+    with admin_client.session_transaction() as sess:
+        sess['ticket_token'] = 'tok'
+    form = {'payment_method': 'card', 'ticket_token': 'tok', 'idempotency_key': 'k-1'}
+    r1 = admin_client.post('/ticket', data=form)
+    order_id = conn.execute('SELECT id FROM orders').fetchone()[0]
+
+    # El Wi-Fi se cayó antes de la respuesta: la tablet reenvía el mismo POST
+    # con la cookie vieja (mismo token) y el carrito ya vacío.
+    with admin_client.session_transaction() as sess:
+        sess['ticket_token'] = 'tok'
+    r2 = admin_client.post('/ticket', data=form)
+    assert r1.status_code == r2.status_code == 200
+    assert order_id in r2.get_data(as_text=True)
+    assert _order_count(conn) == 1
+
+
+def test_different_keys_create_different_orders(admin_client, conn):
+    for key in ('a', 'b'):
+        _set_cart(admin_client, [dict(BEBIDA)])
+        admin_client.post('/ticket', data={'payment_method': 'card', 'idempotency_key': key})
+    assert _order_count(conn) == 2
+
+
+def test_failed_sale_does_not_consume_key(admin_client, conn):
+    _set_cart(admin_client, [dict(BEBIDA)])
+    form = {'payment_method': 'cash', 'amount_paid': '10', 'idempotency_key': 'k-2'}
+    assert admin_client.post('/ticket', data=form).status_code == 302
+    form['amount_paid'] = '115'
+    assert admin_client.post('/ticket', data=form).status_code == 200
+    assert _order_count(conn) == 1
+
+
+def test_claim_conflict_and_expiry(app_module, conn):
+    idempotency.claim(conn, 'ticket', 'k-3')
+    idempotency.record(conn, 'ticket', 'k-3', 'X1', {'order_id': 'X1'})
+    conn.commit()
+    try:
+        idempotency.claim(conn, 'ticket', 'k-3')
+        raise AssertionError('claim duplicado no detectado')
+    except idempotency.KeyInUse:
+        conn.rollback()
+    assert idempotency.lookup(conn, 'ticket', 'k-3') == {'order_id': 'X1'}
+    # Otro scope con la misma llave es independiente
+    assert idempotency.lookup(conn, 'express', 'k-3') is None
+
+    conn.execute('UPDATE idempotency_keys SET expires_at = ?', (time.time() - 1,))
+    conn.commit()
+    assert idempotency.lookup(conn, 'ticket', 'k-3') is None
+    idempotency.claim(conn, 'ticket', 'k-3')  # la llave vencida se reutiliza
+    conn.rollback()
+
+
+def test_express_replays_with_header(admin_client, conn):
+    order = {'items': [{'kind': 'beverages', 'options': {'beverage_type': 'Agua'}}],
+             'payment': {'payment_method': 'card'}}
+    headers = {'Idempotency-Key': 'exp-1'}
+    r1 = admin_client.post('/api/orders/express', json=order, headers=headers).get_json()
+    r2 = admin_client.post('/api/orders/express', json=order, headers=headers).get_json()
+    assert r1 == r2
+    assert _order_count(conn) == 1
+
+
+def test_express_batch_replays_with_header(admin_client, conn):
+    order = {'items': [{'kind': 'beverages', 'options': {'beverage_type': 'Agua'}}],
+             'payment': {'payment_method': 'card'}}
+    batch = {'orders': [order, order, {'items': []}]}
+    headers = {'Idempotency-Key': 'batch-1'}
+    r1 = admin_client.post('/api/orders/express/batch', json=batch, headers=headers).get_json()
+    r2 = admin_client.post('/api/orders/express/batch', json=batch, headers=headers).get_json()
+    assert r1 == r2
+    assert r1['saved'] == 2
+    assert _order_count(conn) == 2
+
+
+def test_express_batch_failure_does_not_consume_key(admin_client, conn):
+    order = {'items': [{'kind': 'beverages', 'options': {'beverage_type': 'Agua'}}],
+             'payment': {'payment_method': 'card'}}
+    headers = {'Idempotency-Key': 'batch-2'}
+    malo = {'orders': [{'items': []}]}
+    assert admin_client.post('/api/orders/express/batch', json=malo,
+                             headers=headers).status_code == 400
+    r = admin_client.post('/api/orders/express/batch', json={'orders': [order]},
+                          headers=headers).get_json()
+    assert r['success'] and r['saved'] == 1
+    assert _order_count(conn) == 1
@@ -0,0 +1,61 @@
+"""Verificación de integridad en segundo plano: resultado en config y alerta
+en el dashboard."""
+import os
+import sqlite3
+
+import config_store
+from integrity_check import IntegrityChecker
+
+
+def _db():
+    conn = sqlite3.connect(os.environ['RESTAURANT_DB_PATH'])
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _config(conn, key):
+    row = conn.execute('SELECT value FROM config WHERE key = ?', (key,)).fetchone()
+    return row[0] if row else None
+
+
+def test_pass_records_ok_result(app_module):
+    checker = IntegrityChecker(os.environ['RESTAURANT_DB_PATH'], slice_pause=0)
+    assert checker.run_pass() == 'ok'
+    conn = _db()
+    assert _config(conn, 'integrity_result') == 'ok'
+    assert _config(conn, 'integrity_checked_at')
+    conn.close()
+
+
+def test_stopped_checker_does_not_record(app_module):
+    checker = IntegrityChecker(os.environ['RESTAURANT_DB_PATH'], slice_pause=0)
+    checker._stop.set()
+    assert checker.run_pass() is None
+    conn = _db()
+    assert _config(conn, 'integrity_result') is None
+    conn.close()
+
+
+def test_dashboard_warns_on_failed_check(admin_client):
+    assert 'verificación de integridad' not in admin_client.get('/admin').get_data(as_text=True)
+    conn = _db()
+    conn.execute("INSERT OR REPLACE INTO config (key, value) VALUES "
+                 "('integrity_result', 'orders: row 3 missing from index')")
+    conn.commit()
+    conn.close()
+    config_store.invalidate()
+    html = admin_client.get('/admin').get_data(as_text=True)
+    assert 'verificación de integridad' in html
+
+
+def test_slice_over_budget_is_retried_with_more_budget(app_module):
+    conn = _db()
+    conn.executemany('INSERT INTO activity_log (action, description, timestamp) VALUES (?, ?, ?)',
+                     [('x', 'y' * 200, '2026-01-01 00:00:00')] * 2000)
+    conn.commit()
+    conn.close()
+    checker = IntegrityChecker(os.environ['RESTAURANT_DB_PATH'], slice_pause=0,
+                               slice_budget=0.0001, progress_steps=100)
+    assert checker.run_pass() == 'ok'
+    assert checker.interrupted['budget'] > 0
+    assert checker.interrupted['busy'] == 0
@@ -0,0 +1,65 @@
+"""Registro de migraciones sobre PRAGMA user_version."""
+import os
+import sqlite3
+
+import pytest
+
+import schema
+
+
+def _db():
+    conn = sqlite3.connect(os.environ['RESTAURANT_DB_PATH'])
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def test_fresh_db_is_at_latest_version(app_module):
+    conn = _db()
+    assert schema.schema_version(conn) == schema.MIGRATIONS[-1].version
+    assert [v for v, _, _ in schema.last_report] == [m.version for m in schema.MIGRATIONS]
+    conn.close()
+
+
+def test_current_db_skips_every_migration(app_module):
+    conn = _db()
+    assert schema.migrate(conn) == []
+    conn.close()
+
+
+def test_failed_migration_rolls_back_and_keeps_version(app_module):
+    conn = _db()
+    base = schema.schema_version(conn)
+
+    def rota(c):
+        c.execute('CREATE TABLE tabla_nueva (x INTEGER)')
+        raise RuntimeError('falla a la mitad')
+
+    with pytest.raises(RuntimeError):
+        schema.migrate(conn, schema.MIGRATIONS + (schema.Migration(base + 1, 'rota', rota),))
+    assert schema.schema_version(conn) == base
+    assert conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'tabla_nueva'").fetchone() is None
+
+    def buena(c):
+        c.execute('CREATE TABLE tabla_nueva (x INTEGER)')
+
+    reporte = schema.migrate(conn, schema.MIGRATIONS + (schema.Migration(base + 1, 'buena', buena),))
+    assert [(v, n) for v, n, _ in reporte] == [(base + 1, 'buena')]
+    assert schema.schema_version(conn) == base + 1
+    conn.close()
+
+
+def test_legacy_db_is_brought_up_to_date(app_module):
+    """Una BD anterior al registro (user_version 0) corre todas las migraciones
+    sin perder datos: la base es idempotente."""
+    conn = _db()
+    conn.execute("INSERT INTO orders (id, items, total, payment_method, date, status) "
+                 "VALUES ('vieja', '[]', 50, 'cash', '2026-01-02 10:00:00', 'completed')")
+    conn.execute('DROP TABLE daily_sales')
+    conn.execute('PRAGMA user_version = 0')
+    conn.commit()
+    schema.migrate(conn)
+    assert schema.schema_version(conn) == schema.MIGRATIONS[-1].version
+    assert conn.execute('SELECT revenue_cents FROM daily_sales').fetchone()[0] == 5000
+    assert conn.execute("SELECT COUNT(*) FROM users WHERE username = 'admin'").fetchone()[0] == 1
+    conn.close()
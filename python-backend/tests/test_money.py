@@ -0,0 +1,62 @@
+"""Núcleo de dinero en centavos enteros y columnas *_cents de orders."""
+import os
+import random
+import sqlite3
+from decimal import Decimal, ROUND_HALF_UP
+
+from business import cart_total_cents, from_cents, money, percent_off_cents, to_cents
+
+
+def _decimal_money(value):
+    return float(Decimal(str(value)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
+
+
+def test_to_cents_matches_decimal_half_up():
+    casos = [1.005, 2.675, 0.125, -0.125, 103.50000000000001, 76.66666666666667, 0, 10, -3]
+    rng = random.Random(7)
+    casos += [round(rng.uniform(-2000, 2000), rng.choice([1, 2, 3, 4])) for _ in range(20000)]
+    for value in casos:
+        assert money(value) == _decimal_money(value), value
+    assert to_cents(1.005) == 101
+    assert to_cents(-0.125) == -13
+    assert from_cents(10350) == 103.5
+
+
+def test_cart_total_sums_integer_cents():
+    cart = [{'price': 0.1}, {'price': 0.2}, {'price': 0.3}]
+    assert cart_total_cents(cart) == 60
+    assert from_cents(cart_total_cents(cart)) == 0.6
+
+
+def test_percent_off_in_integer_cents():
+    assert percent_off_cents(11500, 10) == 10350
+    assert percent_off_cents(1005, 50) == 503           # 502.5 → half-up
+    assert percent_off_cents(999, 12.5) == 874          # 874.125
+    assert percent_off_cents(11500, 100) == 0
+    for _ in range(2000):
+        cents, pct = random.randint(0, 100000), random.randint(1, 100)
+        esperado = (Decimal(cents) * (100 - pct) / 100).quantize(0, rounding=ROUND_HALF_UP)
+        assert percent_off_cents(cents, pct) == int(esperado)
+
+
+def test_ticket_stores_cents_columns(admin_client):
+    with admin_client.session_transaction() as sess:
+        sess['cart'] = [{'type': 'Bebida', 'name': 'Agua', 'price': 0.1, 'quantity': 1},
+                        {'type': 'Bebida', 'name': 'Agua', 'price': 0.2, 'quantity': 1}]
+    resp = admin_client.post('/ticket', data={'payment_method': 'cash', 'amount_paid': '1'})
+    assert resp.status_code == 200
+    conn = sqlite3.connect(os.environ['RESTAURANT_DB_PATH'])
+    row = conn.execute('SELECT total, total_cents, amount_paid_cents FROM orders').fetchone()
+    conn.close()
+    assert row == (0.3, 30, 100)
+
+
+def test_legacy_writers_get_cents_from_triggers(app_module):
+    conn = sqlite3.connect(os.environ['RESTAURANT_DB_PATH'])
+    conn.execute("INSERT INTO orders (id, total, amount_paid, date, status) "
+                 "VALUES ('viejo', 12.34, 20, '2026-01-01 10:00:00', 'completed')")
+    conn.execute("UPDATE orders SET total = 15.5 WHERE id = 'viejo'")
+    conn.commit()
+    row = conn.execute("SELECT total_cents, amount_paid_cents FROM orders WHERE id = 'viejo'").fetchone()
+    conn.close()
+    assert row == (1550, 2000)
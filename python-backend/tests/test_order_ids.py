@@ -0,0 +1,62 @@
+"""IDs de orden: prefijo del día + secuencia diaria, sin reintentos."""
+import os
+import sqlite3
+from datetime import datetime
+
+from order_ids import format_order_id, next_order_id
+
+
+def _db():
+    conn = sqlite3.connect(os.environ['RESTAURANT_DB_PATH'])
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def test_format_keeps_eight_chars_and_sorts():
+    assert format_order_id('260315', 11) == '2603150B'
+    assert format_order_id('260315', 1295) == '260315ZZ'
+    assert format_order_id('260315', 1296) == '260315100'
+    ids = [format_order_id('260315', n) for n in range(1, 200)]
+    assert ids == sorted(ids)
+
+
+def test_sequence_is_per_day(app_module):
+    conn = _db()
+    dia = datetime(2026, 3, 15, 12, 0)
+    assert [next_order_id(conn, dia) for _ in range(3)] == ['26031501', '26031502', '26031503']
+    assert next_order_id(conn, datetime(2026, 3, 16, 9, 0)) == '26031601'
+    conn.commit()
+    conn.close()
+
+
+def test_rolled_back_sale_does_not_consume_a_number(app_module):
+    conn = _db()
+    dia = datetime(2026, 3, 15, 12, 0)
+    assert next_order_id(conn, dia) == '26031501'
+    conn.rollback()
+    assert next_order_id(conn, dia) == '26031501'
+    conn.commit()
+    conn.close()
+
+
+def test_legacy_id_collision_is_skipped(app_module):
+    conn = _db()
+    conn.execute("INSERT INTO orders (id, total, date, status) "
+                 "VALUES ('26031501', 10, '2025-01-01 10:00:00', 'completed')")
+    conn.commit()
+    assert next_order_id(conn, datetime(2026, 3, 15, 12, 0)) == '26031502'
+    conn.commit()
+    conn.close()
+
+
+def test_ticket_assigns_id_at_commit(admin_client):
+    with admin_client.session_transaction() as sess:
+        assert 'order_id' not in sess
+        sess['cart'] = [{'type': 'Bebida', 'name': 'Agua', 'price': 10.0, 'quantity': 1}]
+    resp = admin_client.post('/ticket', data={'payment_method': 'card'})
+    assert resp.status_code == 200
+    esperado = datetime.now().strftime('%y%m%d') + '01'
+    assert esperado.encode() in resp.data
+    conn = _db()
+    assert conn.execute('SELECT id FROM orders').fetchone()[0] == esperado
+    conn.close()
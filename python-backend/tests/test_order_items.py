@@ -0,0 +1,76 @@
+"""order_items: líneas normalizadas escritas en /ticket, backfill reanudable
+y agregados de productos por SQL."""
+import json
+import os
+import sqlite3
+
+from schema import backfill_order_items
+
+
+SUSHI = {'type': 'Sushi', 'name': 'Sushi', 'price': 230.0, 'unit_price': 115.0, 'quantity': 2}
+AGUA = {'type': 'Bebida', 'name': 'Agua', 'beverage_type': 'Agua',
+        'price': 10.0, 'unit_price': 10.0, 'quantity': 1}
+
+
+def _db():
+    conn = sqlite3.connect(os.environ['RESTAURANT_DB_PATH'])
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _checkout(client, cart):
+    with client.session_transaction() as sess:
+        sess['cart'] = cart
+    resp = client.post('/ticket', data={'payment_method': 'card'})
+    assert resp.status_code == 200
+
+
+def _insert_legacy_order(conn, oid, items, total):
+    conn.execute(
+        "INSERT INTO orders (id, items, total, payment_method, date, status) "
+        "VALUES (?, ?, ?, 'cash', '2026-01-02 12:00:00', 'completed')",
+        (oid, json.dumps(items), total))
+    conn.commit()
+
+
+def test_ticket_writes_order_items(admin_client):
+    _checkout(admin_client, [dict(SUSHI), dict(AGUA)])
+    conn = _db()
+    rows = conn.execute('SELECT * FROM order_items ORDER BY line_no').fetchall()
+    conn.close()
+    assert [(r['line_no'], r['name'], r['quantity'], r['price']) for r in rows] == [
+        (0, 'Sushi', 2, 230.0), (1, 'Agua', 1, 10.0)]
+
+
+def test_backfill_is_resumable_and_idempotent(app_module):
+    conn = _db()
+    _insert_legacy_order(conn, 'old1', [SUSHI], 230.0)
+    _insert_legacy_order(conn, 'old2', [{'type': 'Boneless', 'quantity': 1}], 105.0)
+    _insert_legacy_order(conn, 'old3', 'no-es-lista', 0)
+    assert backfill_order_items(conn, chunk=1) == 2
+    cursor = conn.execute(
+        "SELECT value FROM config WHERE key = 'order_items_backfill'").fetchone()[0]
+    assert int(cursor) == conn.execute('SELECT MAX(rowid) FROM orders').fetchone()[0]
+    # Sin precio en la línea: se reparte el total de la orden
+    row = conn.execute("SELECT name, price FROM order_items WHERE order_id = 'old2'").fetchone()
+    assert (row['name'], row['price']) == ('Boneless', 105.0)
+    assert backfill_order_items(conn) == 0
+    conn.close()
+
+
+def test_reports_top_items_come_from_order_items(admin_client):
+    _checkout(admin_client, [dict(SUSHI)])
+    resp = admin_client.get('/admin/reports?period=today')
+    assert resp.status_code == 200
+    assert b'Sushi' in resp.data
+
+
+def test_deleting_an_order_removes_its_lines(admin_client):
+    _checkout(admin_client, [dict(AGUA)])
+    conn = _db()
+    oid = conn.execute('SELECT id FROM orders').fetchone()['id']
+    conn.close()
+    admin_client.post(f'/admin/orders/delete/{oid}')
+    conn = _db()
+    assert conn.execute('SELECT COUNT(*) FROM order_items').fetchone()[0] == 0
+    conn.close()
@@ -0,0 +1,370 @@
+"""Cola de impresión por cursor (since) y long-poll para el print bridge."""
+import threading
+import time
+
+import print_bridge
+import print_queue
+
+BEBIDA = {'type': 'Bebida', 'name': 'Agua', 'beverage_type': 'Agua',
+          'price': 115.0, 'unit_price': 115.0, 'quantity': 1}
+
+
+def _sell(client):
+    with client.session_transaction() as sess:
+        sess['cart'] = [dict(BEBIDA)]
+        sess.pop('ticket_token', None)
+    assert client.post('/ticket', data={'payment_method': 'card'}).status_code == 200
+
+
+def _insert_job(conn, job_id):
+    conn.execute("INSERT INTO print_jobs (id, receipt_content, status, created_at) "
+                 "VALUES (?, 'ticket', 'pending', '2026-01-01 12:00:00')", (job_id,))
+    conn.commit()
+
+
+def test_since_returns_only_new_jobs(admin_client):
+    _sell(admin_client)
+    first = admin_client.get('/api/print_queue').get_json()
+    assert len(first['jobs']) == 1
+    assert first['jobs'][0]['seq'] == first['cursor']
+
+    _sell(admin_client)
+    delta = admin_client.get(f"/api/print_queue?since={first['cursor']}").get_json()
+    assert len(delta['jobs']) == 1
+    assert delta['jobs'][0]['id'] != first['jobs'][0]['id']
+    assert delta['cursor'] > first['cursor']
+
+    empty = admin_client.get(f"/api/print_queue?since={delta['cursor']}").get_json()
+    assert empty == {'jobs': [], 'cursor': delta['cursor']}
+
+
+def test_stale_cursor_returns_full_queue(admin_client):
+    _sell(admin_client)
+    data = admin_client.get('/api/print_queue?since=999999').get_json()
+    assert len(data['jobs']) == 1
+
+
+def test_long_poll_wakes_on_notify(admin_client, conn):
+    cursor = admin_client.get('/api/print_queue').get_json()['cursor']
+
+    def producer():
+        time.sleep(0.2)
+        _insert_job(conn, 'LP-1')
+        print_queue.notify()
+
+    t = threading.Thread(target=producer)
+    inicio = time.monotonic()
+    t.start()
+    data = admin_client.get(f'/api/print_queue?since={cursor}&wait=10').get_json()
+    t.join()
+    assert [j['id'] for j in data['jobs']] == ['LP-1']
+    assert time.monotonic() - inicio < 5
+
+
+def test_long_poll_times_out_empty(admin_client):
+    inicio = time.monotonic()
+    data = admin_client.get('/api/print_queue?since=0&wait=0.2').get_json()
+    assert data['jobs'] == []
+    assert 0.15 <= time.monotonic() - inicio < 5
+
+
+def test_sale_notifies_waiters(admin_client):
+    visto = print_queue.version()
+    _sell(admin_client)
+    assert print_queue.version() != visto
+
+
+class _Resp:
+    def __init__(self, data, status_code=200):
+        self._data = data
+        self.status_code = status_code
+
+    def json(self):
+        return self._data
+
+
+class _FakeHttp:
+    """Sustituye la requests.Session del bridge y registra las llamadas."""
+
+    def __init__(self, gets=(), posts=()):
+        self.gets, self.posts = list(gets), list(posts)
+        self.calls = []
+
+    def get(self, url, params=None, timeout=None):
+        self.calls.append(('GET', url, params))
+        return self.gets.pop(0)
+
+    def post(self, url, json=None, timeout=None):
+        self.calls.append(('POST', url, json))
+        return self.posts.pop(0)
+
+
+def _bridge(monkeypatch, http):
+    monkeypatch.setattr(print_bridge.ThermalPrintBridge, '_leer_impresora', lambda self: 'X')
+    monkeypatch.setattr(print_bridge.ThermalPrintBridge, '_verificar_y_activar',
+                        lambda self, nombre: nombre)
+    bridge = print_bridge.ThermalPrintBridge()
+    bridge._http = http
+    return bridge
+
+
+def test_bridge_follows_cursor_and_falls_back_to_polling(monkeypatch):
+    http = _FakeHttp(gets=[_Resp({'jobs': [{'id': 'A', 'seq': 7}], 'cursor': 7}),
+                           _Resp({'jobs': []})])
+    bridge = _bridge(monkeypatch, http)
+    assert bridge.get_pending_jobs() == [{'id': 'A', 'seq': 7}]
+    assert bridge._cursor == 7
+    assert bridge.get_pending_jobs() == []   # servidor viejo, sin 'cursor'
+    assert http.calls[0][2] == {'since': 0, 'wait': print_bridge.LONG_POLL_WAIT}
+    assert http.calls[1][2] == {'since': 7, 'wait': print_bridge.LONG_POLL_WAIT}
+    assert bridge._long_poll is False
+
+
+def test_bridge_uses_keep_alive_session(monkeypatch):
+    monkeypatch.setattr(print_bridge.ThermalPrintBridge, '_leer_impresora', lambda self: 'X')
+    monkeypatch.setattr(print_bridge.ThermalPrintBridge, '_verificar_y_activar',
+                        lambda self, nombre: nombre)
+    assert isinstance(print_bridge.ThermalPrintBridge()._http, print_bridge.requests.Session)
+
+
+def test_bridge_acknowledges_backlog_in_one_request(monkeypatch):
+    http = _FakeHttp(posts=[_Resp({'ok': True, 'marked': 50})])
+    bridge = _bridge(monkeypatch, http)
+    bridge._por_confirmar = [f'J{i}' for i in range(50)]
+    assert bridge.confirmar_impresos() is True
+    assert len(http.calls) == 1
+    assert http.calls[0][1].endswith('/api/mark_printed')
+    assert len(http.calls[0][2]['ids']) == 50
+    assert bridge._por_confirmar == []
+
+
+def test_bridge_keeps_unacknowledged_jobs_and_falls_back(monkeypatch):
+    http = _FakeHttp(posts=[_Resp({}, 500)])
+    bridge = _bridge(monkeypatch, http)
+    bridge._por_confirmar = ['A', 'B']
+    assert bridge.confirmar_impresos() is False
+    assert bridge._por_confirmar == ['A', 'B']
+
+    # Servidor viejo sin el endpoint en lote: confirma uno por uno
+    http.posts = [_Resp({}, 404), _Resp({'ok': True}), _Resp({'ok': True})]
+    assert bridge.confirmar_impresos() is True
+    assert [c[1].rsplit('/', 1)[-1] for c in http.calls[-2:]] == ['A', 'B']
+
+
+def test_batch_mark_printed_endpoint(admin_client, conn):
+    for n in range(3):
+        _insert_job(conn, f'B-{n}')
+    resp = admin_client.post('/api/mark_printed', json={'ids': ['B-0', 'B-1', 'nope']})
+    assert resp.get_json() == {'ok': True, 'marked': 2}
+    pending = [j['id'] for j in admin_client.get('/api/print_queue').get_json()['jobs']]
+    assert pending == ['B-2']
+
+    assert admin_client.post('/api/mark_printed', json={'ids': 'B-2'}).status_code == 400
+    too_many = {'ids': [f'x{i}' for i in range(print_queue.MAX_ACK + 1)]}
+    assert admin_client.post('/api/mark_printed', json=too_many).status_code == 400
+
+
+# ---------------------------------------------------------------------------
+# Reclamos con préstamo (varios bridges)
+# ---------------------------------------------------------------------------
+
+def _claim(client, bridge, **extra):
+    return client.post('/api/print_queue/claim', json=dict(bridge=bridge, **extra)).get_json()
+
+
+def test_two_bridges_never_claim_the_same_job(admin_client, conn):
+    for n in range(4):
+        _insert_job(conn, f'C-{n}')
+    a = _claim(admin_client, 'mostrador', limit=3)
+    b = _claim(admin_client, 'cocina', limit=3)
+    ids_a = {j['id'] for j in a['jobs']}
+    ids_b = {j['id'] for j in b['jobs']}
+    assert len(ids_a) == 3 and len(ids_b) == 1
+    assert not ids_a & ids_b
+    row = conn.execute("SELECT claimed_by, attempts, lease_until FROM print_jobs "
+                       "WHERE id = ?", (b['jobs'][0]['id'],)).fetchone()
+    assert row['claimed_by'] == 'cocina' and row['attempts'] == 1 and row['lease_until']
+    # Con préstamo vigente tampoco salen en la cola compartida
+    assert admin_client.get('/api/print_queue').get_json()['jobs'] == []
+
+
+def test_expired_lease_returns_job_to_queue(admin_client, conn):
+    _insert_job(conn, 'E-1')
+    assert [j['id'] for j in _claim(admin_client, 'a')['jobs']] == ['E-1']
+    assert _claim(admin_client, 'b')['jobs'] == []
+    conn.execute("UPDATE print_jobs SET lease_until = 1 WHERE id = 'E-1'")
+    conn.commit()
+    again = _claim(admin_client, 'b')['jobs']
+    assert [(j['id'], j['attempts'], j['claimed_by']) for j in again] == [('E-1', 2, 'b')]
+
+
+def test_release_and_mark_printed(admin_client, conn):
+    _insert_job(conn, 'R-1')
+    _insert_job(conn, 'R-2')
+    _claim(admin_client, 'a')
+    # Solo el dueño del préstamo puede liberarlo
+    resp = admin_client.post('/api/print_queue/release', json={'bridge': 'b', 'ids': ['R-1']})
+    assert resp.get_json()['released'] == 0
+    resp = admin_client.post('/api/print_queue/release', json={'bridge': 'a', 'ids': ['R-1']})
+    assert resp.get_json()['released'] == 1
+    assert [j['id'] for j in _claim(admin_client, 'b')['jobs']] == ['R-1']
+
+    admin_client.post('/api/mark_printed', json={'ids': ['R-1', 'R-2']})
+    conn.execute("UPDATE print_jobs SET lease_until = 1")
+    conn.commit()
+    assert _claim(admin_client, 'c')['jobs'] == []
+
+
+def test_claim_long_poll_wakes_on_new_job(admin_client, conn):
+    def producer():
+        time.sleep(0.2)
+        _insert_job(conn, 'W-1')
+        print_queue.notify()
+
+    t = threading.Thread(target=producer)
+    t.start()
+    data = _claim(admin_client, 'a', wait=10)
+    t.join()
+    assert [j['id'] for j in data['jobs']] == ['W-1']
+
+
+def test_claim_validates_numbers(admin_client):
+    resp = admin_client.post('/api/print_queue/claim', json={'limit': 'muchos'})
+    assert resp.status_code == 400
+
+
+def test_bridge_claims_and_releases_failed_jobs(monkeypatch):
+    job = {'id': 'K-1', 'receipt_content': 'x', 'attempts': 1}
+    http = _FakeHttp(posts=[_Resp({'jobs': [job]}), _Resp({'ok': True})])
+    bridge = _bridge(monkeypatch, http)
+    assert bridge.claim_jobs() == [job]
+    assert http.calls[0][2]['bridge'] == print_bridge.BRIDGE_ID
+    bridge.liberar_jobs(['K-1'])
+    assert http.calls[1][1].endswith('/api/print_queue/release')
+
+    # Servidor sin reclamos: vuelve a la cola compartida por cursor
+    http.posts = [_Resp({}, 404)]
+    http.gets = [_Resp({'jobs': [], 'cursor': 3})]
+    assert bridge.claim_jobs() == []
+    assert bridge._claims is False and bridge._cursor == 3
+
+
+# ---------------------------------------------------------------------------
+# Estaciones: comanda de cocina y un worker por impresora
+# ---------------------------------------------------------------------------
+
+SUSHI = {'type': 'Sushi', 'name': 'Sushi', 'price': 115.0, 'unit_price': 115.0, 'quantity': 1}
+
+
+def _set_kitchen_tickets(conn, value):
+    import config_store
+    conn.execute("INSERT OR REPLACE INTO config (key, value) VALUES ('kitchen_tickets', ?)", (value,))
+    conn.commit()
+    config_store.invalidate()
+
+
+def _sell_mixed(client):
+    with client.session_transaction() as sess:
+        sess['cart'] = [dict(SUSHI), dict(BEBIDA)]
+        sess.pop('ticket_token', None)
+    assert client.post('/ticket', data={'payment_method': 'card'}).status_code == 200
+
+
+def test_kitchen_ticket_goes_to_kitchen_station(admin_client, conn):
+    _set_kitchen_tickets(conn, '1')
+    try:
+        _sell_mixed(admin_client)
+    finally:
+        _set_kitchen_tickets(conn, '0')
+    jobs = {j['station']: j for j in admin_client.get('/api/print_queue').get_json()['jobs']}
+    assert set(jobs) == {'counter', 'kitchen'}
+    assert jobs['kitchen']['id'] == jobs['counter']['id'] + '-K'
+    assert 'Sushi' in jobs['kitchen']['receipt_content']
+    assert 'Agua' not in jobs['kitchen']['receipt_content']
+
+    kitchen = _claim(admin_client, 'cocina', stations=['kitchen'])['jobs']
+    assert [j['station'] for j in kitchen] == ['kitchen']
+    assert _claim(admin_client, 'cocina', stations=['kitchen'])['jobs'] == []
+    assert admin_client.post('/api/print_queue/claim',
+                             json={'stations': 'kitchen'}).status_code == 400
+
+
+def test_kitchen_tickets_off_by_default(admin_client):
+    _sell_mixed(admin_client)
+    jobs = admin_client.get('/api/print_queue').get_json()['jobs']
+    assert [j['station'] for j in jobs] == ['counter']
+
+
+def test_parse_printers():
+    assert print_bridge.parse_printers('counter=POS_80, kitchen = EPSON ,bad') == \
+        {'counter': 'POS_80', 'kitchen': 'EPSON'}
+    assert print_bridge.parse_printers('') == {}
+
+
+def test_jammed_printer_does_not_stall_other_station(monkeypatch):
+    monkeypatch.setattr(print_bridge, 'PRINTERS', 'counter=POS_80,kitchen=COCINA')
+    bridge = _bridge(monkeypatch, _FakeHttp())
+    atascada = threading.Event()
+    impresos = []
+
+    def send(text, printer_name=None):
+        if printer_name == 'COCINA':
+            atascada.wait(5)
+        impresos.append(printer_name)
+        return True
+
+    monkeypatch.setattr(bridge, 'send_to_printer', send)
+    monkeypatch.setattr(bridge, 'confirmar_impresos', lambda: True)
+    bridge._workers = bridge._crear_workers()
+    for worker in bridge._workers:
+        worker.start()
+    try:
+        bridge.repartir([{'id': 'K', 'station': 'kitchen', 'receipt_content': 'sushi'},
+                         {'id': 'C', 'station': 'counter', 'receipt_content': 'ticket'}])
+        deadline = time.monotonic() + 5
+        while 'POS_80' not in impresos and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert impresos == ['POS_80']
+        cocina = bridge._workers[1]
+        assert cocina.printer_name == 'COCINA' and not cocina.libre()
+        # Un job ya en cola no se vuelve a repartir
+        bridge.repartir([{'id': 'K', 'station': 'kitchen', 'receipt_content': 'sushi'}])
+        assert cocina.queue.qsize() == 0
+    finally:
+        atascada.set()
+        for worker in bridge._workers:
+            worker.stop()
+    assert sorted(impresos) == ['COCINA', 'POS_80']
+    assert sorted(bridge._por_confirmar) == ['C', 'K']
+
+
+def test_claimed_jobs_are_acked_one_by_one(monkeypatch):
+    bridge = _bridge(monkeypatch, _FakeHttp())
+    confirmados = []
+    monkeypatch.setattr(bridge, 'send_to_printer', lambda text, printer_name=None: True)
+    monkeypatch.setattr(bridge, 'confirmar_impresos',
+                        lambda: confirmados.append(list(bridge._por_confirmar)))
+    bridge._workers = bridge._crear_workers()
+    worker = bridge._workers[0]
+    worker.start()
+    try:
+        bridge.repartir([{'id': f'L-{n}', 'receipt_content': 'x', 'attempts': 1}
+                         for n in range(3)])
+        deadline = time.monotonic() + 5
+        while len(confirmados) < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        worker.stop()
+    # Un confirmar por job, sin esperar a que la tanda termine
+    assert confirmados == [['L-0'], ['L-0', 'L-1'], ['L-0', 'L-1', 'L-2']]
+
+
+def test_claim_size_fits_in_the_lease(monkeypatch):
+    bridge = _bridge(monkeypatch, _FakeHttp())
+    lpr = print_bridge.PrinterWorker(bridge, 'Printer_POS_80')
+    tcp = print_bridge.PrinterWorker(bridge, 'tcp://10.0.0.9')
+    for worker in (lpr, tcp):
+        peor_caso = bridge._transport(worker.printer_name).max_seconds + print_bridge.POLL_INTERVAL
+        assert 1 <= worker.claim_limit() <= print_bridge.CLAIM_BATCH
+        assert worker.claim_limit() * peor_caso <= print_bridge.LEASE_SECONDS
+    assert lpr.claim_limit() < tcp.claim_limit()
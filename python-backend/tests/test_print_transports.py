@@ -0,0 +1,201 @@
+"""Transportes del print bridge contra una impresora 9100 falsa."""
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+import print_bridge
+import print_transports
+from print_transports import (DeviceFileTransport, RawSocketTransport, SpoolerTransport,
+                              TransportError, transport_for)
+
+
+class FakePrinter:
+    """Servidor TCP local que guarda lo recibido por cada conexión. Con
+    close_after_job cierra la conexión tras cada envío, como algunas impresoras."""
+
+    def __init__(self, close_after_job=False):
+        self.close_after_job = close_after_job
+        self.received = []          # bytes por conexión
+        self._server = socket.socket()
+        self._server.bind(('127.0.0.1', 0))
+        self._server.listen()
+        self.port = self._server.getsockname()[1]
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return
+            self.received.append(b'')
+            n = len(self.received) - 1
+            conn.settimeout(0.2 if self.close_after_job else None)
+            with conn:
+                while True:
+                    try:
+                        chunk = conn.recv(4096)
+                    except socket.timeout:
+                        break       # trabajo terminado: cerrar
+                    except OSError:
+                        break
+                    if not chunk:
+                        break
+                    self.received[n] += chunk
+
+    def wait_for(self, *parts, timeout=3.0):
+        """Espera a que lleguen todos los fragmentos; devuelve todo lo recibido."""
+        limite = time.monotonic() + timeout
+        while (not all(p in b''.join(self.received) for p in parts)
+               and time.monotonic() < limite):
+            time.sleep(0.01)
+        return b''.join(self.received)
+
+    def close(self):
+        self._server.close()
+
+
+@pytest.fixture
+def printer():
+    p = FakePrinter()
+    yield p
+    p.close()
+
+
+def test_transport_for_picks_by_name():
+    tcp = transport_for('tcp://192.168.1.50')
+    assert isinstance(tcp, RawSocketTransport) and (tcp.host, tcp.port) == ('192.168.1.50', 9100)
+    assert transport_for('tcp://10.0.0.9:9101').port == 9101
+    assert isinstance(transport_for('/dev/usb/lp0'), DeviceFileTransport)
+    assert transport_for('file:///dev/usb/lp1').path == '/dev/usb/lp1'
+    assert isinstance(transport_for('COM3:'), DeviceFileTransport)
+    assert isinstance(transport_for('Printer_POS_80'), SpoolerTransport)
+    assert isinstance(transport_for('Compaq'), SpoolerTransport)
+
+
+def test_raw_socket_reuses_connection(printer):
+    t = RawSocketTransport('127.0.0.1', printer.port)
+    t.send(b'ticket 1\n')
+    t.send(b'ticket 2\n')
+    assert printer.wait_for(b'ticket 1\nticket 2\n') == b'ticket 1\nticket 2\n'
+    assert t.connects == 1 and len(printer.received) == 1
+    t.close()
+
+
+def test_raw_socket_reconnects_when_printer_closes():
+    printer = FakePrinter(close_after_job=True)
+    try:
+        t = RawSocketTransport('127.0.0.1', printer.port)
+        t.send(b'uno')
+        printer.wait_for(b'uno')
+        time.sleep(0.4)             # la impresora cierra su lado
+        t.send(b'dos')
+        assert printer.wait_for(b'unodos') == b'unodos'
+        assert t.connects == 2
+        t.close()
+    finally:
+        printer.close()
+
+
+def test_raw_socket_error_when_printer_is_off():
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()                       # nadie escucha en ese puerto
+    with pytest.raises(TransportError):
+        RawSocketTransport('127.0.0.1', port, connect_timeout=0.5).send(b'x')
+
+
+def test_device_file_keeps_descriptor_open(tmp_path):
+    path = tmp_path / 'lp0'
+    path.write_bytes(b'')
+    t = DeviceFileTransport(str(path))
+    t.send(b'abc')
+    fd = t._fd
+    t.send(b'def')
+    assert t._fd == fd
+    t.close()
+    assert path.read_bytes() == b'abcdef'
+
+
+@pytest.mark.skipif(not hasattr(os, 'mkfifo'), reason='requiere mkfifo')
+def test_device_write_timeout(tmp_path):
+    # Una FIFO que nadie lee se llena como una impresora sin papel
+    path = str(tmp_path / 'lp0')
+    os.mkfifo(path)
+    lector = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+    try:
+        t = DeviceFileTransport(path, write_timeout=0.2)
+        inicio = time.monotonic()
+        with pytest.raises(TransportError):
+            t.send(b'x' * (4 * 1024 * 1024))
+        assert time.monotonic() - inicio < 2
+        assert t._fd is None
+    finally:
+        os.close(lector)
+
+
+@pytest.mark.skipif(not hasattr(os, 'mkfifo'), reason='requiere mkfifo')
+def test_blocking_device_write_timeout(tmp_path):
+    # Camino de Windows (sin O_NONBLOCK): la escritura va en un hilo auxiliar
+    path = str(tmp_path / 'lp0')
+    os.mkfifo(path)
+    lector = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+    try:
+        t = DeviceFileTransport(path, write_timeout=0.2)
+        t._sin_bloqueo = False
+        inicio = time.monotonic()
+        with pytest.raises(TransportError):
+            t.send(b'x' * (4 * 1024 * 1024))
+        assert time.monotonic() - inicio < 2
+        assert t._fd is None
+    finally:
+        os.close(lector)    # el hilo recibe EPIPE, cierra su descriptor y termina
+    hilos = [h for h in threading.enumerate() if h.name == f'device-write {path}']
+    for h in hilos:
+        h.join(2)
+    assert not any(h.is_alive() for h in hilos)
+
+
+def test_blocking_device_write_completes(tmp_path):
+    path = tmp_path / 'lp0'
+    path.write_bytes(b'')
+    t = DeviceFileTransport(str(path))
+    t._sin_bloqueo = False
+    t.send(b'abc')
+    t.send(b'def')
+    t.close()
+    assert path.read_bytes() == b'abcdef'
+
+
+def test_bridge_sends_over_tcp_and_reports_latency(monkeypatch, printer):
+    monkeypatch.setattr(print_bridge.ThermalPrintBridge, '_leer_impresora', lambda self: 'X')
+    monkeypatch.setattr(print_bridge.ThermalPrintBridge, '_verificar_y_activar',
+                        lambda self, nombre: nombre)
+    bridge = print_bridge.ThermalPrintBridge()
+    destino = f'tcp://127.0.0.1:{printer.port}'
+    assert bridge.print_job({'id': 'A', 'receipt_content': 'Orden #: 1'}, destino)
+    assert bridge.print_job({'id': 'B', 'receipt_content': 'Orden #: 2'}, destino)
+    recibido = printer.wait_for(b'Orden #: 1', b'Orden #: 2')
+    assert b'Orden #: 1' in recibido and b'Orden #: 2' in recibido
+    assert len(printer.received) == 1
+
+    assert not bridge.send_to_printer('x', 'tcp://127.0.0.1:1')
+    report = bridge.latency_report()
+    assert report['tcp']['count'] == 3 and report['tcp']['errors'] == 1
+    assert report['tcp']['p50_ms'] >= 0
+    bridge.close_transports()
+    assert bridge._transports == {}
+
+
+def test_direct_names_skip_cups_detection(monkeypatch):
+    monkeypatch.setattr(print_bridge.ThermalPrintBridge, '_leer_impresora',
+                        lambda self: 'tcp://192.168.1.50')
+    monkeypatch.setattr(print_bridge.ThermalPrintBridge, '_listar_impresoras_cups',
+                        lambda self: pytest.fail('no debe consultar CUPS'))
+    assert print_bridge.ThermalPrintBridge()._printer_name == 'tcp://192.168.1.50'
+    assert print_transports.is_direct('LPT1')
@@ -0,0 +1,33 @@
+"""Paquete de índices: las consultas calientes no recorren tablas completas."""
+import os
+import sqlite3
+
+import query_plans
+from schema import INDEX_PACK
+
+
+def _db():
+    conn = sqlite3.connect(os.environ['RESTAURANT_DB_PATH'])
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def test_hot_queries_use_indexes(app_module):
+    conn = _db()
+    assert query_plans.full_scans(conn) == {}
+    nombres = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {name for name, _ in INDEX_PACK} <= nombres
+    assert 'idx_print_jobs_pending' in query_plans.plan(
+        conn, *query_plans.HOT_QUERIES['print_queue'])[0]
+    conn.close()
+
+
+def test_full_scan_is_reported_when_index_missing(app_module):
+    conn = _db()
+    conn.execute('DROP INDEX idx_activity_log_timestamp')
+    assert query_plans.full_scans(conn) == {'activity_log': ['activity_log']}
+    conn.close()
+
+
+def test_db_stats_reports_full_scans(admin_client):
+    assert admin_client.get('/admin/api/db-stats').get_json()['full_scans'] == {}
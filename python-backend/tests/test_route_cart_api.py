@@ -0,0 +1,113 @@
+"""API JSON del carrito: responde solo las líneas que cambiaron y el total."""
+import cart_store
+
+
+def _item(item_type, price, quantity=1):
+    return {'type': item_type, 'name': item_type, 'price': float(price),
+            'unit_price': float(price) / quantity, 'quantity': quantity}
+
+
+def _set_cart(client, items):
+    with client.session_transaction() as sess:
+        sess['cart'] = items
+
+
+def _cart(client):
+    with client.session_transaction() as sess:
+        return cart_store.for_session(sess)
+
+
+def _insert_promo(conn, name, promo_type, value, min_purchase=0, applicable=None):
+    conn.execute(
+        'INSERT INTO promotions (name, type, value, min_purchase, applicable_items, '
+        'active, description, get_free) VALUES (?, ?, ?, ?, ?, 1, ?, 1)',
+        (name, promo_type, value, min_purchase, applicable, name),
+    )
+    conn.commit()
+
+
+def test_get_cart_lists_all_lines(admin_client):
+    _set_cart(admin_client, [_item('Sushi', 100), _item('Bebida', 25)])
+    data = admin_client.get('/api/cart').get_json()
+    assert data['count'] == 2
+    assert data['total'] == 125.0
+    assert [l['index'] for l in data['added']] == [0, 1]
+
+
+def test_add_item_returns_only_new_line(admin_client):
+    _set_cart(admin_client, [_item('Sushi', 100)])
+    data = admin_client.post('/api/cart/items/beverages',
+                             data={'beverage_type': 'Agua'}).get_json()
+    assert data['success']
+    assert data['changed'] == []
+    assert [l['index'] for l in data['added']] == [1]
+    assert data['count'] == 2
+    assert len(_cart(admin_client)) == 2
+
+
+def test_add_item_validation_error(admin_client):
+    resp = admin_client.post('/api/cart/items/beverages', data={})
+    assert resp.status_code == 400
+    assert resp.get_json()['success'] is False
+    assert _cart(admin_client) == []
+
+
+def test_add_unknown_kind_is_404(admin_client):
+    assert admin_client.post('/api/cart/items/pizza').status_code == 404
+
+
+def test_update_quantity_returns_changed_line(admin_client):
+    _set_cart(admin_client, [_item('Sushi', 100), _item('Bebida', 25)])
+    data = admin_client.patch('/api/cart/items/1', json={'quantity': 3}).get_json()
+    assert data['success']
+    assert [(l['index'], l['price']) for l in data['changed']] == [(1, 75.0)]
+    assert data['total'] == 175.0
+
+
+def test_update_quantity_rejects_bad_input(admin_client):
+    _set_cart(admin_client, [_item('Sushi', 100)])
+    assert admin_client.patch('/api/cart/items/0', json={'quantity': 'x'}).status_code == 400
+    assert admin_client.patch('/api/cart/items/5', json={'quantity': 2}).status_code == 404
+
+
+def test_remove_line_shifts_without_reporting_changes(admin_client):
+    _set_cart(admin_client, [_item('Sushi', 100), _item('Bebida', 25), _item('Boneless', 90)])
+    data = admin_client.delete('/api/cart/items/0').get_json()
+    assert data['removed'] == 0
+    assert data['changed'] == []
+    assert data['count'] == 2
+    assert data['total'] == 115.0
+
+
+def test_remove_revalidates_coupon(admin_client, conn):
+    _insert_promo(conn, 'MIN200', 'percentage', 10, min_purchase=200)
+    _set_cart(admin_client, [_item('Sushi', 150), _item('Sushi', 100)])
+    admin_client.post('/api/cart/coupon', json={'coupon_code': 'MIN200'})
+    data = admin_client.delete('/api/cart/items/1').get_json()
+    # Con 150 ya no alcanza el mínimo: se quita el descuento de la línea que queda
+    assert data['coupon'] is None
+    assert data['changed'] == [{'index': 0, 'name': 'Sushi', 'type': 'Sushi', 'quantity': 1,
+                                'unit_price': 150.0, 'price': 150.0}]
+
+
+def test_apply_and_remove_coupon(admin_client, conn):
+    _insert_promo(conn, 'DESC10', 'percentage', 10)
+    _set_cart(admin_client, [_item('Sushi', 100), _item('Bebida', 20)])
+    data = admin_client.post('/api/cart/coupon', json={'coupon_code': 'desc10'}).get_json()
+    assert data['success']
+    assert data['coupon'] == 'DESC10'
+    assert data['applied_discount'] == '10% off'
+    assert [l['price'] for l in data['changed']] == [90.0, 18.0]
+    assert data['total'] == 108.0
+
+    data = admin_client.delete('/api/cart/coupon').get_json()
+    assert data['coupon'] is None
+    assert data['total'] == 120.0
+    assert all('original_price' not in l for l in data['changed'])
+
+
+def test_invalid_coupon_leaves_cart_untouched(admin_client):
+    _set_cart(admin_client, [_item('Sushi', 100)])
+    resp = admin_client.post('/api/cart/coupon', json={'coupon_code': 'NOEXISTE'})
+    assert resp.status_code == 400
+    assert _cart(admin_client)[0]['price'] == 100.0
@@ -1,5 +1,7 @@
 import pytest
 
+import cart_store
+
 
 # ---------------------------------------------------------------------------
 # Helpers
@@ -24,7 +26,7 @@ def _insert_promo(conn, name, promo_type, value):
 
 def _cart(client):
     with client.session_transaction() as sess:
-        return sess.get("cart", [])
+        return cart_store.for_session(sess)
 
 
 def _cart_total(client):
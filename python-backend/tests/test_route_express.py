@@ -0,0 +1,111 @@
+"""Órdenes exprés: una orden completa en un request JSON, precio del servidor."""
+from db import get_item_price
+
+SUSHI = {'kind': 'sushi', 'quantity': 2,
+         'options': {'ingredients': ['Camarón', 'Ostión'], 'style': 'Fría',
+                     'prepared': 'Preparado'}}
+AGUA = {'kind': 'beverages', 'options': {'beverage_type': 'Agua'}}
+
+
+def _order(**overrides):
+    data = {'customer_name': 'Ana', 'items': [SUSHI, AGUA],
+            'payment': {'payment_method': 'card'}}
+    data.update(overrides)
+    return data
+
+
+def _expected_total(app_module):
+    sushi = app_module.routes_customize._calc_sushi_price(['Camarón', 'Ostión'], 'Preparado')[2]
+    return sushi * 2 + get_item_price('Agua')
+
+
+def test_express_order_commits_priced_by_server(admin_client, app_module, conn):
+    resp = admin_client.post('/api/orders/express', json=_order())
+    data = resp.get_json()
+    assert resp.status_code == 200 and data['success']
+    row = conn.execute('SELECT total, customer_name, payment_method FROM orders WHERE id = ?',
+                       (data['order_id'],)).fetchone()
+    assert row['total'] == _expected_total(app_module) == data['total']
+    assert row['customer_name'] == 'Ana'
+    lines = conn.execute('SELECT type, quantity FROM order_items WHERE order_id = ? '
+                         'ORDER BY line_no', (data['order_id'],)).fetchall()
+    assert [(l['type'], l['quantity']) for l in lines] == [('Sushi', 2), ('Bebida', 1)]
+    job = conn.execute('SELECT status FROM print_jobs WHERE id = ?', (data['order_id'],)).fetchone()
+    assert job['status'] == 'pending'
+
+
+def test_express_ignores_client_prices(admin_client, app_module):
+    tampered = dict(AGUA, price=0.01, options={'beverage_type': 'Agua', 'price': '0.01'})
+    data = admin_client.post('/api/orders/express',
+                             json=_order(items=[tampered])).get_json()
+    assert data['total'] == get_item_price('Agua')
+
+
+def test_express_applies_coupon(admin_client, app_module, conn):
+    conn.execute("INSERT INTO promotions (name, type, value, min_purchase, active, description) "
+                 "VALUES ('DESC10', 'percentage', 10, 0, 1, 'Diez')")
+    conn.commit()
+    data = admin_client.post('/api/orders/express',
+                             json=_order(coupon_code='desc10')).get_json()
+    assert data['success']
+    assert data['total'] == round(_expected_total(app_module) * 0.9, 2)
+
+
+def test_express_validation_errors_write_nothing(admin_client, conn):
+    bad_item = {'kind': 'sushi', 'options': {'ingredients': ['Camarón'], 'style': 'Fría'}}
+    cases = [
+        _order(items=[]),
+        _order(items=[{'kind': 'pizza'}]),
+        _order(items=[bad_item]),
+        _order(items=[dict(AGUA, quantity=0)]),
+        _order(items=[dict(AGUA, quantity=100000)]),
+        _order(items=[{'kind': 'beverages', 'options': {'beverage_type': 'Gratis'}}]),
+        _order(coupon_code='NOEXISTE'),
+        _order(payment={'payment_method': 'cash', 'amount_paid': 1}),
+    ]
+    for payload in cases:
+        resp = admin_client.post('/api/orders/express', json=payload)
+        assert resp.status_code == 400, payload
+        assert resp.get_json()['success'] is False
+    assert conn.execute('SELECT COUNT(*) FROM orders').fetchone()[0] == 0
+
+
+def test_express_cash_change(admin_client, app_module):
+    total = _expected_total(app_module)
+    data = admin_client.post('/api/orders/express', json=_order(
+        payment={'payment_method': 'cash', 'amount_paid': total + 50})).get_json()
+    assert data['change'] == 50.0
+
+
+def test_batch_saves_valid_and_reports_invalid(admin_client, conn):
+    payload = {'orders': [_order(), _order(items=[{'kind': 'pizza'}]), _order(customer_name='Luis')]}
+    data = admin_client.post('/api/orders/express/batch', json=payload).get_json()
+    assert data['success'] and data['saved'] == 2
+    assert [r['success'] for r in data['results']] == [True, False, True]
+    assert data['results'][1]['error'] == 'Producto 1: tipo desconocido'
+    ids = [r['order_id'] for r in data['results'] if r['success']]
+    assert len(set(ids)) == 2
+    assert conn.execute('SELECT COUNT(*) FROM orders').fetchone()[0] == 2
+
+
+def test_batch_with_no_valid_orders_is_rejected(admin_client, conn):
+    import write_coordinator
+    antes = write_coordinator.stats()['transactions']
+    payload = {'orders': [_order(items=[{'kind': 'pizza'}]), _order(items=[])]}
+    resp = admin_client.post('/api/orders/express/batch', json=payload)
+    assert resp.status_code == 400
+    data = resp.get_json()
+    assert data['success'] is False and data['saved'] == 0
+    assert [r['error'] for r in data['results']] == ['Producto 1: tipo desconocido',
+                                                      'La orden no tiene productos.']
+    assert write_coordinator.stats()['transactions'] == antes
+
+
+def test_batch_limits(admin_client):
+    assert admin_client.post('/api/orders/express/batch', json={'orders': []}).status_code == 400
+    too_many = {'orders': [_order()] * 51}
+    assert admin_client.post('/api/orders/express/batch', json=too_many).status_code == 400
+
+
+def test_express_requires_login(client):
+    assert client.post('/api/orders/express', json=_order()).status_code == 302
@@ -1,5 +1,7 @@
 import pytest
 
+import cart_store
+
 
 # ---------------------------------------------------------------------------
 # customize_rice_ball — GET
@@ -284,4 +286,4 @@ def test_remove_item_decreases_cart_length(admin_client):
     resp = admin_client.get("/cart")
     assert resp.status_code == 200
     with admin_client.session_transaction() as sess:
-        assert len(sess.get("cart", [])) == 1
+        assert len(cart_store.for_session(sess)) == 1
@@ -117,6 +117,41 @@ def test_ticket_post_card_with_valid_cart(admin_client):
     assert resp.status_code == 200
 
 
+def _counts():
+    import os, sqlite3
+    c = sqlite3.connect(os.environ['RESTAURANT_DB_PATH'])
+    try:
+        return tuple(c.execute(f'SELECT COUNT(*) FROM {t}').fetchone()[0]
+                     for t in ('orders', 'order_items', 'print_jobs', 'activity_log'))
+    finally:
+        c.close()
+
+
+def test_ticket_commits_order_print_job_and_audit_together(admin_client):
+    before = _counts()
+    _set_cart(admin_client, [BEBIDA_ITEM])
+    resp = admin_client.post('/ticket', data={'payment_method': 'card'})
+    assert resp.status_code == 200
+    assert b'Ticket en cola' in resp.data
+    orders, items, jobs, logs = _counts()
+    assert (orders, items, jobs) == (before[0] + 1, before[1] + 1, before[2] + 1)
+    assert logs == before[3] + 1
+
+
+def test_ticket_failure_rolls_back_the_whole_sale(admin_client):
+    import os, sqlite3
+    c = sqlite3.connect(os.environ['RESTAURANT_DB_PATH'])
+    c.execute("CREATE TRIGGER falla_impresion BEFORE INSERT ON print_jobs "
+              "BEGIN SELECT RAISE(ABORT, 'disco lleno'); END")
+    c.commit()
+    c.close()
+    before = _counts()
+    _set_cart(admin_client, [BEBIDA_ITEM])
+    resp = admin_client.post('/ticket', data={'payment_method': 'card'})
+    assert resp.status_code == 302
+    assert _counts() == before
+
+
 # ---------------------------------------------------------------------------
 # /split_payment — GET
 # ---------------------------------------------------------------------------
@@ -0,0 +1,191 @@
+"""Coordinador de escrituras: fila FIFO, BEGIN IMMEDIATE y reintentos ante busy."""
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from write_coordinator import FifoLock, LatencyHistogram, WriteBusy, WriteCoordinator
+
+
+def _connect(path):
+    c = sqlite3.connect(path, timeout=0, check_same_thread=False)
+    c.execute('CREATE TABLE IF NOT EXISTS t (v TEXT)')
+    c.commit()
+    return c
+
+
+def test_fifo_lock_hands_off_in_arrival_order():
+    lock = FifoLock()
+    lock.acquire()
+    order = []
+
+    def worker(n):
+        lock.acquire()
+        order.append(n)
+        lock.release()
+
+    threads = []
+    for n in range(5):
+        t = threading.Thread(target=worker, args=(n,))
+        t.start()
+        threads.append(t)
+        while lock.depth() < n + 1:  # asegura el orden de llegada
+            time.sleep(0.001)
+    lock.release()
+    for t in threads:
+        t.join()
+    assert order == [0, 1, 2, 3, 4]
+
+
+def test_fifo_lock_timeout_leaves_queue():
+    lock = FifoLock()
+    lock.acquire()
+    assert lock.acquire(timeout=0.01) is False
+    assert lock.depth() == 0
+    lock.release()
+    assert lock.acquire(timeout=0.01) is True
+
+
+def test_commit_and_rollback(tmp_path):
+    conn = _connect(str(tmp_path / 'w.db'))
+    coord = WriteCoordinator()
+    with coord.transaction(conn):
+        conn.execute("INSERT INTO t VALUES ('ok')")
+    with pytest.raises(ValueError):
+        with coord.transaction(conn):
+            conn.execute("INSERT INTO t VALUES ('no')")
+            raise ValueError('falla a medio camino')
+    assert [r[0] for r in conn.execute('SELECT v FROM t')] == ['ok']
+    stats = coord.stats()
+    assert stats['transactions'] == 2
+    assert stats['rollbacks'] == 1
+    assert stats['hold']['count'] == 2
+
+
+def test_nested_transaction_joins_outer(tmp_path):
+    conn = _connect(str(tmp_path / 'w.db'))
+    coord = WriteCoordinator()
+    with coord.transaction(conn):
+        conn.execute("INSERT INTO t VALUES ('a')")
+        with coord.transaction(conn):
+            conn.execute("INSERT INTO t VALUES ('b')")
+        assert conn.in_transaction
+    assert conn.execute('SELECT COUNT(*) FROM t').fetchone()[0] == 2
+    assert coord.stats()['transactions'] == 1
+
+
+def test_nested_transaction_on_other_connection_raises(tmp_path):
+    path = str(tmp_path / 'w.db')
+    conn, otra = _connect(path), _connect(path)
+    coord = WriteCoordinator()
+    with pytest.raises(RuntimeError):
+        with coord.transaction(conn):
+            conn.execute("INSERT INTO t VALUES ('a')")
+            with coord.transaction(otra):
+                otra.execute("INSERT INTO t VALUES ('b')")
+    assert conn.execute('SELECT COUNT(*) FROM t').fetchone()[0] == 0
+
+
+def test_stray_implicit_transaction_is_rejected(tmp_path):
+    conn = _connect(str(tmp_path / 'w.db'))
+    coord = WriteCoordinator()
+    conn.execute("INSERT INTO t VALUES ('suelto')")     # BEGIN DEFERRED implícito
+    with pytest.raises(RuntimeError):
+        with coord.transaction(conn):
+            pass
+    conn.rollback()
+    with coord.transaction(conn):
+        conn.execute("INSERT INTO t VALUES ('ok')")
+    assert coord.stats()['transactions'] == 1
+
+
+def test_busy_from_other_process_is_retried(tmp_path):
+    path = str(tmp_path / 'w.db')
+    conn = _connect(path)
+    other = sqlite3.connect(path, timeout=5, check_same_thread=False)
+    other.execute('BEGIN IMMEDIATE')  # p. ej. el servicio Java escribiendo
+
+    coord = WriteCoordinator(busy_retries=10, busy_backoff=0.02)
+    reintento = threading.Event()
+    contar = coord._count
+
+    def count(key, n=1):
+        contar(key, n)
+        if key == 'busy_retries':
+            reintento.set()
+
+    coord._count = count
+
+    def soltar():
+        # El otro proceso termina justo después del primer "busy"
+        reintento.wait(5)
+        other.commit()
+
+    hilo = threading.Thread(target=soltar)
+    hilo.start()
+    try:
+        with coord.transaction(conn):
+            conn.execute("INSERT INTO t VALUES ('x')")
+    finally:
+        reintento.set()
+        hilo.join()
+        other.close()
+    stats = coord.stats()
+    assert stats['busy_retries'] >= 1
+    assert stats['busy_failures'] == 0
+
+
+def test_busy_gives_up_after_retries(tmp_path):
+    path = str(tmp_path / 'w.db')
+    conn = _connect(path)
+    other = _connect(path)
+    other.execute('BEGIN IMMEDIATE')
+    coord = WriteCoordinator(busy_retries=2, busy_backoff=0.001)
+    with pytest.raises(sqlite3.OperationalError):
+        with coord.transaction(conn):
+            pass
+    other.rollback()
+    assert coord.stats()['busy_failures'] == 1
+
+
+def test_queue_timeout_raises_write_busy(tmp_path):
+    conn = _connect(str(tmp_path / 'w.db'))
+    coord = WriteCoordinator(queue_timeout=0.01)
+    coord._lock.acquire()  # otro escritor con el turno
+    with pytest.raises(WriteBusy):
+        with coord.transaction(conn):
+            pass
+    coord._lock.release()
+    assert coord.stats()['queue_timeouts'] == 1
+
+
+def test_histogram_percentiles():
+    h = LatencyHistogram()
+    for ms in [0.5] * 98 + [40, 2000]:
+        h.observe(ms)
+    snap = h.snapshot()
+    assert snap['count'] == 100
+    assert snap['p50_ms'] == 1.0
+    assert snap['p99_ms'] == 50.0
+    assert snap['max_ms'] == 2000
+
+
+def test_db_stats_reports_writes(admin_client):
+    admin_client.post('/api/orders/express', json={
+        'items': [{'kind': 'beverages', 'options': {'beverage_type': 'Agua'}}],
+        'payment': {'payment_method': 'card'}})
+    data = admin_client.get('/admin/api/db-stats').get_json()
+    assert data['writes']['transactions'] >= 1
+    assert 'p99_ms' in data['writes']['wait']
+
+
+def test_admin_writes_go_through_the_coordinator(admin_client, conn):
+    import write_coordinator
+    antes = write_coordinator.stats()['transactions']
+    resp = admin_client.post('/inventory/add', json={'name': 'Alga nori', 'quantity': 5})
+    assert resp.get_json() == {'success': True}
+    admin_client.post('/admin/config/update', data={'usd_rate': '18.5'})
+    # inventario + config + su registro en la bitácora
+    assert write_coordinator.stats()['transactions'] == antes + 3
+    assert conn.execute("SELECT quantity FROM inventory WHERE name = 'Alga nori'").fetchone()[0] == 5
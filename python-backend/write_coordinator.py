@@ -0,0 +1,264 @@
+"""Coordinador de escrituras a SQLite.
+
+Varias tablets, el puente de impresión (mark_printed), la bitácora en segundo
+plano y el servicio Java de inventario escriben al mismo archivo. SQLite solo
+admite un escritor a la vez, y su manejador de espera (busy_timeout) duerme y
+reintenta sin orden: en hora pico un /ticket podía esperar detrás de varios
+escritores que llegaron después, o terminar en "database is locked".
+
+Dentro de este proceso las escrituras pasan en fila (FIFO) por un candado por
+archivo de BD: solo la transacción al frente de la fila pide el candado de
+SQLite, así los escritores del servidor no compiten entre ellos. Contra otros
+procesos (servicio Java, herramientas externas) cada transacción empieza con
+BEGIN IMMEDIATE, que toma el candado de escritura al inicio en vez de fallar
+a medio camino, y un "busy" transitorio se reintenta unas cuantas veces con
+espera acotada.
+
+    with write_transaction(conn):
+        conn.execute(...)
+        conn.execute(...)
+    # commit al salir del bloque; rollback si hubo excepción
+
+Las métricas (espera por la fila, tiempo con el candado, reintentos y la
+latencia del COMMIT por perfil de durabilidad) salen en /admin/api/db-stats →
+'writes'. Con 'commit_ms' se comparan strict/balanced/rush con números reales
+del equipo en vez de adivinar.
+"""
+import random
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from db import _get_db_path, durability_profile
+
+QUEUE_TIMEOUT = 10.0     # segundos máximos esperando turno en la fila
+BUSY_RETRIES = 3         # intentos de BEGIN IMMEDIATE ante "database is locked"
+BUSY_BACKOFF = 0.05      # segundos base entre intentos (con jitter)
+# Un COMMIT sin fsync tarda décimas de ms: cubetas más finas que las de espera
+COMMIT_BOUNDS_MS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 25, 50, 100, 500)
+
+
+class WriteBusy(sqlite3.OperationalError):
+    """No se consiguió turno de escritura dentro del tiempo permitido."""
+
+
+def is_busy_error(exc):
+    msg = str(exc).lower()
+    return isinstance(exc, sqlite3.OperationalError) and ('locked' in msg or 'busy' in msg)
+
+
+class LatencyHistogram:
+    """Histograma acumulado de latencias en milisegundos (cubetas fijas)."""
+    BOUNDS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+    def __init__(self, bounds_ms=BOUNDS_MS):
+        self.bounds_ms = bounds_ms
+        self._counts = [0] * (len(bounds_ms) + 1)
+        self._count = 0
+        self._total = 0.0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, ms):
+        i = 0
+        while i < len(self.bounds_ms) and ms > self.bounds_ms[i]:
+            i += 1
+        with self._lock:
+            self._counts[i] += 1
+            self._count += 1
+            self._total += ms
+            if ms > self._max:
+                self._max = ms
+
+    def percentile(self, pct):
+        """Límite superior de la cubeta donde cae el percentil (aproximado)."""
+        with self._lock:
+            counts, total = list(self._counts), self._count
+        if not total:
+            return 0.0
+        objetivo = total * pct / 100
+        acumulado = 0
+        for i, c in enumerate(counts):
+            acumulado += c
+            if acumulado >= objetivo:
+                return float(self.bounds_ms[i]) if i < len(self.bounds_ms) else self._max
+        return self._max
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self._counts)
+            data = {'count': self._count,
+                    'avg_ms': round(self._total / self._count, 3) if self._count else 0.0,
+                    'max_ms': round(self._max, 3)}
+        etiquetas = [f'<={b}' for b in self.bounds_ms] + [f'>{self.bounds_ms[-1]}']
+        data['buckets'] = dict(zip(etiquetas, counts))
+        data['p50_ms'] = self.percentile(50)
+        data['p99_ms'] = self.percentile(99)
+        return data
+
+
+class FifoLock:
+    """Candado que se entrega en orden de llegada (threading.Lock no garantiza orden)."""
+
+    def __init__(self):
+        self._mutex = threading.Lock()
+        self._locked = False
+        self._waiters = deque()
+
+    def acquire(self, timeout=None):
+        with self._mutex:
+            if not self._locked and not self._waiters:
+                self._locked = True
+                return True
+            turno = threading.Event()
+            self._waiters.append(turno)
+        if turno.wait(timeout):
+            return True
+        with self._mutex:
+            if turno.is_set():
+                return True  # se lo entregaron justo al vencer el plazo
+            self._waiters.remove(turno)
+            return False
+
+    def release(self):
+        with self._mutex:
+            if self._waiters:
+                self._waiters.popleft().set()  # pasa directo al siguiente, sigue tomado
+            else:
+                self._locked = False
+
+    def depth(self):
+        with self._mutex:
+            return len(self._waiters)
+
+
+class WriteCoordinator:
+    def __init__(self, queue_timeout=QUEUE_TIMEOUT, busy_retries=BUSY_RETRIES,
+                 busy_backoff=BUSY_BACKOFF):
+        self.queue_timeout = queue_timeout
+        self.busy_retries = busy_retries
+        self.busy_backoff = busy_backoff
+        self._lock = FifoLock()
+        self._owner = None       # hilo con el turno
+        self._owner_conn = None  # y su conexión (ver transaction anidada)
+        self._stats_lock = threading.Lock()
+        self._stats = {'transactions': 0, 'contended': 0, 'peak_queue': 0,
+                       'busy_retries': 0, 'busy_failures': 0, 'queue_timeouts': 0,
+                       'rollbacks': 0}
+        self.wait_ms = LatencyHistogram()
+        self.hold_ms = LatencyHistogram()
+        self.commit_ms = {}      # perfil de durabilidad → LatencyHistogram
+
+    def _count(self, key, n=1):
+        with self._stats_lock:
+            self._stats[key] += n
+
+    def _begin_immediate(self, conn):
+        for intento in range(self.busy_retries):
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                return
+            except sqlite3.OperationalError as e:
+                if not is_busy_error(e) or intento == self.busy_retries - 1:
+                    if is_busy_error(e):
+                        self._count('busy_failures')
+                    raise
+                self._count('busy_retries')
+                time.sleep(self.busy_backoff * (2 ** intento) * (0.5 + random.random()))
+
+    def _commit(self, conn):
+        perfil = durability_profile()
+        inicio = time.monotonic()
+        conn.commit()
+        ms = (time.monotonic() - inicio) * 1000
+        with self._stats_lock:
+            hist = self.commit_ms.get(perfil)
+            if hist is None:
+                hist = self.commit_ms[perfil] = LatencyHistogram(COMMIT_BOUNDS_MS)
+        hist.observe(ms)
+
+    @contextmanager
+    def transaction(self, conn):
+        """Transacción de escritura en `conn`: turno FIFO, BEGIN IMMEDIATE y commit."""
+        if self._owner == threading.get_ident():
+            # Anidada en el mismo hilo: se une a la transacción de afuera, que
+            # debe ser de la misma conexión (otra nunca haría commit)
+            if _raw(conn) is not self._owner_conn:
+                raise RuntimeError('Transacción anidada en otra conexión: '
+                                   'usar la conexión de la transacción de afuera')
+            yield conn
+            return
+        if conn.in_transaction:
+            # Un DML suelto dejó abierta una transacción implícita (DEFERRED):
+            # unirse a ella saltaría BEGIN IMMEDIATE y los reintentos
+            raise RuntimeError('La conexión ya tiene una transacción abierta sin '
+                               'write_transaction')
+
+        inicio = time.monotonic()
+        profundidad = self._lock.depth()
+        if not self._lock.acquire(self.queue_timeout):
+            self._count('queue_timeouts')
+            raise WriteBusy('Tiempo de espera agotado para escribir en la base de datos')
+        adquirido = time.monotonic()
+        self.wait_ms.observe((adquirido - inicio) * 1000)
+        with self._stats_lock:
+            self._stats['transactions'] += 1
+            if profundidad or adquirido - inicio > 0.001:
+                self._stats['contended'] += 1
+            if profundidad + 1 > self._stats['peak_queue']:
+                self._stats['peak_queue'] = profundidad + 1
+        self._owner = threading.get_ident()
+        self._owner_conn = _raw(conn)
+        try:
+            self._begin_immediate(conn)
+            try:
+                yield conn
+                self._commit(conn)
+            except BaseException:
+                self._count('rollbacks')
+                conn.rollback()
+                raise
+        finally:
+            self._owner = None
+            self._owner_conn = None
+            self.hold_ms.observe((time.monotonic() - adquirido) * 1000)
+            self._lock.release()
+
+    def stats(self):
+        with self._stats_lock:
+            data = dict(self._stats)
+            commit_ms = dict(self.commit_ms)
+        data['queue_depth'] = self._lock.depth()
+        data['wait'] = self.wait_ms.snapshot()
+        data['hold'] = self.hold_ms.snapshot()
+        data['durability_profile'] = durability_profile()
+        data['commit_ms'] = {perfil: hist.snapshot() for perfil, hist in commit_ms.items()}
+        return data
+
+
+def _raw(conn):
+    """La sqlite3.Connection real (g.db la envuelve en _GConnection)."""
+    return getattr(conn, '_conn', conn)
+
+
+_coordinators = {}
+_coordinators_lock = threading.Lock()
+
+
+def get_coordinator(db_path=None):
+    db_path = db_path or _get_db_path()
+    with _coordinators_lock:
+        coord = _coordinators.get(db_path)
+        if coord is None:
+            coord = _coordinators[db_path] = WriteCoordinator()
+        return coord
+
+
+def write_transaction(conn, db_path=None):
+    return get_coordinator(db_path).transaction(conn)
+
+
+def stats(db_path=None):
+    return get_coordinator(db_path).stats()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Micro-benchmark of per-cart pricing (promotion engine + cart total).
+
+Prices a sample cart with each promotion type through the same helpers the
+cart routes use (routes_cart._apply_promo_to_cart, then
+business.cart_total_cents as /cart, /payment and /ticket do) and reports
+microseconds per cart, plus the cost of a single business.to_cents() call.
+Each iteration prices a fresh copy of the cart so promotions do not stack.
+
+Usage:
+  python scripts/bench_money.py [--lines N] [--repeat N]
+"""
+
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "python-backend"
+
+PROMOS = {
+    "percentage": {"type": "percentage", "value": 15, "min_purchase": 0,
+                   "applicable_items": None, "get_free": None},
+    "fixed": {"type": "fixed", "value": 75.5, "min_purchase": 100,
+              "applicable_items": None, "get_free": None},
+    "bxgy": {"type": "bxgy", "value": 3, "min_purchase": 0,
+             "applicable_items": '["Sushi"]', "get_free": 1},
+}
+
+
+def sample_cart(lines):
+    kinds = [("Sushi", 115.0), ("Bola de Arroz", 125.5), ("Boneless", 105.0), ("Bebida", 25.0)]
+    cart = []
+    for i in range(lines):
+        kind, unit = kinds[i % len(kinds)]
+        qty = 1 + i % 3
+        cart.append({"type": kind, "name": kind, "quantity": qty,
+                     "unit_price": unit, "price": unit * qty})
+    return cart
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=20000)
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    from business import cart_total_cents, to_cents
+    from routes_cart import _apply_promo_to_cart
+
+    cart = sample_cart(args.lines)
+    print(f"cart of {args.lines} lines, {args.repeat} iterations")
+    for name, promo in PROMOS.items():
+        def price_cart():
+            lines = [dict(item) for item in cart]
+            _apply_promo_to_cart(lines, promo)
+            return cart_total_cents(lines)
+        seconds = timeit.timeit(price_cart, number=args.repeat)
+        print(f"  {name:<10} {seconds / args.repeat * 1e6:8.2f} us/cart")
+    seconds = timeit.timeit(lambda: to_cents(103.50000000000001), number=args.repeat * 10)
+    print(f"  to_cents() {seconds / (args.repeat * 10) * 1e6:8.3f} us/call")
+
+
+if __name__ == "__main__":
+    main()
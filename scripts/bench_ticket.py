@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""Benchmark /ticket (checkout) latency against a throwaway database.
+
+Creates a temporary DB, logs in as the default admin and completes N sales
+through Flask's test client, timing only the POST /ticket request. Prints
+p50 / p90 / p99 / max in milliseconds.
+
+Usage:
+  python scripts/bench_ticket.py [--orders N] [--items N] [--warmup N]
+                                 [--durability strict|balanced|rush]
+
+Runs with the production activity-log mode (background writer) and writes
+receipt files inside the temporary directory, which is removed afterwards.
+With --durability the run uses that profile and also prints the COMMIT latency
+histogram recorded by the write coordinator.
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "python-backend"
+
+SAMPLE_LINE = {"type": "Sushi", "name": "Sushi", "price": 115.0,
+               "unit_price": 115.0, "quantity": 1}
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def run(orders, items, warmup, durability=None):
+    workdir = tempfile.mkdtemp(prefix="bench_ticket_")
+    os.environ["RESTAURANT_DB_PATH"] = os.path.join(workdir, "bench.db")
+    # Receipt files are written by a background thread, possibly after the
+    # chdir back: point them at the temp dir explicitly.
+    os.environ["RESTAURANT_RECEIPTS_DIR"] = os.path.join(workdir, "receipts")
+    os.environ.setdefault("SECRET_KEY", "bench-secret-key")
+    os.environ.pop("RESTAURANT_ACTIVITY_LOG_SYNC", None)
+    sys.path.insert(0, str(BACKEND_DIR))
+    previous_cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        import app as app_module
+        app_module.app.config["WTF_CSRF_ENABLED"] = False
+        app_module.init_db()
+        if durability:
+            conn = app_module.get_db_connection()
+            conn.execute("INSERT OR REPLACE INTO config (key, value) VALUES ('durability_profile', ?)",
+                         (durability,))
+            conn.commit()
+            conn.close()
+            app_module.config_store.invalidate()
+            app_module.config_store.snapshot()
+        samples = []
+        with app_module.app.test_client() as client:
+            client.post("/login", data={"username": "admin", "password": "admin123"})
+            for i in range(warmup + orders):
+                with client.session_transaction() as sess:
+                    sess["cart"] = [dict(SAMPLE_LINE) for _ in range(items)]
+                    sess.pop("ticket_token", None)
+                start = time.perf_counter()
+                resp = client.post("/ticket", data={"payment_method": "card"})
+                elapsed = (time.perf_counter() - start) * 1000
+                if resp.status_code != 200:
+                    raise SystemExit(f"/ticket returned {resp.status_code}")
+                if i >= warmup:
+                    samples.append(elapsed)
+        import write_coordinator
+        commit_ms = write_coordinator.stats()["commit_ms"]
+        app_module.activity_writer.writer.stop()
+        app_module.close_pools()
+        return samples, commit_ms
+    finally:
+        os.chdir(previous_cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=500)
+    parser.add_argument("--items", type=int, default=3)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--durability", choices=["strict", "balanced", "rush"])
+    args = parser.parse_args()
+
+    samples, commit_ms = run(args.orders, args.items, args.warmup, args.durability)
+    print(f"/ticket x{len(samples)} ({args.items} items per order)")
+    print(f"  p50  {percentile(samples, 50):7.2f} ms")
+    print(f"  p90  {percentile(samples, 90):7.2f} ms")
+    print(f"  p99  {percentile(samples, 99):7.2f} ms")
+    print(f"  max  {max(samples):7.2f} ms")
+    print(f"  mean {statistics.mean(samples):7.2f} ms")
+    for profile, hist in commit_ms.items():
+        print(f"COMMIT [{profile}] x{hist['count']}: avg {hist['avg_ms']:.2f} ms, "
+              f"p50 <={hist['p50_ms']:g} ms, p99 <={hist['p99_ms']:g} ms, max {hist['max_ms']:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()